@@ -90,7 +90,8 @@ def getDBName(db):
 def getDialect(db):
     """Helper function, used for sqlalchemy connections only"""
     if db in ('DATA_APPS','WEBAPP','MNSU','AUDIT'):
-        dialect = 'postgresql'
+        # psycopg2 (requirements.txt), not the psycopg 3 default of newer sqlalchemy
+        dialect = 'postgresql+psycopg2'
     else:
         dialect = 'mssql+pyodbc'
 #        dialect = 'ODBC Driver 18 for SQL Server'
@@ -155,7 +156,7 @@ def connect(db='RESEARCH',instance='REPORT',user='MATT',engine='pyodbc'):
         return conn
     elif engine=='sqlalchemy':
         dialect = getDialect(db)
-        if dialect == 'postgresql':
+        if dialect == 'postgresql+psycopg2':
             url_object = sqlalchemy.URL.create(
                 dialect,
                 username=getUsername(user, db, instance),
@@ -173,5 +174,8 @@ def connect(db='RESEARCH',instance='REPORT',user='MATT',engine='pyodbc'):
                 query={"driver":getDriver(db),
                        "TrustServerCertificate": "yes",}
                 )
+        if dialect == 'mssql+pyodbc':
+            # Send executemany parameters to SQL Server in bulk instead of one round trip per row
+            return sqlalchemy.create_engine(url_object, fast_executemany=True)
         return sqlalchemy.create_engine(url_object)
 
@@ -10,13 +10,24 @@ import scripts.generate_url as gu
 import scraping.BussWithNoEml as bu
 # Importing the scripts to scrape phone information
 import scraping.BussWithNoPhone as nu
+# Importing the scripts to scrape address information
+import scraping.BussWithNoAdd as au
+# Importing the thread pool shared by the url checks
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'scripts')))
+import executor_manager as em
 
 
 def main():
     print("\n=== Starting The Program ===")
-    gu.main()
-    bu.main()
-    nu.main()
+    em.start_executor()
+    try:
+        gu.main()
+        bu.main()
+        nu.main()
+        au.main()
+    finally:
+        print(f"Thread pool: {em.executor_stats()}")
+        em.shutdown_executor()
     print("\n=== Ending The Program ===")
 
 
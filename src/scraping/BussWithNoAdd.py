@@ -2,26 +2,31 @@
 Written by Spring 2025 MNSU project team
 This script generates addresses for businesses that don't have an address.
 It does the following:
- 1. Pulls data from the business, email and url table on the firm id where the address are missing.
+ 1. Pulls data from the business, address and url table on the firm id where the address are missing.
  2. Logs the processed firm_ids (Business Ids) in a processed table (mnsu_firm_processed) to keep track of the processed firms.
  3. Scrape addresses from the urls with helper functions.
- 4. Logs the generated addresses into a table (mnsu_generated_firm_address).  
+ 4. Logs the generated addresses into a table (mnsu_generated_firm_address).
 '''
 import os
 import sys
+from functools import partial
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import config.connect_iabbb as ci
-from setup import getBusWoutEml
+from setup import WorkCursor, getBusWoutAddress, getScriptId, initiateScriptActivity, terminateScriptActivity, writeFrame, commitBatch
 import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import MetaData
-from main_url_scrape import main_scrape_urls
-from data_extraction import extract_email_data, extract_phone_data, contains_phone_number
+from scripts.data_extraction import extract_address_data
+from scripts.batch_scrape import scrape_batch
+from scripts.result_accumulator import ResultAccumulator
+import sqlalchemy as sa
+
 
 #Script configuration
-SCRIPT_NAME = 'generating_urls_for_ten_firms_test_s2025'
+SCRIPT_NAME = 'generating_addresses_s2025'
 SCRIPT_VERSION = '1.0'
 VERSION_NOTE = None         #put version note string here if desired, otherwise None
+
+#Connection settings
 CONNECT_USER = 'AMANUEL'
 CONNECT_DB = 'MNSU'
 CONNECT_INSTANCE = 'SANDBOX'
@@ -37,66 +42,128 @@ NAME_TABLE = 'tblfirms_firm_companyname'
 EMAIL_TABLE = 'tblfirms_firm_email'
 PHONE_TABLE = 'tblfirms_firm_phone'
 URL_TABLE = 'tblfirms_firm_url'
-BATCH_SIZE = 10
+GENERATED_ADDRESS_TABLE = 'mnsu_generated_firm_address'
+BATCH_SIZE = 300
+SCRAPE_WORKERS = 8
+ADDRESSES_PER_FIRM = 1       #only considering the first address found per firm ID
+BATCH_DEADLINE = 600         #seconds a batch may spend fetching and scraping
 
+#Columns of the generated addresses (see data_extraction.extract_address_data)
+ADDRESS_COLUMNS = ['firm_id', 'address', 'street', 'city', 'state', 'zip', 'country']
 
-load_dotenv()
+errorCode = None
+errorText = None
 
-#Create connection
-con = ci.connect(db='MNSU', instance='SANDBOX', user='AMANUEL', engine='sqlalchemy')
 
+def addScrape(urlDf, workers=SCRAPE_WORKERS, deadline=BATCH_DEADLINE):
+    """
+    Scrapes addresses from the given URLs using the extract_address_data function.
+
+    Args:
+        urlDf (pd.DataFrame): DataFrame containing URLs.
+        workers (int): Number of firms scraped in parallel, 1 scrapes them one at a time.
+        deadline (int): Seconds the whole batch may take, None for no limit.
 
-metadata_obj = MetaData()
-metadata_obj.reflect(bind=con)
-test = getBusWoutEml(con,metadata_obj,None,50)
+    Returns:
+        pd.DataFrame: one row per scraped address, with the ADDRESS_COLUMNS columns.
+    """
+    #The firms have no address yet; firms in the same building may share one, so duplicates are per firm
+    results = ResultAccumulator(pd.DataFrame(columns=ADDRESS_COLUMNS), 'address', per_firm=True)
+    extractor = partial(extract_address_data, limit=ADDRESSES_PER_FIRM)
 
-print(test.keys())
+    #Fetch and scrape the whole batch; results come back in the same order as urlDf
+    scraped = scrape_batch(urlDf, extractor, workers=workers, deadline=deadline)
 
-#Extract relevant DataFrames
-business_df = test[BUSINESS_TABLE][['firm_id']]
-address_df = test[ADDRESS_TABLE][['firm_id', 'zip']]
-name_df = test[NAME_TABLE][['firm_id', 'company_name']]
-email_df = test[EMAIL_TABLE][['firm_id', 'email']]
-phone_df = test[PHONE_TABLE][['firm_id', 'phone']]
-url_df = test[URL_TABLE][['firm_id', 'url']]
+    #Collect the addresses found for each firm
+    for firm_id, scrapedAddress in scraped:
+        for address in scrapedAddress or []:
+            results.add(firm_id, address['address'], street=address['street'], city=address['city'],
+                        state=address['state'], zip=address['zip'], country=address['country'])
+    return results.to_frame()
 
-def addScrape(urlDf, emlDf):
+def logGeneratedAddressToDB(engine, processedRows, saId):
     """
-    Scrapes email from a given URL using the extract_email_data function.
-    
-    Args:
-        urlDf (pd.DataFrame): DataFrame containing URLs.
-        emlDf (pd.DataFrame): DataFrame to store scraped email addresses.
-        
+    Log the generated addresses to the database
+    :param engine: sqlalchemy engine
+    :param processedRows: dataframe of processed rows
+    :param saId: script activity id
+    :
+    :return: None
     """
+    assert isinstance(processedRows,pd.core.frame.DataFrame)
+    processedRows = processedRows[ADDRESS_COLUMNS]
+
+    processedRows[['mnsu_script_activity_id']] = saId
+    processedRows[['note']] = 'Testing generated addresses'
+    processedRows[['confidence_level']] = 1
+
+    writeFrame(engine, processedRows, GENERATED_ADDRESS_TABLE, schema=CONNECT_SCHEMA)
+
+def processAddressesInBatches(con,mnsuMeta,sId,saId,batch_size=BATCH_SIZE):
+    processed_count = 0
+    print("\n=== Starting Address Processing ===")
+    print(f"Script ID: {sId}")
+    print(f"Script Activity ID: {saId}")
+    print(f"Batch Size: {batch_size}")
+    print("==============================\n")
+    with WorkCursor(con, mnsuMeta, sId, ADDRESS_TABLE) as cursor:
+        print(f"Firms to process: {cursor.total}")
+        while True:
+            print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
+            print("Pulling data from database...")
+            dfs = getBusWoutAddress(con, mnsuMeta, sId, batch_size, cursor=cursor)
+
+            if not dfs or dfs[BUSINESS_TABLE].empty:
+                print("\n=== Process Complete ===")
+                print(f"Total records processed: {processed_count}")
+                print("========================")
+                break
+
+            #Get required dataframes
+            business_df = dfs[BUSINESS_TABLE][['firm_id']]
+            url_df = dfs[URL_TABLE][['firm_id', 'url']]
+            print(f"Records in current batch: {len(business_df)}")
+
+            #Process data
+            generated_address_df = addScrape(url_df)
+
+            #Save to database and log processed firms in one transaction
+            print("Pushing generated Addresses and processed businesses to database...")
+            commitBatch(con, mnsuMeta, sId, saId, business_df, GENERATED_ADDRESS_TABLE,
+                        lambda c: logGeneratedAddressToDB(c, generated_address_df, saId))
+            print(generated_address_df)
+            processed_count += len(business_df)
+            print(f"\n✓ Batch {(processed_count // batch_size)} completed")
+            print(f"✓ Records in this batch: {len(business_df)}")
+            print(f"✓ Addresses found in this batch: {len(generated_address_df)}")
+            print(f"✓ Total records processed: {processed_count}")
+
+def main():
+    print("\n=== Address Generation Script Starting ===")
+    #Setup environment
+    load_dotenv()
+    con = ci.connect(db=CONNECT_DB, instance=CONNECT_INSTANCE, user=CONNECT_USER, engine='sqlalchemy')
+    mnsuMeta = sa.schema.MetaData(schema=CONNECT_SCHEMA)
+
+    #Get script IDs
+    sId = getScriptId(con, mnsuMeta)
+    saId = initiateScriptActivity(con, mnsuMeta,sId)
+
+    try:
+        #Process addresses
+        processAddressesInBatches(con, mnsuMeta, sId, saId, batch_size=BATCH_SIZE)
+        print("\nScript completed successfully!")
+        print("Terminating script activity...")
+        terminateScriptActivity(con, mnsuMeta, saId)
+    except Exception as e:
+        #Handle errors
+        print("\n!!! Error occurred !!!")
+        print(f"Error message: {str(e)}")
+        print("Terminating script activity with error...")
+        terminateScriptActivity(con, mnsuMeta, saId, errorCode=errorCode, errorText=str(e))
+        raise
+    finally:
+        print("\n=== Script Execution Finished ===")
 
-    for index, row in urlDf.iterrows():
-        # print(row[1])
-        # print(type(row[1]))
-        url = row['url']
-        firm_id = row['firm_id']
-        
-        #Scrape email data
-        scrapedAddress = extract_address_data(firm_id, url)
-        print(scrapedAddress, url)
-        
-        #Append the scraped emails to the email DataFrame
-        #for now, we're only considering 2 emails per firm ID
-        i = 0
-        while i < 2 and scrapedEmail != None and  i < len(scrapedEmail):
-            #Check if the email is already in the DataFrame
-            if scrapedEmail[i] not in emlDf['email'].values:
-                print(True)
-                #Create a new row as a DataFrame
-                new_row = pd.DataFrame({'firm_id': [firm_id], 'email': [scrapedEmail[i]]})
-                
-                #Use pd.concat() to append the new row
-                emlDf = pd.concat([emlDf, new_row], ignore_index=True)
-
-                i += 1
-            else: 
-                i += 1
-                continue
-
-    return emlDf
-#print(emlScrape(url_df, email_df))
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -9,14 +9,17 @@ It does the following:
 '''
 import os
 import sys
+from functools import partial
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import config.connect_iabbb as ci
-from setup import getBusWoutEml, getScriptId, getExistingScriptId, initiateScriptActivity, terminateScriptActivity, logProcessedToDB
+from setup import WorkCursor, getBusWoutEml, getScriptId, getExistingScriptId, initiateScriptActivity, terminateScriptActivity, writeFrame, commitBatch
 import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import MetaData
 from scripts.main_url_scrape import main_scrape_urls
 from scripts.data_extraction import extract_email_data, extract_phone_data, contains_phone_number
+from scripts.batch_scrape import scrape_batch
+from scripts.result_accumulator import ResultAccumulator
 from urllib.parse import urlparse
 import sqlalchemy as sa
 
@@ -42,44 +45,40 @@ PHONE_TABLE = 'tblfirms_firm_phone'
 URL_TABLE = 'tblfirms_firm_url'
 GENERATED_EMAIL_TABLE = 'mnsu_generated_firm_email'
 BATCH_SIZE = 300
+SCRAPE_WORKERS = 8
+EMAILS_PER_FIRM = 2          #only considering 2 emails per firm ID
+BATCH_DEADLINE = 600         #seconds a batch may spend fetching and scraping
 
 errorCode = None 
 errorText = None
 
-def emlScrape(urlDf, emlDf):
+def emlScrape(urlDf, emlDf, workers=SCRAPE_WORKERS, deadline=BATCH_DEADLINE):
     """
     Scrapes email from a given URL using the extract_email_data function.
     
     Args:
         urlDf (pd.DataFrame): DataFrame containing URLs.
         emlDf (pd.DataFrame): DataFrame to store scraped email addresses.
+        workers (int): Number of firms scraped in parallel, 1 scrapes them one at a time.
+        deadline (int): Seconds the whole batch may take, None for no limit.
         
     """
-
-    for index, row in urlDf.iterrows():
-        url = row['url']
-        firm_id = row['firm_id']
-        
-        #Scrape email data
-        scrapedEmail = extract_email_data(firm_id, url)
-        #Append the scraped emails to the email DataFrame
-        #for now, we're only considering 2 emails per firm ID
-        i = 0
-        while i < 2 and scrapedEmail != None and  i < len(scrapedEmail):
-            #Check if the email is already in the DataFrame
-            if scrapedEmail[i] not in emlDf['email'].values:
-                #Create a new row as a DataFrame
-                new_row = pd.DataFrame({'firm_id': [firm_id], 'email': [scrapedEmail[i]]})
-                
-                #Use pd.concat() to append the new row
-                emlDf = pd.concat([emlDf, new_row], ignore_index=True)
-
-                i += 1
-            else: 
-                i += 1
-                continue
-
-    return emlDf
+    #Values already known count as seen, and the extractor stops once it has EMAILS_PER_FIRM new ones.
+    #The limit is per firm and applies before the deduplication across firms below: the firms of a
+    #batch are scraped independently (in parallel or not), so a firm can keep fewer than EMAILS_PER_FIRM
+    #emails when an earlier firm of the batch found the same one.
+    results = ResultAccumulator(emlDf, 'email')
+    extractor = partial(extract_email_data, limit=EMAILS_PER_FIRM, known=results.seen)
+
+    #Fetch and scrape the whole batch; results come back in the same order as urlDf
+    scraped = scrape_batch(urlDf, extractor, workers=workers, deadline=deadline)
+
+    #Collect the new emails, skipping any found for an earlier firm of the batch
+    for firm_id, scrapedEmail in scraped:
+        for email in scrapedEmail or []:
+            results.add(firm_id, email)
+
+    return results.to_frame()
        
 
 def getDomainName(email):
@@ -109,11 +108,7 @@ def logGeneratedEmailToDB(engine, processedRows, saId):
     processedRows[['note']] = 'Testing generated emails'
     processedRows[['confidence_level']] = 1
     
-    processedRows.to_sql(name=GENERATED_EMAIL_TABLE,
-                                con=engine,
-                                schema=CONNECT_SCHEMA,
-                                if_exists='append',
-                                index=False)
+    writeFrame(engine, processedRows, GENERATED_EMAIL_TABLE, schema=CONNECT_SCHEMA)
 
 def processEmailsInBatches(con,mnsuMeta,sId,saId,batch_size=BATCH_SIZE):
     """
@@ -125,41 +120,40 @@ def processEmailsInBatches(con,mnsuMeta,sId,saId,batch_size=BATCH_SIZE):
     print(f"Batch Size: {batch_size}")
     print("==============================\n")
 
-    while True:
-        print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
-        print("Pulling data from database...")
-        dfs = getBusWoutEml(con, mnsuMeta, sId, batch_size)
+    with WorkCursor(con, mnsuMeta, sId, EMAIL_TABLE) as cursor:
+        print(f"Firms to process: {cursor.total}")
+        while True:
+            print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
+            print("Pulling data from database...")
+            dfs = getBusWoutEml(con, mnsuMeta, sId, batch_size, cursor=cursor)
         
-        if not dfs or dfs[BUSINESS_TABLE].empty:
-            print("\n=== Process Complete ===")
-            print(f"Total records processed: {processed_count}")
-            print("========================")
-            break
-
-        #Get the required dataframes
-        business_df = dfs[BUSINESS_TABLE][['firm_id']]
-        email_df = dfs[EMAIL_TABLE][['firm_id', 'email','email_type_id','email_status_id','address_id']]
-        url_df = dfs[URL_TABLE][['firm_id', 'url']]
-        print(f"Records in current batch: {len(business_df)}")
-
-        #Merge dataframes
-        updated_email_df = emlScrape(url_df,email_df)
+            if not dfs or dfs[BUSINESS_TABLE].empty:
+                print("\n=== Process Complete ===")
+                print(f"Total records processed: {processed_count}")
+                print("========================")
+                break
+
+            #Get the required dataframes
+            business_df = dfs[BUSINESS_TABLE][['firm_id']]
+            email_df = dfs[EMAIL_TABLE][['firm_id', 'email','email_type_id','email_status_id','address_id']]
+            url_df = dfs[URL_TABLE][['firm_id', 'url']]
+            print(f"Records in current batch: {len(business_df)}")
+
+            #Merge dataframes
+            updated_email_df = emlScrape(url_df,email_df)
         
-        #Extract domain and update status
-        updated_email_df['domain'] = updated_email_df['email'].apply(getDomainName)
-
-        #Push this batch immediately
-        print("Pushing generated Emails to database...")
-        logGeneratedEmailToDB(con, updated_email_df, saId)
-
-        #Log processed businesses
-        print("Logging processed businesses...")
-        logProcessedToDB(con, business_df, sId, saId)
-        print(updated_email_df)
-        processed_count += len(business_df)
-        print(f"\n✓ Batch {(processed_count // batch_size)} completed")
-        print(f"✓ Records in this batch: {len(business_df)}")
-        print(f"✓ Total records processed: {processed_count}")
+            #Extract domain and update status
+            updated_email_df['domain'] = updated_email_df['email'].apply(getDomainName)
+
+            #Push this batch and log the processed businesses in one transaction
+            print("Pushing generated Emails and processed businesses to database...")
+            commitBatch(con, mnsuMeta, sId, saId, business_df, GENERATED_EMAIL_TABLE,
+                        lambda c: logGeneratedEmailToDB(c, updated_email_df, saId))
+            print(updated_email_df)
+            processed_count += len(business_df)
+            print(f"\n✓ Batch {(processed_count // batch_size)} completed")
+            print(f"✓ Records in this batch: {len(business_df)}")
+            print(f"✓ Total records processed: {processed_count}")
 
 def main():
     print("\n=== Email Generation Script Starting ===")
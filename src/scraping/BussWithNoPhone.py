@@ -9,14 +9,17 @@ It does the following:
 '''
 import os
 import sys
+from functools import partial
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import config.connect_iabbb as ci
-from setup import getBusWoutPhone, getScriptId, getExistingScriptId, initiateScriptActivity, terminateScriptActivity, logProcessedToDB
+from setup import WorkCursor, getBusWoutPhone, getScriptId, getExistingScriptId, initiateScriptActivity, terminateScriptActivity, writeFrame, commitBatch
 import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import MetaData
 from scripts.main_url_scrape import main_scrape_urls
 from scripts.data_extraction import extract_email_data, extract_phone_data, contains_phone_number
+from scripts.batch_scrape import scrape_batch
+from scripts.result_accumulator import ResultAccumulator
 import sqlalchemy as sa
 from sqlalchemy import MetaData
 
@@ -44,39 +47,40 @@ PHONE_TABLE = 'tblfirms_firm_phone'
 URL_TABLE = 'tblfirms_firm_url'
 GENERATED_PHONE_TABLE = 'mnsu_generated_firm_phone'
 BATCH_SIZE = 1000
+SCRAPE_WORKERS = 8
+PHONES_PER_FIRM = 2          #only considering 2 phones per firm ID
+BATCH_DEADLINE = 1200        #seconds a batch may spend fetching and scraping
 
 errorCode = None 
 errorText = None
 
 
-def phoneScrape(urlDf, phoneDf):
+def phoneScrape(urlDf, phoneDf, workers=SCRAPE_WORKERS, deadline=BATCH_DEADLINE):
     """
     Scrapes email from a given URL using the extract_email_data function.
     
     Args:
         urlDf (pd.DataFrame): DataFrame containing URLs.
         emlDf (pd.DataFrame): DataFrame to store scraped email addresses.
+        workers (int): Number of firms scraped in parallel, 1 scrapes them one at a time.
+        deadline (int): Seconds the whole batch may take, None for no limit.
         
     """
-    for index, row in urlDf.iterrows():
-        url = row['url']
-        firm_id = row['firm_id']
-        
-        #Scrape phone data
-        scrapedPhone = extract_phone_data(firm_id, url)
-        #Process scraped phones
-        #Only considering 2 phones per firm ID
-        i = 0
-        while i < 2 and scrapedPhone != None and  i < len(scrapedPhone):
-            #Check if phone exists
-            if scrapedPhone[i] not in phoneDf['phone'].values:
-                new_row = pd.DataFrame({'firm_id': [firm_id], 'phone': [scrapedPhone[i]]})
-                phoneDf = pd.concat([phoneDf, new_row], ignore_index=True)
-                i += 1
-            else: 
-                i += 1
-                continue
-    return phoneDf
+    #Values already known count as seen, and the extractor stops once it has PHONES_PER_FIRM new ones.
+    #The limit is per firm and applies before the deduplication across firms below: the firms of a
+    #batch are scraped independently (in parallel or not), so a firm can keep fewer than PHONES_PER_FIRM
+    #phones when an earlier firm of the batch found the same one.
+    results = ResultAccumulator(phoneDf, 'phone')
+    extractor = partial(extract_phone_data, limit=PHONES_PER_FIRM, known=results.seen)
+
+    #Fetch and scrape the whole batch; results come back in the same order as urlDf
+    scraped = scrape_batch(urlDf, extractor, workers=workers, deadline=deadline)
+
+    #Collect the new phones, skipping any found for an earlier firm of the batch
+    for firm_id, scrapedPhone in scraped:
+        for phone in scrapedPhone or []:
+            results.add(firm_id, phone)
+    return results.to_frame()
 
 def logGeneratedPhoneToDB(engine, processedRows, saId):
     """
@@ -94,11 +98,7 @@ def logGeneratedPhoneToDB(engine, processedRows, saId):
     processedRows[['note']] = 'Testing generated phones'
     processedRows[['confidence_level']] = 1
     
-    processedRows.to_sql(name=GENERATED_PHONE_TABLE,
-                                con=engine,
-                                schema=CONNECT_SCHEMA,
-                                if_exists='append',
-                                index=False)
+    writeFrame(engine, processedRows, GENERATED_PHONE_TABLE, schema=CONNECT_SCHEMA)
 
 def processPhonesInBatches(con,mnsuMeta,sId,saId,batch_size=BATCH_SIZE):
     processed_count = 0
@@ -107,38 +107,37 @@ def processPhonesInBatches(con,mnsuMeta,sId,saId,batch_size=BATCH_SIZE):
     print(f"Script Activity ID: {saId}")
     print(f"Batch Size: {batch_size}")
     print("==============================\n")
-    while True:
-        print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
-        print("Pulling data from database...")
-        dfs = getBusWoutPhone(con, mnsuMeta, sId, batch_size)
+    with WorkCursor(con, mnsuMeta, sId, PHONE_TABLE) as cursor:
+        print(f"Firms to process: {cursor.total}")
+        while True:
+            print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
+            print("Pulling data from database...")
+            dfs = getBusWoutPhone(con, mnsuMeta, sId, batch_size, cursor=cursor)
         
-        if not dfs or dfs[BUSINESS_TABLE].empty:
-            print("\n=== Process Complete ===")
-            print(f"Total records processed: {processed_count}")
-            print("========================")
-            break
-
-        #Get required dataframes
-        business_df = dfs[BUSINESS_TABLE][['firm_id']]
-        phone_df = dfs[PHONE_TABLE][['firm_id', 'phone','phone_status_id','phone_type_id']]
-        url_df = dfs[URL_TABLE][['firm_id', 'url']]
-        print(f"Records in current batch: {len(business_df)}")
-
-        #Process data
-        updated_phone_df = phoneScrape(url_df,phone_df)
+            if not dfs or dfs[BUSINESS_TABLE].empty:
+                print("\n=== Process Complete ===")
+                print(f"Total records processed: {processed_count}")
+                print("========================")
+                break
+
+            #Get required dataframes
+            business_df = dfs[BUSINESS_TABLE][['firm_id']]
+            phone_df = dfs[PHONE_TABLE][['firm_id', 'phone','phone_status_id','phone_type_id']]
+            url_df = dfs[URL_TABLE][['firm_id', 'url']]
+            print(f"Records in current batch: {len(business_df)}")
+
+            #Process data
+            updated_phone_df = phoneScrape(url_df,phone_df)
         
-        #Save to database
-        print("Pushing generated Emails to database...")
-        logGeneratedPhoneToDB(con, updated_phone_df, saId)
-
-        #Log processed firms
-        print("Logging processed businesses...")
-        logProcessedToDB(con, business_df, sId, saId)
-        print(updated_phone_df)
-        processed_count += len(business_df)
-        print(f"\n✓ Batch {(processed_count // batch_size)} completed")
-        print(f"✓ Records in this batch: {len(business_df)}")
-        print(f"✓ Total records processed: {processed_count}")
+            #Save to database and log processed firms in one transaction
+            print("Pushing generated Phones and processed businesses to database...")
+            commitBatch(con, mnsuMeta, sId, saId, business_df, GENERATED_PHONE_TABLE,
+                        lambda c: logGeneratedPhoneToDB(c, updated_phone_df, saId))
+            print(updated_phone_df)
+            processed_count += len(business_df)
+            print(f"\n✓ Batch {(processed_count // batch_size)} completed")
+            print(f"✓ Records in this batch: {len(business_df)}")
+            print(f"✓ Total records processed: {processed_count}")
 
 def main():
     print("\n=== Phone Generation Script Starting ===")
@@ -0,0 +1,137 @@
+"""
+Street-address detection for extract_address_data.
+Finding addresses with one big regex over a whole page is slow, because every digit on the page can
+start an attempt. find_addresses instead looks for the cheap, rare anchor first: a state or province
+(name or uppercase abbreviation) followed by a US zip or Canadian postal code. Only the short window
+of text in front of each anchor is searched for the street and city. Each address found is then
+normalized and checked against elis_functions:
+- the state/province is converted to its abbreviation with stateProvinceToAbbrev
+- the zip is cleaned with cleanZip and checked against the state with cheapValidateUSZip (zipValidation)
+iter_page_addresses runs the same search over the raw bytes of a page, with tags, scripts, styles and
+comments removed, so the page doesn't need to be parsed.
+"""
+import os
+import sys
+import re
+import html
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from elis_functions import stateProvinceToAbbrev, cleanZip, cheapValidateUSZip
+from structured_data import make_address
+
+
+CANADIAN_PROVINCES = {'NL', 'NS', 'PE', 'NB', 'QC', 'ON', 'MB', 'SK', 'AB', 'BC', 'NU', 'NT', 'YT'}
+WINDOW_SIZE = 120           # characters in front of the state/zip searched for the street and city
+
+STREET_SUFFIXES = ['street', 'st', 'avenue', 'ave', 'av', 'road', 'rd', 'boulevard', 'blvd', 'drive', 'dr',
+                   'lane', 'ln', 'way', 'court', 'ct', 'circle', 'cir', 'place', 'pl', 'parkway', 'pkwy',
+                   'highway', 'hwy', 'terrace', 'ter', 'trail', 'trl', 'square', 'sq', 'plaza', 'plz',
+                   'crescent', 'cres', 'loop', 'pike', 'row', 'run', 'path', 'alley', 'center', 'ctr']
+
+# Longest names first, so 'west virginia' wins over 'virginia'
+_state_names = sorted(stateProvinceToAbbrev, key=len, reverse=True)
+_state_abbrevs = sorted(set(stateProvinceToAbbrev.values()))
+# Names match in any case; abbreviations only in uppercase, so words like 'in' or 'or' don't match
+STATE_ZIP_REGEX = re.compile(
+    r'\b((?i:' + '|'.join(r'\s+'.join(map(re.escape, name.split())) for name in _state_names) + r')|'
+    + '|'.join(_state_abbrevs) + r')\.?,?\s+(\d{5}(?:-\d{4})?|[A-Z]\d[A-Z]\s?\d[A-Z]\d)\b')
+STREET_CITY_REGEX = re.compile(
+    r'(\d{1,6}[A-Za-z]?(?:\s+(?!\d+\b)[\w.\'-]+){0,5}?\s+(?:' + '|'.join(STREET_SUFFIXES) + r')\b\.?'
+    r'(?:\s+(?:n|s|e|w|ne|nw|se|sw|north|south|east|west)\b\.?(?=\s*,))?'
+    r'(?:\s*,?\s*(?:suite|ste|unit|apt|#)\s*\.?\s*#?[\w-]+)?)'
+    r'\s*,?\s*([A-Za-z][A-Za-z .\'-]{1,30}?)\s*,?\s*$', re.I)
+
+#Removes the parts of a page that are not visible text
+SKIP_REGEX = re.compile(rb'(?is:<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->)')
+TAG_REGEX = re.compile(rb'<[^>]*>')
+
+
+def normalize_state(state):
+    """
+    Returns the abbreviation of a state/province name or abbreviation, '' if it isn't one
+    """
+    if not isinstance(state, str):
+        return ''
+    state = ' '.join(state.replace('.', '').split())
+    if len(state) == 2:
+        state = state.upper()
+        return state if state in stateProvinceToAbbrev.values() else ''
+    return stateProvinceToAbbrev.get(state.lower(), '')
+
+
+def normalize_address(address):
+    """
+    Normalizes the state and zip of an address dict and checks that they go together
+    :param address: dict with the keys street, city, state, zip (see structured_data.make_address)
+    :return: a new address dict, or None if the state or zip is missing or invalid
+    """
+    state = normalize_state(address.get('state'))
+    if not state or not address.get('zip'):
+        return None
+    country = 'CAN' if state in CANADIAN_PROVINCES else 'USA'
+    zipcode = cleanZip(address['zip'], country)
+    if not zipcode or not cheapValidateUSZip(zipcode, state):
+        return None
+    return make_address({'street': address.get('street'), 'city': address.get('city'),
+                         'state': state, 'zip': zipcode, 'country': country})
+
+
+def normalize_addresses(addresses):
+    """
+    Normalizes addresses read from structured data. One-line addresses (street only) are searched
+    with find_addresses.
+    :param addresses: iterable of address dicts
+    :return: generator of normalized address dicts
+    """
+    for address in addresses:
+        if address.get('street') and not address.get('zip'):
+            yield from find_addresses(address['street'])
+            continue
+        address = normalize_address(address)
+        if address is not None:
+            yield address
+
+
+def find_addresses(text):
+    """
+    Finds the street addresses in a piece of text
+    :param text: visible text of a page
+    :return: list of normalized address dicts, in text order, without duplicates
+    """
+    addresses = []
+    for match in STATE_ZIP_REGEX.finditer(text):
+        window = text[max(0, match.start() - WINDOW_SIZE):match.start()]
+        street_city = STREET_CITY_REGEX.search(window)
+        if street_city is None:
+            continue
+        address = normalize_address({'street': street_city.group(1), 'city': street_city.group(2),
+                                     'state': match.group(1), 'zip': match.group(2)})
+        if address is not None and address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+def page_text(content):
+    """
+    Returns the visible text of a page body without parsing it: scripts, styles, comments and tags
+    are removed, entities decoded and whitespace collapsed
+    :param content: page body (bytes)
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8', 'replace')
+    content = TAG_REGEX.sub(b' ', SKIP_REGEX.sub(b' ', content or b''))
+    text = content.decode('utf-8', 'replace')
+    if '&' in text:
+        text = html.unescape(text)
+    return ' '.join(text.split())
+
+
+def iter_page_addresses(content):
+    """
+    Yields the street addresses found in a page body, without parsing the page
+    :param content: page body (bytes)
+    :return: generator of normalized address dicts
+    """
+    # Cheap check before building the text: every address ends in a zip or postal code
+    if isinstance(content, (bytes, bytearray)) and not re.search(rb'\d{5}|\d[A-Za-z]\d', content):
+        return
+    yield from find_addresses(page_text(content))
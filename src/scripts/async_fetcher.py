@@ -0,0 +1,134 @@
+"""
+asyncio fetch engine for the scrapers.
+emlScrape and phoneScrape used to download one website at a time, opening a new connection for
+every request, so a batch spent nearly all of its time waiting on sockets. fetch_many downloads a
+whole batch of urls concurrently over a pooled keep-alive session:
+- at most MAX_CONNECTIONS requests are in flight at once
+- at most MAX_CONNECTIONS_PER_HOST of those go to the same host
+Every page fetched is stored in the shared page cache, so the extract_* functions read it from
+there instead of downloading it again. An optional deadline bounds the whole batch.
+Requests also wait for a slot from the per-domain politeness scheduler, and bodies are read the
+same way as http_session.read_capped: html only, at most MAX_BODY_SIZE bytes. Hosts in the
+dead-host negative cache are skipped, and host-level failures are recorded there.
+"""
+import os
+import sys
+import asyncio
+import aiohttp
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from page_cache import PAGE_CACHE, CachedPage, HEADERS
+from http_session import MAX_BODY_SIZE, CHUNK_SIZE, is_allowed_content_type
+from politeness import wait_for_slot_async
+from dead_hosts import is_dead, record_failure, record_success
+
+
+#Fetch configuration
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 4
+FETCH_TIMEOUT = 10
+
+# aiohttp can only decode brotli when the optional brotli package is installed
+ASYNC_HEADERS = dict(HEADERS, **{'Accept-Encoding': 'gzip, deflate'})
+
+
+async def _read_capped(response, max_bytes=MAX_BODY_SIZE):
+    """
+    Reads the body of an aiohttp response, stopping at max_bytes. Non-html bodies are not read.
+    :return: (body, truncated)
+    """
+    if not is_allowed_content_type(response.headers.get('Content-Type')):
+        return b'', False
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            return b''.join(chunks)[:max_bytes], True
+    return b''.join(chunks), False
+
+
+async def _fetch_one(session, url, timeout):
+    """
+    Downloads a single url
+    :param session: aiohttp.ClientSession
+    :param url: url to download
+    :param timeout: total request timeout in seconds
+    :return: CachedPage, or None if the request failed
+    """
+    if is_dead(url):
+        print(f"[Dead host] Skipping {url}")
+        return None
+    try:
+        await wait_for_slot_async(url)
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            record_success(url)
+            content, truncated = await _read_capped(response)
+            return CachedPage(url, response.status, response.headers, content, response.charset,
+                              truncated=truncated)
+    except asyncio.TimeoutError:
+        record_failure(url, 'Timeout', timeout=True)
+        print(f"[Timeout] Skipping {url}")
+    except aiohttp.ClientConnectionError as e:
+        record_failure(url, type(e).__name__)
+        print(f"[Error] Skipping {url}: {e}")
+    except Exception as e:
+        print(f"[Error] Skipping {url}: {e}")
+    return None
+
+
+async def fetch_many_async(urls, max_connections=MAX_CONNECTIONS,
+                           max_per_host=MAX_CONNECTIONS_PER_HOST, timeout=FETCH_TIMEOUT, deadline=None):
+    """
+    Downloads a list of urls concurrently over one pooled session.
+    Urls already in the page cache are not downloaded again.
+    :param urls: list of urls
+    :param max_connections: global limit on concurrent requests
+    :param max_per_host: limit on concurrent requests to the same host
+    :param timeout: total timeout per request in seconds
+    :param deadline: seconds the whole batch may take, None for no limit
+    :return: dictionary of {url: CachedPage}, with None for urls that could not be fetched
+    """
+    pages = {}
+    to_fetch = []
+    for url in dict.fromkeys(urls):
+        if not isinstance(url, str) or not url:
+            continue
+        page = PAGE_CACHE.get(url)
+        if page is not None:
+            pages[url] = page
+        else:
+            to_fetch.append(url)
+
+    if to_fetch:
+        connector = aiohttp.TCPConnector(limit=max_connections, limit_per_host=max_per_host)
+        async with aiohttp.ClientSession(connector=connector, headers=ASYNC_HEADERS) as session:
+            tasks = [asyncio.ensure_future(_fetch_one(session, url, timeout)) for url in to_fetch]
+            done, pending = await asyncio.wait(tasks, timeout=deadline)
+            for task in pending:
+                task.cancel()
+            if pending:
+                print(f"[Deadline] Skipping {len(pending)} urls still downloading")
+                await asyncio.gather(*pending, return_exceptions=True)
+        for url, task in zip(to_fetch, tasks):
+            page = task.result() if task in done else None
+            if page is not None:
+                PAGE_CACHE.put(page)
+            pages[url] = page
+
+    return pages
+
+
+def fetch_many(urls, max_connections=MAX_CONNECTIONS,
+               max_per_host=MAX_CONNECTIONS_PER_HOST, timeout=FETCH_TIMEOUT, deadline=None):
+    """
+    Blocking wrapper around fetch_many_async for the batch scripts.
+    :param urls: list of urls
+    :param max_connections: global limit on concurrent requests
+    :param max_per_host: limit on concurrent requests to the same host
+    :param timeout: total timeout per request in seconds
+    :param deadline: seconds the whole batch may take, None for no limit
+    :return: dictionary of {url: CachedPage}, with None for urls that could not be fetched
+    """
+    return asyncio.run(fetch_many_async(urls, max_connections=max_connections, max_per_host=max_per_host,
+                                        timeout=timeout, deadline=deadline))
@@ -0,0 +1,71 @@
+"""
+Runs one of the extract_* functions over a whole batch of firm urls.
+scrape_batch is shared by emlScrape and phoneScrape:
+ 1. Downloads every url of the batch concurrently with fetch_many (pages go into the shared page cache).
+ 2. Runs the extractor on each firm, serially or on a pool of worker threads.
+ 3. Returns the results in the same order as the input rows, so the serial and parallel modes
+    give the same output after deduplication.
+A batch deadline (in seconds) bounds the whole call: firms that are still being fetched or
+scraped when it runs out are returned with None, so one slow site can't hold up the batch.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from async_fetcher import fetch_many
+
+
+#Default batch configuration
+SCRAPE_WORKERS = 8
+BATCH_DEADLINE = 600
+
+
+def scrape_batch(urlDf, extractor, workers=SCRAPE_WORKERS, deadline=BATCH_DEADLINE):
+    """
+    Runs extractor(firm_id, url) for every row of urlDf
+    :param urlDf: dataframe with firm_id and url columns
+    :param extractor: one of the extract_* functions from data_extraction
+    :param workers: number of worker threads, 1 runs the extractor serially
+    :param deadline: seconds the whole batch may take, None for no limit
+    :return: list of (firm_id, extracted values) tuples in the order of the rows of urlDf,
+             with None as the value for firms that failed or ran past the deadline
+    """
+    start = time.monotonic()
+    rows = list(zip(urlDf['firm_id'].tolist(), urlDf['url'].tolist()))
+
+    #Download the whole batch concurrently; the extractor reads the pages from the shared cache
+    pages = fetch_many([url for _, url in rows], deadline=deadline)
+
+    def remaining():
+        if deadline is None:
+            return None
+        return max(0, deadline - (time.monotonic() - start))
+
+    results = [None] * len(rows)
+    todo = [i for i, (_, url) in enumerate(rows) if pages.get(url) is not None]
+
+    if workers is None or workers <= 1:
+        for n, i in enumerate(todo):
+            if remaining() == 0:
+                print(f"[Deadline] Skipping {len(todo) - n} remaining firms in this batch")
+                break
+            firm_id, url = rows[i]
+            try:
+                results[i] = extractor(firm_id, url)
+            except Exception as e:
+                print(f"[Error] Skipping {url}: {e}")
+    elif todo:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {executor.submit(extractor, *rows[i]): i for i in todo}
+        done, not_done = wait(futures, timeout=remaining())
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                print(f"[Error] Skipping {rows[futures[future]][1]}: {e}")
+        if not_done:
+            print(f"[Deadline] Skipping {len(not_done)} firms still running in this batch")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return [(firm_id, results[i]) for i, (firm_id, _) in enumerate(rows)]
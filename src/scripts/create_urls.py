@@ -5,6 +5,9 @@ We have two functions which build new urls for us
 - build_url_from_email:
     - This function relies on the specific row in our csv file HAVING an EMAIL, but MISSING a URL
     - Returns the new url formed from the email, if it passes our checks
+- build_urls_from_emails:
+    - The same for a whole column of emails, validated in one batch without printing a line per bad email
+    - Returns the urls (None where no url could be built) and the validation reason code of every email
 (from previous bbb team)
 - get_url_from_search: 
     - makes use of a helper function (filter), which removes a site in our list if it is in our rating_sites
@@ -15,11 +18,13 @@ We have two functions which build new urls for us
 """
 
 import re
+import numpy as np
 import pandas as pd
 import time
 import requests
 from bs4 import BeautifulSoup
-from elis_functions import cleanEmail
+from elis_functions import cleanEmail, validateEmails
+from domain_extraction import extract as extract_domain
 from googlesearch import search
 
 # list of domain names we don't want
@@ -29,9 +34,10 @@ bad_domain_names = ['yahoo.com', 'gmail.com', "hotmail.com", "icloud.com", "comc
 
 # regex to detect valid email (works great so far, may need building upon
 email_regex = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
+email_pattern = re.compile(email_regex)
 
 # list of rating sites for generating urls without emails.
-rating_sites = ['mapquest', 'yelp', 'bbb', 'podium', 'porch', 'chamberofcommerce', 'angi']
+rating_sites = frozenset(['mapquest', 'yelp', 'bbb', 'podium', 'porch', 'chamberofcommerce', 'angi'])
 
 
 def build_url_from_email(email):
@@ -47,6 +53,25 @@ def build_url_from_email(email):
             return "https://www.{0}/".format(domain_name)
 
 
+def build_urls_from_emails(emails):
+    """
+    build_url_from_email for a batch of emails. The emails are cleaned with validateEmails,
+    which doesn't print anything, instead of one cleanEmail call per email.
+    :param emails: pandas Series or list of emails
+    :return: (urls, reasons) NumPy arrays: the url built from each email (None if there is none) and
+             the reason code of each email (see elis_functions.emailReasons)
+    """
+    emails = list(emails)
+    cleaned, reasons = validateEmails(emails)
+    urls = np.full(len(emails), None, dtype=object)
+    for i, (email, cleaned_email) in enumerate(zip(emails, cleaned)):
+        if cleaned_email and email_pattern.fullmatch(cleaned_email):
+            domain_name = email.split("@")[-1]
+            if domain_name not in bad_domain_names:
+                urls[i] = "https://www.{0}/".format(domain_name)
+    return urls, reasons
+
+
 def search_urls(df):
     """
     The Spring 2025 changed the time.sleep to 10seconds.
@@ -55,9 +80,9 @@ def search_urls(df):
     :return: a list of new websites found via search which we should append to the dataframe OUTSIDE of the function
     """
     results = []
-    rating_sites = ['mapquest', 'yelp', 'bbb', 'podium', 'porch', 'chamberofcommerce', 'angi', "yellowpages",
-                    'localsolution', 'northdakota', 'allbiz', 'pitchbook', '411', 'dnd', 'thebluebook', 'opencorporates'
-                    'menupix', 'buildzoom', 'buzzfile', 'manta', 'dandb', 'bloomberg', 'nextdoor', 'dnb', 'homeadvisor']
+    rating_sites = frozenset(['mapquest', 'yelp', 'bbb', 'podium', 'porch', 'chamberofcommerce', 'angi', "yellowpages",
+                              'localsolution', 'northdakota', 'allbiz', 'pitchbook', '411', 'dnd', 'thebluebook', 'opencorporates',
+                              'menupix', 'buildzoom', 'buzzfile', 'manta', 'dandb', 'bloomberg', 'nextdoor', 'dnb', 'homeadvisor'])
 
     for index, row in df.iterrows():
         business_name = df.loc[index, "company_name"]
@@ -104,28 +129,15 @@ def filter(url, rating_sites):
     A function that checks if found url are rating sites
     Helper method to get_url_from_search
     :param url: the url
-    :param rating_sites: list of any known rating sites
+    :param rating_sites: set (or list) of any known rating sites
     :return: True if url is a not a rating site, false otherwise
     """
-    domain = extract_domain_name(url)    # print("Subdomain ", sub.domain)
-    for i in rating_sites:
-        if domain.lower() == i:
-            return False
-    return True
+    return extract_domain_name(url).lower() not in rating_sites
 
 
 def extract_domain_name(url):
-    # Fix this, www is being returned
-    # if contains www., extract word after www.
     """
-    Extracts domain name from a URL and returns it as a string.
+    Extracts the domain name of a URL without its subdomain or suffix and returns it as a string,
+    e.g. 'https://www.yelp.com/biz/x' -> 'yelp'
     """
-    new = url.split(".")
-    first = new[0]
-    if first[-3:] == "www":
-        first = new[1]
-    if first in rating_sites:
-        return
-    else:
-        return url
-    
\ No newline at end of file
+    return extract_domain(url).domain
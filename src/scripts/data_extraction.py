@@ -10,15 +10,31 @@ There are two types of functions you see here, listed below
 - functions which start with extract
     - Scrape html/soup for data types we are looking to fill in our csv file (emails, phone#s, addresses)
     - Return the data type(s) we found from that single html/soup
+The html/soup can come from any parser backend: build it with parser_backend.make_soup (lxml when
+installed, html.parser as fallback). The extract functions take an optional parser argument.
+The extract functions run in tiers, and a tier only runs if the ones before it found no usable values:
+    1. schema.org structured data (JSON-LD / microdata) read from the page bytes (structured_data)
+    2. regex scan of the page bytes (fast_scan)
+    3. the parsed DOM
 """
 
-import bs4
-from bs4 import BeautifulSoup, Comment
+import os
+import sys
 import requests
 import re
 import whois
 from urllib.parse import urlparse
+from itertools import islice
 import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from page_cache import get_page, get_soup
+from page_features import get_page_features
+from fast_scan import iter_mailto_links, iter_phone_texts
+from structured_data import read_structured_data
+from address_extraction import normalize_addresses, iter_page_addresses, find_addresses
+
+PHONE_REGEX = re.compile(r'(?:\+1\s*)?(?:\(?\d{3}\)?[\s.-]?)\d{3}[\s.-]?\d{4}')
+EMAIL_REGEX = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
 
 def contains_contacts_page(html):
     """
@@ -28,11 +44,9 @@ def contains_contacts_page(html):
     """
     if html is None:
         return False
-    # Find all a tags in the html
-    for tag in html.find_all('a'):
-        # Get the next href link and check if it contains the word contact
-        possible_contact = tag.get('href')
-        if possible_contact and 'contact' in possible_contact.lower():
+    # Check every href link on the page for the word contact
+    for possible_contact in get_page_features(html).links_lower:
+        if possible_contact and 'contact' in possible_contact:
             return True
     # No contacts page was found
     return False
@@ -48,23 +62,9 @@ def contains_business_name(html, business_name):
     if business_name == '':
         return False
     if html is not None:
-        # remove '&#39;' from string and replace with '
-        if re.search(r'&#39;', business_name):
-            business_name = re.sub('&#39;', '\'', business_name)
-        # remove any floating non-letter characters
-        if re.search(r'\s\W\s', business_name):
-            business_name = re.sub(r'\s\W\s', ' ', business_name)
-        # remove any non-letter/digit characters
-        business_name = re.sub(r'[^A-Za-z0-9\'\s]*', '', business_name)
-        name_lst = business_name.split()        # split business_name into list of words
-        found_name = 0                  # counter for every word in the list found on the html
-        for name in name_lst:           # loop through word in list
-            found = False
-            for text in html.find_all(text=True):
-                if name.lower() in text.lower():
-                    found = True        # found is mark true if word was found in html
-            if found:
-                found_name += 1         # add to counter
+        name_lst = _business_name_words(business_name)     # business_name as a list of lowercase words
+        # counter for every word in the list found on the html, looked up in the page's token index
+        found_name = get_page_features(html).count_words(name_lst)
         if found_name / len(name_lst) >= 0.5:     # if more than half of the words in the list were found in the html
             return True                          # then return True
         else:
@@ -73,6 +73,47 @@ def contains_business_name(html, business_name):
         return None
 
 
+def _business_name_words(business_name):
+    """
+    Cleans a business name and splits it into lowercase words for contains_business_name
+    """
+    # remove '&#39;' from string and replace with '
+    if re.search(r'&#39;', business_name):
+        business_name = re.sub('&#39;', '\'', business_name)
+    # remove any floating non-letter characters
+    if re.search(r'\s\W\s', business_name):
+        business_name = re.sub(r'\s\W\s', ' ', business_name)
+    # remove any non-letter/digit characters
+    business_name = re.sub(r'[^A-Za-z0-9\'\s]*', '', business_name)
+    return business_name.lower().split()
+
+
+def contains_business_names(htmls, business_names):
+    """
+    contains_business_name for a batch of firms. The words of every name are cleaned once into one
+    word set for the batch, and each page's token index is intersected with it in a single pass.
+    :param htmls: list of html/soup (or None), one per firm
+    :param business_names: list of business names, in the same order
+    :return: list of True/False/None, as contains_business_name would return for each pair
+    """
+    name_lsts = [None if business_name == '' else _business_name_words(business_name)
+                 for business_name in business_names]
+    batch_words = set().union(*(name_lst for name_lst in name_lsts if name_lst))
+    results = []
+    for html, name_lst in zip(htmls, name_lsts):
+        if name_lst is None:
+            results.append(False)
+        elif html is None:
+            results.append(None)
+        else:
+            features = get_page_features(html)
+            found = batch_words & features.tokens
+            # Words that aren't whole tokens may still be part of one (see PageFeatures.contains_word)
+            found_name = sum(1 for word in name_lst if word in found or features.contains_word(word))
+            results.append(found_name / len(name_lst) >= 0.5)
+    return results
+
+
 def contains_business_name_in_copyright(html, business_name):
     """
     Check if the given business name is present in the footer of the website by comparing the number of matching words
@@ -84,17 +125,14 @@ def contains_business_name_in_copyright(html, business_name):
     """
     if html is not None:
         try:
-            # Find the footer element in the HTML
-            footer = html.find('footer')
-
-            # If footer is found, extract the text and count the number of matching words
-            if footer is not None:
-                footer_text = footer.text
-                # extract all words from the footer text
-                footer_text_words = re.findall(r'\b\w+\b', footer_text.lower())
+            features = get_page_features(html)
+
+            # If footer is found, count the number of matching words
+            if features.footer_text is not None:
                 # extract all words from the business name
                 business_name_words = re.findall(r'\b\w+\b', business_name.lower())
-                matches = set(footer_text_words) & set(business_name_words)
+                # words of the footer text come from the page's token index
+                matches = features.footer_tokens & set(business_name_words)
                 num_matches = len(matches)
 
                 # Check if the number of matching words is at least 50% of the words in the business name
@@ -119,12 +157,10 @@ def contains_social_media_links(html):
     """
     if html is None:
         return False
-    links = html.find_all('a')
     # Check each link to see if it points to a social media website
     social_media_sites = ['facebook', 'twitter', 'instagram', 'linkedin']
-    for link in links:
-        href = link.get('href')
-        if href and any(site in href.lower() for site in social_media_sites):
+    for href in get_page_features(html).links_lower:
+        if href and any(site in href for site in social_media_sites):
             return True
     # If we didn't find any social media links, return False
     return False
@@ -138,9 +174,8 @@ def contains_reviews_page(html):
     """
     if html is None:
         return False
-    for tag in html.find_all('a'):
-        possible_review = tag.get('href')
-        if possible_review and 'review' in possible_review.lower():
+    for possible_review in get_page_features(html).links_lower:
+        if possible_review and 'review' in possible_review:
             return True
     return False
 
@@ -155,22 +190,9 @@ def contains_zipCode(html, zip_code):
     if html is not None and zip_code is not None:
         zip_code = zip_code[:-2]
         try:
-            # Look for zip code in the body of the HTML
-            body_text = html.text.lower()
-            zip_regex = re.compile(r'\b\d{5}\b')
-            body_matches = zip_regex.findall(body_text)
-
-            # If zip code not found in body, look in footer of the HTML
-            if not body_matches:
-                footer = html.find('footer')
-                if footer is not None:
-                    footer_text = footer.text.lower()
-                    footer_matches = zip_regex.findall(footer_text)
-                    body_matches += footer_matches
-
-            # Check if the zip code is in the list of matches or present in the HTML using regex
-            regex = r'.*' + str(zip_code) + '.*'
-            return str(zip_code) in body_matches or re.search(regex, html)
+            # 5-digit words in the text of the HTML (the footer is part of the text)
+            body_matches = get_page_features(html).zip_codes
+            return str(zip_code) in body_matches
         except Exception as e:
             return False
     else:
@@ -185,14 +207,10 @@ def contains_phone_number(html, phone_number):
         :return: True if the phone num is found in the html, False if not
         """
     if html is not None and phone_number is not None:
-        phone_numbers = []
         phone_number = phone_number[:-2]
-        counter = 0
-        for tag in html.find_all(text=re.compile(r"(\d{3})\D*(\d{3})\D*(\d{4})")):
-            if len(tag.string) < 15:
-                tag = _strip_non_integers(tag.string)
-                phone_numbers.append(tag)
-                counter += 1
+        # Text nodes that look like phone numbers, collected when the page was first read
+        phone_numbers = [_strip_non_integers(text) for text in get_page_features(html).phone_texts
+                         if len(text) < 15]
         if phone_number in phone_numbers:
             return True
     return False
@@ -212,14 +230,11 @@ def contains_email(html, email):
     """
     if pd.isnull(email) or html is None:
         return False
-    emails = []
-    for tag in html.find_all('a'):
-        href = tag.get('href')
-        if href:
-            if "@" in href:
-                emails.append(href)
+    features = get_page_features(html)
+    emails = [href for href in features.links if href and "@" in href]
     if email in emails:
         return True
+    href = features.last_link
     if href is not None and email in href:
         return True
     return False
@@ -265,88 +280,220 @@ def url_is_review_page(url):
     return False
 
 
-def extract_phone_data(business_id, url):
+def extract_phone_data(business_id, url, parser=None, limit=None, known=None):
     """
     The Spring 25 team added a timeout to ensure that the program doesn't stall.
+    The page is read through the shared page cache, so a site is only downloaded once.
+    Telephones declared in the page's structured data are used first, then phone-shaped text scanned straight
+    from the page bytes (fast_scan); the page is only parsed when both find nothing new.
     Finds phone numbers in the given url's webpage
     :param url: url to search for phone numbers in
-    :return: dictionary of all phone numbers found in the given url's webpage
+    :param parser: html parser backend, the configured parser_backend.PARSER_BACKEND if None
+    :param limit: stop once this many new phone numbers are found, None for all of them. known is only read, so
+                  values found for other firms since known was filled still count as new
+    :param known: set of phone numbers to skip (e.g. the ones already stored for the batch)
+    :return: list of the new phone numbers found in the given url's webpage, None if there are none
+    """
+    phone_numbers = list(islice(iter_phone_data(business_id, url, parser=parser, known=known), limit))
+    if len(phone_numbers) >= 1:
+        return phone_numbers
+    else:
+        return None
+
+
+def iter_phone_data(business_id, url, parser=None, known=None):
+    """
+    Lazily finds phone numbers in the given url's webpage: the page is scanned only as far as the
+    caller reads, so a caller that needs a few numbers can stop early.
+    :param url: url to search for phone numbers in
+    :param parser: html parser backend, used only if the page has to be parsed
+    :param known: set of phone numbers to skip
+    :return: generator of new, unique phone numbers in page order
     """
     try:
-        response = requests.get(url, timeout=10)
-        soup = bs4.BeautifulSoup(response.content, "html.parser")
+        page = get_page(url, timeout=10)
+        tiers = (
+            # Telephones the page declares in its structured data
+            lambda: read_structured_data(page.content).telephones,
+            # Fast path: no DOM, script and style content skipped
+            lambda: iter_phone_texts(page.content),
+            # Only the text nodes already flagged as phone-like can match the stricter regex
+            lambda: get_page_features(get_soup(url, timeout=10, parser=parser)).phone_texts,
+        )
+        yield from _iter_tiers(tiers, _iter_phone_numbers, known)
 
     except requests.exceptions.Timeout:
         print(f"[Timeout] Skipping {url}")
-        return None
     except Exception as e:
         print(f"[Error] Skipping {url}: {e}")
-        return None
 
-    # Extract phone numbers from soup using regex for phone numbers
-    phone_numbers = []
-    counter = 0
-    try:
 
-        for tag in soup.find_all(text=re.compile(r'(?:\+1\s*)?(?:\(?\d{3}\)?[\s.-]?)\d{3}[\s.-]?\d{4}')):
-            counter += 1
-            cleaned_number = re.sub(r'[^\d]', '', tag.string)  # Remove non-digit characters
-            if len(cleaned_number) == 10 or (len(cleaned_number) == 11 and cleaned_number.startswith('1')):
-                phone_numbers.append(cleaned_number)
-    except:
-        return None
-    if len(phone_numbers) >= 1:
-        return phone_numbers
+def _iter_phone_numbers(texts, known=None):
+    """
+    Extract phone numbers from page text using regex for phone numbers
+    :param texts: iterable of text strings
+    :param known: set of phone numbers to skip
+    :return: generator of unique 10 digit (or 11 digit starting with 1) phone numbers
+    """
+    found = set()
+    for text in texts:
+        if not PHONE_REGEX.search(text):
+            continue
+        cleaned_number = re.sub(r'[^\d]', '', text)  # Remove non-digit characters
+        if len(cleaned_number) == 10 or (len(cleaned_number) == 11 and cleaned_number.startswith('1')):
+            if cleaned_number in found or (known is not None and cleaned_number in known):
+                continue
+            found.add(cleaned_number)
+            yield cleaned_number
+
+
+def extract_email_data(business_id, url, parser=None, limit=None, known=None):
+    """
+    The Spring 25 team added headers and a timeout.
+    The page is read through the shared page cache (headers are set there), so a site is only downloaded once.
+    Emails declared in the page's structured data are used first, then mailto: links scanned straight from
+    the page bytes (fast_scan); the page is only parsed when both find nothing new.
+    Finds email addresses in the given url's webpage
+    :param business_id: id associated with a business
+    :param url: url to search for emails in
+    :param parser: html parser backend, the configured parser_backend.PARSER_BACKEND if None
+    :param limit: stop once this many new emails are found, None for all of them. known is only read, so
+                  values found for other firms since known was filled still count as new
+    :param known: set of emails to skip (e.g. the ones already stored for the batch)
+    :return: list of the new valid emails found in the given url's webpage, None if there are none
+    """
+    email_addresses = list(islice(iter_email_data(business_id, url, parser=parser, known=known), limit))
+    if len(email_addresses) >= 1:
+        return email_addresses
     else:
         return None
 
 
-def extract_email_data(business_id, url):
+def iter_email_data(business_id, url, parser=None, known=None):
     """
-    The Spring 25 team added headers and a timeout.
-    Finds email addresses in the given url's webpage
+    Lazily finds email addresses in the given url's webpage: the page is scanned only as far as the
+    caller reads, so a caller that needs a few emails can stop early.
     :param business_id: id associated with a business
     :param url: url to search for emails in
-    :return: list of all valid emails found in the given url's webpage
-    """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,/;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    }
+    :param parser: html parser backend, used only if the page has to be parsed
+    :param known: set of emails to skip
+    :return: generator of new, unique valid emails in page order
+    """
     try:
-        response = requests.get(url,headers=headers ,timeout=10)
-        soup = BeautifulSoup(response.content, "html.parser")
+        page = get_page(url, timeout=10)
+        tiers = (
+            # Emails the page declares in its structured data
+            lambda: read_structured_data(page.content).emails,
+            # Fast path: no DOM. [7:] removes the 'mailto:' prefix
+            lambda: (link[7:] for link in iter_mailto_links(page.content)),
+            lambda: (link[7:] for link in get_page_features(get_soup(url, timeout=10, parser=parser)).mailto_links),
+        )
+        yield from _iter_tiers(tiers, _iter_emails, known)
 
     except requests.exceptions.Timeout:
         print(f"[Timeout] Skipping {url}")
-        return None
     except Exception as e:
         print(f"[Error] Skipping {url}: {e}")
-        return None
-        
-
-    # Extract email addresses
-    email_addresses = []
-    email_number = 0
-    for tag in soup.find_all('a'):
-        email = tag.get('href')
-        if email and 'mailto:' in email:
-            email = email[7:]  # Remove the 'mailto:' prefix
-            email = email.split('?')[0]  # Remove query strings if present
-            
-            # Use regex to validate and clean the email address
-            match = re.search(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', email)
-            if match:
-                cleaned_email = match.group(0)  # Extract the valid email address
-                if cleaned_email not in email_addresses:  # Avoid duplicates
-                    email_number += 1
-                    email_addresses.append(cleaned_email)
 
-    if len(email_addresses) >= 1:
-        return email_addresses
+
+def _iter_emails(emails, known=None):
+    """
+    Extract email addresses from mailto: link targets
+    :param emails: iterable of candidate strings (mailto: hrefs without the 'mailto:' prefix)
+    :param known: set of emails to skip
+    :return: generator of unique valid email addresses, in page order
+    """
+    found = set()
+    for email in emails:
+        email = email.split('?')[0]  # Remove query strings if present
+
+        # Use regex to validate and clean the email address
+        match = EMAIL_REGEX.search(email)
+        if match:
+            cleaned_email = match.group(0)  # Extract the valid email address
+            # Avoid duplicates
+            if cleaned_email in found or (known is not None and cleaned_email in known):
+                continue
+            found.add(cleaned_email)
+            yield cleaned_email
+
+
+def extract_address_data(business_id, url, parser=None, limit=None, known=None):
+    """
+    Finds US and Canadian street addresses in the given url's webpage. The state is abbreviated and the zip
+    checked against it (address_extraction).
+    :param business_id: id associated with a business
+    :param url: url to search for addresses in
+    :param parser: html parser backend, the configured parser_backend.PARSER_BACKEND if None
+    :param limit: stop once this many new addresses are found, None for all of them. known is only read, so
+                  values found for other firms since known was filled still count as new
+    :param known: set of one-line addresses to skip
+    :return: list of address dicts (street, city, state, zip, country and address, the one-line form),
+             None if there are none
+    """
+    addresses = list(islice(iter_address_data(business_id, url, parser=parser, known=known), limit))
+    if len(addresses) >= 1:
+        return addresses
     else:
         return None
+
+
+def iter_address_data(business_id, url, parser=None, known=None):
+    """
+    Lazily finds addresses in the given url's webpage
+    :param business_id: id associated with a business
+    :param url: url to search for addresses in
+    :param parser: html parser backend, used only if the page has to be parsed
+    :param known: set of one-line addresses to skip
+    :return: generator of new, unique address dicts in page order
+    """
+    try:
+        page = get_page(url, timeout=10)
+        tiers = (
+            # Addresses the page declares in its structured data
+            lambda: normalize_addresses(read_structured_data(page.content).addresses),
+            # Street address blocks in the page text, read from the page bytes
+            lambda: iter_page_addresses(page.content),
+            lambda: find_addresses(get_soup(url, timeout=10, parser=parser).get_text(' ')),
+        )
+        yield from _iter_tiers(tiers, _iter_addresses, known)
+
+    except requests.exceptions.Timeout:
+        print(f"[Timeout] Skipping {url}")
+    except Exception as e:
+        print(f"[Error] Skipping {url}: {e}")
+
+
+def _iter_addresses(addresses, known=None):
+    """
+    Deduplicates address dicts on their one-line form
+    :param addresses: iterable of address dicts
+    :param known: set of one-line addresses to skip
+    :return: generator of unique address dicts, in page order
+    """
+    found = set()
+    for address in addresses:
+        line = address['address']
+        if line in found or (known is not None and line in known):
+            continue
+        found.add(line)
+        yield address
+
+
+def _iter_tiers(tiers, clean, known=None):
+    """
+    Runs the tiers of an extractor in order, stopping after the first tier that yields any cleaned values.
+    A tier whose candidates are all dropped by clean (malformed, placeholders, already known) falls
+    through to the next one.
+    :param tiers: functions returning iterables of raw candidates, cheapest first
+    :param clean: function(candidates, known) yielding the cleaned values
+    :param known: set of values to skip
+    :return: generator of cleaned values
+    """
+    for tier in tiers:
+        found = False
+        for value in clean(tier(), known):
+            found = True
+            yield value
+        if found:
+            return
@@ -0,0 +1,165 @@
+"""
+Negative cache of dead and unreachable hosts, kept across runs.
+status_code used to return -1 on any exception and forget about it, so the next batch (or run) tried
+the same dead domain again and waited out the full timeout. Host-level failures (DNS errors, refused
+connections, timeouts, SSL errors) are now recorded per host with:
+- the reason of the last failure and how many connection errors and timeouts in a row the host has had
+- the time of the next retry. A single failure can be a transient blip, so a host is only skipped
+  after DEAD_AFTER_ERRORS connection errors or DEAD_AFTER_TIMEOUTS timeouts in a row (a slow reply
+  doesn't mean the host is gone). From then on the wait backs off exponentially from BASE_BACKOFF
+  up to MAX_BACKOFF with every further failure.
+Until then is_dead(url) is True and callers skip the host immediately. A successful response removes
+the host from the cache. The cache is saved to DEAD_HOSTS_FILE every SAVE_INTERVAL seconds and at exit.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+import requests
+from urllib.parse import urlparse
+
+
+#Negative cache configuration
+DEAD_HOSTS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.cache', 'dead_hosts.json'))
+DEAD_AFTER_ERRORS = 3               # connection errors in a row (DNS, refused, reset, SSL) before skipping a host
+DEAD_AFTER_TIMEOUTS = 6             # timeouts in a row before skipping a host
+BASE_BACKOFF = 10 * 60              # seconds before the first retry of a skipped host
+MAX_BACKOFF = 30 * 24 * 60 * 60     # longest wait between retries
+SAVE_INTERVAL = 30                  # seconds between saves to disk
+
+
+class DeadHostError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request to a host the negative cache says is dead
+    """
+
+
+_hosts = None
+_lock = threading.Lock()
+_state = {'dirty': False, 'saved_at': 0.0}
+
+
+def _host(url):
+    if not isinstance(url, str):
+        return None
+    try:
+        return urlparse(url).hostname
+    except ValueError:
+        return None
+
+
+def _load():
+    global _hosts
+    if _hosts is None:
+        try:
+            with open(DEAD_HOSTS_FILE) as f:
+                _hosts = json.load(f)
+        except (OSError, ValueError):
+            _hosts = {}
+    return _hosts
+
+
+def save_dead_hosts():
+    """
+    Writes the negative cache to DEAD_HOSTS_FILE if it has changed
+    """
+    with _lock:
+        if not _state['dirty']:
+            return
+        data = json.dumps(_load())
+        _state['dirty'] = False
+        _state['saved_at'] = time.time()
+    try:
+        os.makedirs(os.path.dirname(DEAD_HOSTS_FILE), exist_ok=True)
+        tmp_path = DEAD_HOSTS_FILE + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, DEAD_HOSTS_FILE)
+    except OSError as e:
+        print(f"[Error] Could not save dead hosts: {e}")
+
+
+atexit.register(save_dead_hosts)
+
+
+def _changed():
+    # Called with _lock held
+    _state['dirty'] = True
+    return time.time() - _state['saved_at'] > SAVE_INTERVAL
+
+
+def is_dead(url):
+    """
+    Checks whether the url's host has failed recently and is not due for a retry yet
+    :param url: url about to be requested
+    :return: True if the request should be skipped
+    """
+    host = _host(url)
+    if host is None:
+        return False
+    with _lock:
+        entry = _load().get(host)
+        return entry is not None and time.time() < entry['next_retry']
+
+
+def backoff_for(failures, timeouts):
+    """
+    Returns how long a host is skipped after its latest failure
+    :param failures: connection errors in a row
+    :param timeouts: timeouts in a row
+    :return: seconds to wait before the next request, 0 while the host isn't dead yet
+    """
+    level = max(failures - DEAD_AFTER_ERRORS, timeouts - DEAD_AFTER_TIMEOUTS)
+    if level < 0:
+        return 0
+    return min(MAX_BACKOFF, BASE_BACKOFF * 2 ** level)
+
+
+def record_failure(url, reason, timeout=False):
+    """
+    Records a host-level failure for the url's host and schedules its next retry
+    :param url: url whose request failed
+    :param reason: short description of the failure, e.g. the exception class name
+    :param timeout: True if the request timed out, False for a connection error
+    """
+    host = _host(url)
+    if host is None:
+        return
+    now = time.time()
+    with _lock:
+        hosts = _load()
+        entry = hosts.get(host, {})
+        failures = entry.get('failures', 0) + (0 if timeout else 1)
+        timeouts = entry.get('timeouts', 0) + (1 if timeout else 0)
+        hosts[host] = {'reason': str(reason), 'failures': failures, 'timeouts': timeouts,
+                       'last_failure': now, 'next_retry': now + backoff_for(failures, timeouts)}
+        save = _changed()
+    if save:
+        save_dead_hosts()
+
+
+def record_success(url):
+    """
+    Removes the url's host from the negative cache after a successful response
+    """
+    host = _host(url)
+    if host is None:
+        return
+    with _lock:
+        if _load().pop(host, None) is None:
+            return
+        save = _changed()
+    if save:
+        save_dead_hosts()
+
+
+def dead_host_stats():
+    """
+    Returns the number of hosts in the negative cache and how many are currently being skipped
+    """
+    now = time.time()
+    with _lock:
+        hosts = _load()
+        skipped = sum(1 for entry in hosts.values() if now < entry['next_retry'])
+        return {'hosts': len(hosts), 'skipped': skipped}
@@ -0,0 +1,98 @@
+"""
+Offline, memoized domain extraction shared by every tldextract caller (getDomain, getDomainName,
+create_urls.filter and the politeness scheduler).
+tldextract.extract fetches the public suffix list over the network the first time it is used and
+only falls back to its bundled copy after the fetch fails, which stalls the first call on hosts
+without internet access. It also parses every url again, even though a batch holds the same few
+hosts many times. This module instead:
+- builds one TLDExtract lazily from a suffix list snapshot, never from the network: the snapshot
+  bundled with tldextract, or the file named by SUFFIX_LIST_FILE (e.g. a copy of
+  https://publicsuffix.org/list/public_suffix_list.dat kept with the deployment)
+- records which snapshot is in use (suffix_list_version)
+- caches the result per host (lenient_netloc of the url) in an LRU of HOST_CACHE_SIZE entries
+"""
+import os
+import hashlib
+import threading
+from functools import lru_cache
+import tldextract
+from tldextract.remote import lenient_netloc
+
+
+#Suffix list configuration
+SUFFIX_LIST_FILE = os.environ.get('SUFFIX_LIST_FILE')     # local public suffix list, None for tldextract's snapshot
+HOST_CACHE_SIZE = 100000
+
+_extractor = None
+_version = None
+_lock = threading.Lock()
+
+
+def get_extractor():
+    """
+    Returns the shared TLDExtract, creating it from the offline suffix list on first use
+    """
+    global _extractor, _version
+    if _extractor is None:
+        with _lock:
+            if _extractor is None:
+                if SUFFIX_LIST_FILE:
+                    with open(SUFFIX_LIST_FILE, 'rb') as f:
+                        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+                    extractor = tldextract.TLDExtract(cache_dir=None, fallback_to_snapshot=False,
+                                                      suffix_list_urls=('file://' + os.path.abspath(SUFFIX_LIST_FILE),))
+                    _version = f"{os.path.basename(SUFFIX_LIST_FILE)} sha1:{digest}"
+                else:
+                    # No urls: the suffix list comes from the snapshot bundled with tldextract
+                    extractor = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=())
+                    _version = f"tldextract {tldextract.__version__} bundled snapshot"
+                _extractor = extractor
+    return _extractor
+
+
+def suffix_list_version():
+    """
+    Returns a description of the suffix list snapshot in use, loading it if needed
+    """
+    get_extractor()
+    return _version
+
+
+def host_of(url):
+    """
+    Returns the host of a url without scheme, user, port or path (e.g. 'http://www.acme.com:80/x'
+    -> 'www.acme.com'). Urls without a scheme ('acme.com/x') work too.
+    """
+    return lenient_netloc(url)
+
+
+@lru_cache(maxsize=HOST_CACHE_SIZE)
+def _extract_host(host):
+    return get_extractor()(host)
+
+
+def extract(url):
+    """
+    Drop-in replacement for tldextract.extract, cached per host
+    :param url: url or host name
+    :return: tldextract ExtractResult (subdomain, domain, suffix)
+    """
+    return _extract_host(host_of(url))
+
+
+def registered_domain(url):
+    """
+    Returns the registered domain of a url (e.g. 'https://shop.acme.co.uk/x' -> 'acme.co.uk'), or ''
+    if the url has no known suffix
+    """
+    extracted = extract(url)
+    if extracted.domain and extracted.suffix:
+        return extracted.domain + '.' + extracted.suffix
+    return ''
+
+
+def host_cache_stats():
+    """
+    Returns the hit/miss counts of the per-host cache
+    """
+    return _extract_host.cache_info()._asdict()
@@ -5,7 +5,11 @@ Created on Fri Jan 27 12:11:35 2023
 @author: Eli Johnson
 """
 
-import re, tldextract
+import os, sys, re
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from domain_extraction import extract as extractDomain
 
 # Incomplete, but sufficient for email/domain checking
 topLevelDomains = ['com', 'org', 'net', 'int', 'edu', 'gov', 'mil', 'info', 'top', 'xyz']
@@ -27,6 +31,16 @@ topLevelDomains += ['ac', 'ad', 'ae', 'af', 'ag', 'ai', 'al', 'am', 'ao', 'aq',
                     'sz', 'tc', 'td', 'tf', 'tg', 'th', 'tj', 'tk', 'tl', 'tm', 'tn', 'to', 'tr', 'tt', 'tv',
                     'tw', 'tz', 'ua', 'ug', 'uk', 'us', 'uy', 'uz', 'va', 'vc', 've', 'vg', 'vi', 'vn', 'vu',
                     'wf', 'ws', 'ye', 'yt', 'za', 'zm', 'zw']
+# Frozen once built: only used for membership checks
+topLevelDomains = frozenset(topLevelDomains)
+
+# Domains of hosting services, whose URLs don't connect back to the business
+# brief testing shows only the first three are of note, rest probably not necessary but added for completeness
+hostDomains = frozenset(['facebook.com', 'twitter.com', 'yext.com', 'bbb.com', 'youtube.com',
+                         'instagram.com', 'yelp.com', 'angi.com', 'angieslist.com', 'ebay.com',
+                         'linkedin.com', 'yellowpages.com', 'ethicalaz.com', 'ethicalcommunity.org',
+                         'ethicalwesternpa.com', 'wisebuyingmall.com', 'trustab.org', 'gotrust.org',
+                         'wordpress.com', 'bluehost.com'])
 
 stateProvinceToAbbrev = {'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'american samoa': 'AS',
                          # US states and territories
@@ -93,26 +107,51 @@ def isValidEmail(email):
         return False
 
 
+# Reason codes returned by _cleanEmailWithReason() and validateEmails()
+# 1-16 are cleanEmail's rules; 4 and 5 only clean the email, the others reject it
+EMAIL_OK = 0
+EMAIL_NOT_STRING = 17
+EMAIL_EMPTY = 18
+emailReasons = {1: ' 1. Removing email with no "@"',
+                2: ' 2. Removing email with no local part',
+                3: ' 3. Removing email with no domain',
+                4: ' 4. Removing start comment from email',
+                5: ' 5. Removing end comment from email',
+                6: ' 6. Removing email that is too long',
+                7: ' 7. Removing email with startquote not dot-separated',
+                8: ' 8. Removing email with endquote not dot-separated',
+                9: ' 9. Removing email with too many escape characters',
+                10: '10. Removing email that breaks dot rules',
+                11: '11. Removing email using illegal characters',
+                12: '12. Removing email with bad last character or unterminated quote',
+                13: '13. Removing email with too-short domain',
+                14: '14. Removing email that uses IP-style domain',
+                15: '15. Removing email with dotless domain, or too-short top-level domain',
+                16: '16. Removing email with unlisted top-level domain',
+                EMAIL_NOT_STRING: 'Removing email that is not a string',
+                EMAIL_EMPTY: 'Empty email'}
+
+
 # Comprehensive email validation and (attempted) cleaning
 # For a list of the syntactical rules of valid email addresses,
 # see: https://en.wikipedia.org/wiki/Email_address
 # In particular this shows that many of the "email validation"
 # regex you will find online is only approximately correct.
-# If the email is invalid and can't be cleaned, the function returns
-# an empty string
-def cleanEmail(email):
+# Returns the cleaned email and a reason code (see emailReasons), without printing.
+# If the email is invalid and can't be cleaned, the cleaned email is
+# an empty string. Codes of rules that only clean the email (4, 5) are
+# appended to notes, if a list is passed.
+def _cleanEmailWithReason(email, notes=None):
     if not isinstance(email, str):
-        print('cleanEmail passed ' + str(type(email)))
-        return ''
+        return '', EMAIL_NOT_STRING
     if email == '':
-        return email
+        return email, EMAIL_EMPTY
     email = email.strip().lower()
     split = email.split('@')
 
     # Remove emails with no "@"
     if len(split) < 2:
-        print(' 1. Removing email with no "@"')
-        return ''
+        return '', 1
     local_part = '@'.join(split[:-1])
     domain = split[-1]
 
@@ -125,27 +164,26 @@ def cleanEmail(email):
         domain = dom_srch.group(1)
     if local_part == '':
         # Bad: Empty local part
-        print(' 2. Removing email with no local part')
-        return ''
+        return '', 2
     if domain == '':
         # Bad: Empty domain
-        print(' 3. Removing email with no domain')
-        return ''
+        return '', 3
 
     # Remove (legal) comments in parens before or after local part
     pre_comment = re.search(r'^\(.*\)', local_part)
     if pre_comment:
-        print(' 4. Removing start comment from email')
+        if notes is not None:
+            notes.append(4)
         local_part = local_part[pre_comment.end():]
     post_comment = re.search(r'\(.*\)$', local_part)
     if post_comment:
-        print(' 5. Removing end comment from email')
+        if notes is not None:
+            notes.append(5)
         local_part = local_part[:post_comment.start()]
 
     # Remove addresses too long to be an email
     if len(local_part.encode('utf-8')) > 64 or len(domain.encode('utf-8')) > 255:
-        print(' 6. Removing email that is too long')
-        return ''
+        return '', 6
 
     last_ltr = ''
     in_quote = False
@@ -161,59 +199,62 @@ def cleanEmail(email):
                 in_quote = True
             else:
                 # Bad: Quoted strings must be dot-separated or the entire local part
-                print(' 7. Removing email with startquote not dot-separated')
-                return ''
+                return '', 7
         elif last_ltr == '"' and not in_quote and ltr != '.':
             # Bad: Endquotes must be dot-separated or at the end of the local part
-            print(' 8. Removing email with endquote not dot-separated')
-            return ''
+            return '', 8
         elif in_quote:
             if ltr == '\\':
                 escaped = not escaped
             elif escaped:
                 # Bad: Only backslashes and double quotes get escaped (otherwise this is an un-escaped backslash)
-                print(' 9. Removing email with too many escape characters')
-                return ''
+                return '', 9
         elif ltr == '.':
             if last_ltr in ('', '.'):
                 # Bad: Dots can't be consecutive or the first character
-                print('10. Removing email that breaks dot rules')
-                return ''
+                return '', 10
         elif not ltr.isalnum() and ltr not in r'!#$%&\'*+-/=?^_`{|}~':
             # Bad: Other special characters not allowed in unquoted strings
-            print('11. Removing email using illegal characters')
-            return ''
+            return '', 11
         last_ltr = ltr
     if last_ltr == '.' or in_quote:
         # Bad: Dot can't be last character
         # Bad: Local part can't end with unterminated quote
-        print('12. Removing email with bad last character or unterminated quote')
-        return ''
+        return '', 12
 
     if len(domain) < 4:
-        print('13. Removing email with too-short domain')
-        return ''
+        return '', 13
     elif domain[0] == '[' and domain[-1] == ']':
         # Legal, but IP-style email domain not supported yet
-        print('14. Removing email that uses IP-style domain')
-        return ''
+        return '', 14
     # If missing a dot before top-level domain, add it
     domain = re.sub('(?<!\.)((?=com$)|(?=net$)|(?=org$)|(?=edu$)|(?=gov$))', '..', domain)
     spl = domain.split('.')
     if len(spl) < 2 or len(spl[-1]) < 2:
         # Technically legal, but dotless emails discouraged (and unsupported here)
-        print('15. Removing email with dotless domain, or too-short top-level domain')
-        return ''
+        return '', 15
     elif spl[-1] not in topLevelDomains:
         # Bad top-level domain
-        print('16. Removing email with unlisted top-level domain')
-        return ''
+        return '', 16
     domain = domain.lower()  # standardize to lowercase
     domain = re.sub('[;:,]', '..', domain)  # change any [;:,] to . in domain
     domain = re.sub('\.om$', '.com', domain)  # replace .om with .com (if at the end)
 
     domain = re.sub('[^a-zA-Z0-9.-]', '', domain)  # remove non-alphanumeric or . or -
-    return local_part + '@' + domain
+    return local_part + '@' + domain, EMAIL_OK
+
+
+# Prints a message for every rule applied, see _cleanEmailWithReason() for a quiet version
+def cleanEmail(email):
+    notes = []
+    cleaned, reason = _cleanEmailWithReason(email, notes)
+    for code in notes:
+        print(emailReasons[code])
+    if reason == EMAIL_NOT_STRING:
+        print('cleanEmail passed ' + str(type(email)))
+    elif reason != EMAIL_OK and reason != EMAIL_EMPTY:
+        print(emailReasons[reason])
+    return cleaned
 
 
 # cleans messy zipcode data
@@ -258,20 +299,14 @@ def cheapValidateUSZip(zipcode, state_abbr):
 # but discards business URLs hosted on large platforms like facebook
 # since the domain will then not connect back to the business
 def getDomain(url):
-    # brief testing shows only the first three below are of note, rest probably not necessary but added for completeness
-    host_domains = ['facebook.com', 'twitter.com', 'yext.com', 'bbb.com', 'youtube.com',
-                    'instagram.com', 'yelp.com', 'angi.com', 'angieslist.com', 'ebay.com',
-                    'linkedin.com', 'yellowpages.com', 'ethicalaz.com', 'ethicalcommunity.org',
-                    'ethicalwesternpa.com', 'wisebuyingmall.com', 'trustab.org', 'gotrust.org',
-                    'wordpress.com', 'bluehost.com']
     url = url.lower()  # standardize to lowercase
     url = re.sub('[;,]|(:(?!//))', '..', url)  # change any [;:,] to . in URL
-    extracted = tldextract.extract(url)  # extract domain name
-    domain = '.'.join(extracted[1:])  # and join suffix
+    extracted = extractDomain(url)  # extract domain name (offline suffix list, cached per host)
+    domain = extracted.domain + '.' + extracted.suffix  # and join suffix
     domain = re.sub('\.om$', '.com', domain)  # replace .om with .com (if at the end)
     if re.search('(^www)|(http)|(\.$)', domain):  # discard if any 'www' or 'http' still appearing,
         return ''  # or if domain + suffix ends in a period
-    elif domain in host_domains:  # discard domains of hosting services
+    elif domain in hostDomains:  # discard domains of hosting services
         return ''
     elif domain.split('.')[-1] not in topLevelDomains:
         return ''
@@ -301,3 +336,170 @@ def validateZip(zipcode, stateprovince, country='US'):
     stateprovince = stateprovince.upper()
     rgx = zipValidation.get(stateprovince, '')
     return re.match(rgx, zipcode)
+
+
+##########################################################
+# Column-wise versions of the cleaners above             #
+# Each takes a pandas Series (or anything pd.Series()    #
+# accepts, e.g. a NumPy array), returns a Series with    #
+# the same index, and gives the same values as calling   #
+# the scalar function on every element.                  #
+##########################################################
+
+# Patterns used by the column-wise functions, compiled once
+# Plain ASCII emails: unquoted dot-separated local part, one "@", a domain of letters/digits/dots/hyphens.
+# For these, cleanEmail's character loop and its comment/angle-bracket handling change nothing.
+SIMPLE_EMAIL_REGEX = re.compile(r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@[a-z0-9.-]+")
+MISSING_TLD_DOT_REGEX = re.compile(r'(?<!\.)((?=com$)|(?=net$)|(?=org$)|(?=edu$)|(?=gov$))')
+OM_SUFFIX_REGEX = re.compile(r'\.om$')
+NON_ZIP_US_REGEX = re.compile('[^0-9-]')
+NON_ZIP_CAN_REGEX = re.compile('[^A-Z0-9]')
+ZIP_PLUS4_REGEX = re.compile('^[0-9]{1,5}-[0-9]{4}$')
+ZIP_TOO_LONG_REGEX = re.compile('^[0-9]{6,9}')
+ZIP_CAN_REGEX = re.compile('[A-Z][0-9][A-Z][0-9][A-Z][0-9]')
+URL_SEPARATOR_REGEX = re.compile('[;,]|(:(?!//))')
+BAD_DOMAIN_SERIES_REGEX = re.compile(r'^www|http|\.$')
+NAME_PUNCTUATION_REGEX = re.compile(r'[^a-z\s]')
+MULTI_SPACE_REGEX = re.compile(' {2,}')
+
+
+# Works on a copy with a plain 0..n-1 index (so duplicate index labels don't matter)
+# and returns the caller's index to put back on the result
+def _asSeries(values):
+    index = values.index if isinstance(values, pd.Series) else None
+    return pd.Series(np.asarray(values, dtype=object), dtype=object), index
+
+
+def _withIndex(result, index):
+    return result if index is None else pd.Series(result.to_numpy(), index=index)
+
+
+def _isStr(series):
+    return series.map(lambda value: isinstance(value, str)).astype(bool)
+
+
+# Batch email validation, without printing
+# Returns two NumPy arrays the length of emails: the cleaned emails ('' when rejected)
+# and the reason code of each one (see emailReasons, EMAIL_OK when accepted).
+# Plain emails are checked with vectorized string operations; anything unusual
+# (quotes, comments, angle brackets, non-ASCII, several "@", ...) goes through
+# _cleanEmailWithReason() one at a time
+def validateEmails(emails):
+    emails, _ = _asSeries(emails)
+    cleaned = np.full(len(emails), '', dtype=object)
+    reasons = np.zeros(len(emails), dtype=np.int8)
+    isStr = _isStr(emails)
+    stripped = emails[isStr].str.strip().str.lower()
+    simple = stripped.str.fullmatch(SIMPLE_EMAIL_REGEX).astype(bool)
+
+    plain = stripped[simple]
+    if len(plain):
+        split = plain.str.split('@', n=1)
+        local_part, domain = split.str[0], split.str[1]
+        # A column holds few distinct domains, so the domain rules run once per distinct domain
+        codes, uniqueDomains = pd.factorize(domain)
+        uniqueDomains = pd.Series(uniqueDomains, dtype=object)
+        length = uniqueDomains.str.len()
+        fixedDomains = uniqueDomains.str.replace(MISSING_TLD_DOT_REGEX, '..', regex=True)
+        tld = fixedDomains.str.rsplit('.', n=1).str[-1]
+        # Same order as the rules in _cleanEmailWithReason(): later assignments are the earlier rules
+        domainReasons = np.zeros(len(uniqueDomains), dtype=np.int8)
+        domainReasons[~tld.isin(topLevelDomains).to_numpy()] = 16
+        domainReasons[~(fixedDomains.str.contains('.', regex=False) & (tld.str.len() >= 2)).to_numpy()] = 15
+        domainReasons[(length < 4).to_numpy()] = 13
+        domainReasons[(length > 255).to_numpy()] = 6
+        fixedDomains = fixedDomains.str.replace(OM_SUFFIX_REGEX, '.com', regex=True)
+
+        plainReasons = domainReasons[codes]
+        plainReasons[(local_part.str.len() > 64).to_numpy()] = 6
+        positions = plain.index.to_numpy()
+        reasons[positions] = plainReasons
+        ok = plainReasons == EMAIL_OK
+        cleaned[positions[ok]] = (local_part + '@' + fixedDomains.to_numpy()[codes]).to_numpy()[ok]
+
+    other = emails.index[~isStr | ~simple.reindex(emails.index, fill_value=False)].to_numpy()
+    for position in other:
+        cleaned[position], reasons[position] = _cleanEmailWithReason(emails[position])
+    return cleaned, reasons
+
+
+# Counts the reason codes returned by validateEmails()
+# Returns a dict of {reason message: count} for every rejection reason that occurs
+def emailRejectionHistogram(reasons):
+    counts = np.bincount(np.asarray(reasons, dtype=np.int64), minlength=len(emailReasons) + 1)
+    return {emailReasons[code]: int(count) for code, count in enumerate(counts)
+            if count and code != EMAIL_OK}
+
+
+# Column-wise cleanEmail(), without its messages (see validateEmails() for the reasons)
+def cleanEmail_series(emails):
+    emails, index = _asSeries(emails)
+    cleaned, _ = validateEmails(emails)
+    return _withIndex(pd.Series(cleaned, dtype=object), index)
+
+
+# Column-wise cleanZip()
+def cleanZip_series(zipcodes, country='USA'):
+    zipcodes, index = _asSeries(zipcodes)
+    zipcodes = zipcodes.map(str).astype(object)
+    if country == 'USA':
+        zipcodes = zipcodes.str.replace(NON_ZIP_US_REGEX, '', regex=True)
+        plus4 = zipcodes.str.match(ZIP_PLUS4_REGEX).astype(bool)
+        tooLong = ~plus4 & zipcodes.str.match(ZIP_TOO_LONG_REGEX).astype(bool)
+        zipcodes = zipcodes.where(~plus4, zipcodes.str.split('-').str[0])
+        zipcodes = zipcodes.where(~tooLong, zipcodes.str[:-4])
+        return _withIndex(zipcodes.str.pad(5, side='left', fillchar='0'), index)
+    elif country == 'CAN':
+        zipcodes = zipcodes.str.upper().str.replace(NON_ZIP_CAN_REGEX, '', regex=True)
+        valid = zipcodes.str.match(ZIP_CAN_REGEX).astype(bool)
+        return _withIndex((zipcodes.str[:3] + ' ' + zipcodes.str[3:6]).where(valid, ''), index)
+    # other country formats not implemented
+    else:
+        return _withIndex(zipcodes.str.upper(), index)
+
+
+# Column-wise cheapValidateUSZip(), returning True/False instead of a match object
+# states can be one state for every zip, or a Series/array of states
+def cheapValidateUSZip_series(zipcodes, states):
+    zipcodes, index = _asSeries(zipcodes)
+    if isinstance(states, str) or not np.iterable(states):
+        states = pd.Series(states, index=zipcodes.index, dtype=object)
+    else:
+        states, _ = _asSeries(states)
+    result = pd.Series(False, index=zipcodes.index)
+    valid = _isStr(zipcodes) & _isStr(states)
+    upper = states[valid].str.upper()
+    # One vectorized match per state
+    for state, stateZips in zipcodes[valid].groupby(upper):
+        rgx = zipValidation.get(state, '')
+        result[stateZips.index] = stateZips.str.match(rgx).astype(bool)
+    return _withIndex(result, index)
+
+
+# Column-wise getDomain()
+# the domain is only extracted once per distinct url
+def getDomain_series(urls):
+    urls, index = _asSeries(urls)
+    isStr = _isStr(urls)
+    urls = urls[isStr].str.lower().str.replace(URL_SEPARATOR_REGEX, '..', regex=True)
+    extracted = {}
+    for url in urls.unique():
+        parts = extractDomain(url)
+        extracted[url] = parts.domain + '.' + parts.suffix
+    domains = urls.map(extracted).astype(object)
+    domains = domains.str.replace(OM_SUFFIX_REGEX, '.com', regex=True)
+    bad = domains.str.contains(BAD_DOMAIN_SERIES_REGEX).astype(bool) | domains.isin(hostDomains) | \
+        ~domains.str.rsplit('.', n=1).str[-1].isin(topLevelDomains)
+    # Values that aren't strings get '' (getDomain() can't take them)
+    result = pd.Series('', index=isStr.index, dtype=object)
+    result[domains.index] = domains.where(~bad, '')
+    return _withIndex(result, index)
+
+
+# Column-wise standardizeName()
+def standardizeName_series(names):
+    names, index = _asSeries(names)
+    names = names.str.lower()
+    names = names.str.replace('&', ' and ', regex=False)
+    names = names.str.replace(NAME_PUNCTUATION_REGEX, '', regex=True)
+    return _withIndex(names.str.replace(MULTI_SPACE_REGEX, ' ', regex=True), index)
@@ -0,0 +1,121 @@
+"""
+Process-wide thread pool for the url checks.
+get_statuscode and get_statuscode_forPandas used to build a new 70-thread executor on every call and
+never shut it down, so a long multi-batch run kept piling up threads. They now share one executor:
+- start_executor / shutdown_executor: explicit startup and shutdown (shutdown also runs at exit)
+- submit / map_bounded: queue work on the shared pool. At most max_queue tasks wait for a free
+  worker; past that, submitting blocks until a task finishes (backpressure)
+- executor_stats: how many tasks are queued and how many workers are busy
+"""
+import atexit
+import threading
+import ThreadPoolExecutorPlus
+
+
+#Pool configuration
+MAX_WORKERS = 70
+MAX_QUEUE = 500
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+_config = {'max_workers': MAX_WORKERS, 'max_queue': MAX_QUEUE}
+_counts = {'active': 0, 'queued': 0, 'completed': 0}
+
+
+def start_executor(max_workers=MAX_WORKERS, max_queue=MAX_QUEUE):
+    """
+    Starts the shared executor. Does nothing if it is already running.
+    :param max_workers: number of worker threads
+    :param max_queue: number of tasks that may wait for a worker before submit blocks
+    :return: the executor
+    """
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutorPlus.ThreadPoolExecutor(max_workers=max_workers)
+            _slots = threading.BoundedSemaphore(max_workers + max_queue)
+            _config['max_workers'] = max_workers
+            _config['max_queue'] = max_queue
+        return _executor
+
+
+def get_executor():
+    """
+    Returns the shared executor, starting it with the default configuration if needed
+    """
+    if _executor is None:
+        return start_executor()
+    return _executor
+
+
+def shutdown_executor(wait=True):
+    """
+    Shuts the shared executor down. The next submit starts a new one.
+    :param wait: wait for the running tasks to finish
+    """
+    global _executor, _slots
+    with _lock:
+        executor = _executor
+        _executor = None
+        _slots = None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown_executor)
+
+
+def _run(slots, fn, args):
+    with _lock:
+        _counts['queued'] -= 1
+        _counts['active'] += 1
+    try:
+        return fn(*args)
+    finally:
+        with _lock:
+            _counts['active'] -= 1
+            _counts['completed'] += 1
+        slots.release()
+
+
+def submit(fn, *args):
+    """
+    Submits fn(*args) to the shared executor, blocking while the queue is full
+    :return: a concurrent.futures.Future
+    """
+    executor = get_executor()
+    slots = _slots
+    slots.acquire()
+    with _lock:
+        _counts['queued'] += 1
+    try:
+        return executor.submit(_run, slots, fn, args)
+    except BaseException:
+        with _lock:
+            _counts['queued'] -= 1
+        slots.release()
+        raise
+
+
+def map_bounded(fn, *iterables):
+    """
+    Like executor.map, but on the shared executor and with backpressure
+    :param fn: function to call
+    :param iterables: the arguments, one iterable per parameter of fn
+    :return: list of results, in the order of the arguments
+    """
+    futures = [submit(fn, *args) for args in zip(*iterables)]
+    return [future.result() for future in futures]
+
+
+def executor_stats():
+    """
+    Returns a dictionary describing the shared executor: whether it is running, its configuration,
+    the number of tasks waiting for a worker, workers busy and tasks completed
+    """
+    with _lock:
+        stats = dict(_config)
+        stats.update(_counts)
+        stats['running'] = _executor is not None
+    return stats
@@ -0,0 +1,61 @@
+"""
+DOM-free fast path for extract_email_data and extract_phone_data.
+Those two jobs only need the mailto: hrefs and the phone-shaped text of a page, but they used to
+build a full BeautifulSoup tree first (and the phone job ran its regex over script and style content
+too). The scanners here run precompiled bytes regexes directly over the response body through a
+memoryview, so the page is never decoded or copied as a whole:
+- iter_mailto_links(content) yields the mailto: href of every <a> tag
+- iter_phone_texts(content) yields every text segment between two tags that looks like a phone number
+Script and style blocks and html comments are skipped. Only the short matched pieces are decoded.
+The callers fall back to the parsed DOM when the fast path finds nothing, e.g. for a page in a
+charset that isn't ASCII-compatible.
+"""
+import re
+import html
+
+
+#One pass over the page: skippable blocks, <a href="mailto:..."> links and text between tags
+PAGE_SCAN_REGEX = re.compile(
+    rb'(?is:<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->)'
+    rb'|(?i:<a\b[^>]*?\bhref\s*=\s*["\']?\s*)(?P<mailto>mailto:[^"\'>\s]*)'
+    rb'|>(?P<text>[^<>]+)(?=<)'
+)
+#Same shape as data_extraction.PHONE_REGEX, for bytes
+PHONE_BYTES_REGEX = re.compile(rb'(?:\+1\s*)?(?:\(?\d{3}\)?[\s.-]?)\d{3}[\s.-]?\d{4}')
+
+
+def _as_buffer(content):
+    # Pages from the cache are bytes; accept str too so the scanners work on any page body
+    if isinstance(content, str):
+        content = content.encode('utf-8', 'replace')
+    return memoryview(content or b'')
+
+
+def _decode(piece):
+    text = piece.decode('utf-8', 'replace')
+    # Entities like &#64; or &nbsp; would otherwise be read as part of the address/number
+    return html.unescape(text) if '&' in text else text
+
+
+def iter_mailto_links(content):
+    """
+    Yields the mailto: hrefs of the <a> tags in a page body, without parsing the page
+    :param content: page body (bytes)
+    :return: generator of href strings starting with 'mailto:'
+    """
+    for match in PAGE_SCAN_REGEX.finditer(_as_buffer(content)):
+        if match.group('mailto') is not None:
+            yield _decode(match.group('mailto'))
+
+
+def iter_phone_texts(content):
+    """
+    Yields the text segments of a page body that contain a phone-shaped number, without parsing the
+    page. Script, style and comment content is skipped.
+    :param content: page body (bytes)
+    :return: generator of text strings
+    """
+    for match in PAGE_SCAN_REGEX.finditer(_as_buffer(content)):
+        start, end = match.span('text')
+        if start != -1 and PHONE_BYTES_REGEX.search(match.string, start, end):
+            yield _decode(match.group('text'))
@@ -13,13 +13,15 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import config.connect_iabbb as ci
-from setup import getBusinessDataBatch, getScriptId, getExistingScriptId, initiateScriptActivity, terminateScriptActivity, logProcessedToDB
+from setup import WorkCursor, getBusinessDataBatch, getScriptId, getExistingScriptId, initiateScriptActivity, terminateScriptActivity, writeFrame, commitBatch
 import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import MetaData
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 from main_url_scrape import main_scrape_urls
-from urllib.parse import urlparse
+from executor_manager import executor_stats
+from politeness import wait_stats
+from domain_extraction import host_of
 import sqlalchemy as sa
 
 
@@ -57,8 +59,7 @@ def getDomainName(url):
     :return:The domain name, or None if the URL is invalid.
     """
     try:
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc
+        domain = host_of(url)
         if domain.startswith('www.'):
             domain = domain[4:]
         return domain
@@ -83,11 +84,7 @@ def logGeneratedUrlToDB(engine,processedRows,saId):
     processedRows[['note']] = 'Testing generated URLs'
     processedRows[['confidence_level']] = 1
     #Save to database
-    processedRows.to_sql(name=GENERATED_URL_TABLE,
-                                con=engine,
-                                schema=CONNECT_SCHEMA,
-                                if_exists='append',
-                                index=False)
+    writeFrame(engine, processedRows, GENERATED_URL_TABLE, schema=CONNECT_SCHEMA)
 def process_urls_in_batches(con, mnsuMeta, sId, saId, batch_size=BATCH_SIZE):
     """
     Pull, process, and put the URLs in batches into the database.
@@ -105,50 +102,52 @@ def process_urls_in_batches(con, mnsuMeta, sId, saId, batch_size=BATCH_SIZE):
     print(f"Batch Size: {batch_size}")
     print("==============================\n")
 
-    while True:
-        print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
-        print("Pulling data from database...")
-        dfs = getBusinessDataBatch(con, mnsuMeta, sId, batch_size)
+    with WorkCursor(con, mnsuMeta, sId, URL_TABLE, requireUrl=False) as cursor:
+        print(f"Firms to process: {cursor.total}")
+        while True:
+            print(f"\n--- Starting Batch {(processed_count // batch_size) + 1} ---")
+            print("Pulling data from database...")
+            dfs = getBusinessDataBatch(con, mnsuMeta, sId, batch_size, cursor=cursor)
         
-        #Check if there's no more data to process
-        if not dfs or dfs[BUSINESS_TABLE].empty:
-            print("\n=== Process Complete ===")
-            print(f"Total records processed: {processed_count}")
-            print("========================")
-            break
-
-        # Get the required dataframes
-        business_df = dfs[BUSINESS_TABLE][['firm_id']]
-        email_df = dfs[EMAIL_TABLE][['firm_id', 'email']]
-        name_df = dfs[NAME_TABLE][['firm_id', 'company_name']]
-        url_df = dfs[URL_TABLE][['firm_id', 'url', 'main', 'url_type_id', 'url_status_id']]
-
-        print(f"Records in current batch: {len(business_df)}")
-
-        # Merge dataframes
-        business_email_df = pd.merge(name_df, email_df, on='firm_id', how='inner')
-        business_email_df = pd.merge(business_email_df, url_df, on='firm_id', how='left')
-
-        # Remove duplicates
-        business_email_df = business_email_df.drop_duplicates(subset='firm_id')
-
-        #Generate and process URLs
-        update_df = main_scrape_urls(business_email_df)
-        update_df['domain'] = update_df['url'].apply(getDomainName)
-        update_df['url_status_id'] = update_df['status_code'].apply(lambda x: 1 if x == 200 else 3)
-
-        # Push this batch immediately
-        print("Pushing generated URLs to database...")
-        logGeneratedUrlToDB(con, update_df, saId)
-        #log processed businesses
-        print("Logging processed businesses...")
-        logProcessedToDB(con, business_df, sId, saId)
+            #Check if there's no more data to process
+            if not dfs or dfs[BUSINESS_TABLE].empty:
+                print("\n=== Process Complete ===")
+                print(f"Total records processed: {processed_count}")
+                print("========================")
+                break
+
+            # Get the required dataframes
+            business_df = dfs[BUSINESS_TABLE][['firm_id']]
+            email_df = dfs[EMAIL_TABLE][['firm_id', 'email']]
+            name_df = dfs[NAME_TABLE][['firm_id', 'company_name']]
+            url_df = dfs[URL_TABLE][['firm_id', 'url', 'main', 'url_type_id', 'url_status_id']]
+
+            print(f"Records in current batch: {len(business_df)}")
+
+            # Merge dataframes
+            business_email_df = pd.merge(name_df, email_df, on='firm_id', how='inner')
+            business_email_df = pd.merge(business_email_df, url_df, on='firm_id', how='left')
+
+            # Remove duplicates
+            business_email_df = business_email_df.drop_duplicates(subset='firm_id')
+
+            #Generate and process URLs
+            update_df = main_scrape_urls(business_email_df)
+            update_df['domain'] = update_df['url'].apply(getDomainName)
+            update_df['url_status_id'] = update_df['status_code'].apply(lambda x: 1 if x == 200 else 3)
+
+            # Push this batch and log the processed businesses in one transaction
+            print("Pushing generated URLs and processed businesses to database...")
+            commitBatch(con, mnsuMeta, sId, saId, business_df, GENERATED_URL_TABLE,
+                        lambda c: logGeneratedUrlToDB(c, update_df, saId))
         
-        #Update progress
-        processed_count += len(business_df)
-        print(f"\n✓ Batch {(processed_count // batch_size)} completed")
-        print(f"✓ Records in this batch: {len(business_df)}")
-        print(f"✓ Total records processed: {processed_count}")
+            #Update progress
+            processed_count += len(business_df)
+            print(f"\n✓ Batch {(processed_count // batch_size)} completed")
+            print(f"✓ Records in this batch: {len(business_df)}")
+            print(f"✓ Total records processed: {processed_count}")
+            print(f"✓ Thread pool: {executor_stats()}")
+            print(f"✓ Politeness waits: {wait_stats()}")
 
 
 def main():
@@ -1,31 +1,49 @@
 """
 DISCLAIMER:This is code written by the previous teams and used by the Spring 25 team.
+The Spring 25 team added probe_url, which keeps the final url and headers of the response instead of
+only its status code. It sends a HEAD request, falling back to a streamed GET (headers only) only when
+the server rejects HEAD.
+When the url is about to be scraped, check_url is used instead: a single GET whose body, capped at
+MAX_BODY_SIZE, goes into the shared page cache, so the extractors don't download the page again.
+All requests go through the shared, pooled Session from http_session, and wait for a slot from the
+per-domain politeness scheduler.
+Hosts that failed recently (see dead_hosts) are skipped without a request and get a status code of -1.
 """
+import os
+import sys
 import pandas as pd
 import requests
-import ThreadPoolExecutorPlus
+from collections import namedtuple
 from itertools import repeat
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from page_cache import PAGE_CACHE, CachedPage
+from executor_manager import map_bounded
+from http_session import get_session, read_capped, MAX_BODY_SIZE
+from politeness import wait_for_slot
+from dead_hosts import is_dead, record_failure, record_success
+
+# Result of checking a single url. final_url is the url after redirects
+StatusResult = namedtuple('StatusResult', ['url', 'final_url', 'status_code', 'headers'])
+
+# Status codes of servers that don't answer HEAD requests properly, checked again with a GET
+HEAD_REJECTED = frozenset([400, 403, 405, 501])
 
 
 def get_statuscode(lst):
     """
     Gets the status code of the list of urls using threading.
     It sends a maximum of 70 (requests) threads at a time to maximize speed.
+    The requests run on the shared executor from executor_manager.
 
     :param lst: list of urls
     :return: a list of status codes
     """
-    executor = ThreadPoolExecutorPlus.ThreadPoolExecutor(max_workers=70)
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
                       'Chrome/74.0.3729.169 Safari/537.36 '
     }
     timeout = 3
-    results = []
-    for result in executor.map(status_code, lst, repeat(headers), repeat(timeout)):
-        results.append(result)
-
-    return results
+    return map_bounded(status_code, lst, repeat(headers), repeat(timeout))
 
 
 def status_code(url, headers, timeout):
@@ -38,33 +56,103 @@ def status_code(url, headers, timeout):
     :param timeout: limits the maximum time for calling a function
     :return: status code of the url if it receives a response within the given time, if not returns -1
     """
+    return probe_url(url, headers, timeout).status_code
+
+
+def probe_url(url, headers, timeout):
+    """
+    Checks whether a single url is live without downloading its body.
+    Sends a HEAD request first. Some servers reject HEAD (HEAD_REJECTED status codes) or reset the
+    connection on it, and only then is the url checked again with a streamed GET that is closed
+    after the headers. Any other answer to the HEAD request is the status of the url.
+
+    :param url: a single url
+    :param headers: a dictionary that contains user agent strings.
+    :param timeout: limits the maximum time for calling a function
+    :return: StatusResult, with a status code of -1 if no response was received in time
+    """
+    if is_dead(url):
+        return StatusResult(url, None, -1, {})
+    session = get_session()
+    try:
+        wait_for_slot(url)
+        r = session.head(url, verify=True, timeout=timeout, headers=headers, allow_redirects=True)
+        record_success(url)
+        if r.status_code not in HEAD_REJECTED:
+            return StatusResult(url, r.url, r.status_code, dict(r.headers))
+    except requests.exceptions.Timeout as e:
+        record_failure(url, type(e).__name__, timeout=True)
+        return StatusResult(url, None, -1, {})
+    except requests.exceptions.ConnectionError:
+        # Recorded only if the GET fails too
+        pass
+    except:
+        return StatusResult(url, None, -1, {})
     try:
-        r = requests.get(url, verify=True, timeout=timeout, headers=headers)
-        return r.status_code
+        wait_for_slot(url)
+        with session.get(url, verify=True, timeout=timeout, headers=headers, stream=True) as r:
+            record_success(url)
+            return StatusResult(url, r.url, r.status_code, dict(r.headers))
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        record_failure(url, type(e).__name__, timeout=isinstance(e, requests.exceptions.Timeout))
+        return StatusResult(url, None, -1, {})
     except:
-        return -1
+        return StatusResult(url, None, -1, {})
 
 
-def get_statuscode_forPandas(df):
+def check_url(url, headers, timeout, max_body=MAX_BODY_SIZE):
+    """
+    Gets a single url with one GET and keeps its page for the extractors.
+    The body is read the same way as page_cache reads it (html only, at most max_body bytes), and a
+    page that returned 200 is stored in the shared page cache.
+
+    :param url: a single url
+    :param headers: a dictionary that contains user agent strings.
+    :param timeout: limits the maximum time for calling a function
+    :param max_body: the largest number of bytes of the body to keep
+    :return: StatusResult, with a status code of -1 if no response was received in time
+    """
+    if is_dead(url):
+        return StatusResult(url, None, -1, {})
+    try:
+        wait_for_slot(url)
+        with get_session().get(url, verify=True, timeout=timeout, headers=headers, stream=True) as r:
+            record_success(url)
+            body, truncated = read_capped(r, max_bytes=max_body)
+            page = CachedPage(url, r.status_code, r.headers, body, r.encoding, truncated=truncated)
+            result = StatusResult(url, r.url, r.status_code, dict(r.headers))
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        record_failure(url, type(e).__name__, timeout=isinstance(e, requests.exceptions.Timeout))
+        return StatusResult(url, None, -1, {})
+    except:
+        return StatusResult(url, None, -1, {})
+    if page.status_code == 200:
+        PAGE_CACHE.put(page)
+    return result
+
+
+def get_statuscode_forPandas(df, keep_body=False):
     """
     Gets the status code of the list of urls using threading.
     It sends a maximum of 70 (requests) threads at a time to maximize speed.
+    The Spring 25 team added the final_url column and the keep_body option: when it is set, the urls
+    are downloaded with check_url and their pages kept in the shared page cache for the extractors.
+    Otherwise the urls are only probed (see probe_url), which is much cheaper.
+    The requests run on the shared executor from executor_manager.
 
     :param df: dataframe
-    :return: updated dataframe with status codes
+    :param keep_body: keep the pages of the urls, for urls that are scraped next
+    :return: updated dataframe with status codes and final urls
     """
     urls = df['url'].values[:]
-    ids = df['firm_id'].values[:]
-    executor = ThreadPoolExecutorPlus.ThreadPoolExecutor(max_workers=70)
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
                       'Chrome/74.0.3729.169 Safari/537.36 '
     }
     timeout = 5
-    results = []
-    for result in executor.map(status_code_forPandas, urls, ids, repeat(headers), repeat(timeout)):
-        results.append(result)
-    df['status_code'] = results
+    results = map_bounded(check_url if keep_body else probe_url, urls, repeat(headers), repeat(timeout))
+    df['status_code'] = [result.status_code for result in results]
+    df['final_url'] = [result.final_url for result in results]
     return df
 
 def status_code_forPandas(url, id, headers, timeout):
@@ -77,8 +165,4 @@ def status_code_forPandas(url, id, headers, timeout):
     :param timeout: limits the maximum time for calling a function
     :return: status code of the url if it receives a response within the given time, if not returns -1
     """
-    try:
-        r = requests.get(url, verify=True, timeout=timeout, headers=headers)
-        return r.status_code
-    except:
-        return -1
+    return probe_url(url, headers, timeout).status_code
@@ -0,0 +1,88 @@
+"""
+Shared requests.Session for the synchronous fetches (url checks and page downloads).
+Plain requests.get opens a new TCP/TLS connection for every call. get_session returns one
+process-wide Session whose connection pools are sized for the 70 url-check threads, so repeated
+requests to the same host reuse their keep-alive connections.
+Page bodies are read with read_capped: responses are streamed and reading stops at MAX_BODY_SIZE
+bytes, and only html content types (ALLOWED_CONTENT_TYPES) are read at all, so the memory a worker
+needs per page is bounded however large or binary the response is.
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+#Pool configuration
+POOL_CONNECTIONS = 100      # number of hosts with a pool kept open
+POOL_MAXSIZE = 70           # connections kept open per host, one per url-check thread
+
+#Body reading configuration
+MAX_BODY_SIZE = 2 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+ALLOWED_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide Session, creating it on first use
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def close_session():
+    """
+    Closes the pooled connections. The next get_session call creates a new Session.
+    """
+    global _session
+    with _lock:
+        session = _session
+        _session = None
+    if session is not None:
+        session.close()
+
+
+def is_allowed_content_type(content_type, allowed=ALLOWED_CONTENT_TYPES):
+    """
+    Checks a Content-Type header against the allow-list. A missing header is allowed, since many
+    small sites don't send one.
+    :param content_type: value of the Content-Type header, or None
+    :param allowed: tuple of allowed media types
+    :return: True if the body should be read
+    """
+    if not content_type:
+        return True
+    return content_type.split(';')[0].strip().lower() in allowed
+
+
+def read_capped(response, max_bytes=MAX_BODY_SIZE, allowed=ALLOWED_CONTENT_TYPES):
+    """
+    Reads the body of a streamed requests.Response (stream=True), stopping at max_bytes.
+    Bodies with a content type outside the allow-list are not read.
+    :param response: a requests.Response opened with stream=True
+    :param max_bytes: the most bytes to keep
+    :param allowed: tuple of allowed media types
+    :return: (body, truncated). body is b'' when the content type isn't allowed, truncated is True
+             when the body was cut off at max_bytes
+    """
+    if not is_allowed_content_type(response.headers.get('Content-Type'), allowed):
+        return b'', False
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            return b''.join(chunks)[:max_bytes], True
+    return b''.join(chunks), False
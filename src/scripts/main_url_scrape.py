@@ -6,23 +6,32 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 from create_urls import *
 from get_status_codes import *
+from elis_functions import emailRejectionHistogram
 import pandas as pd
 
 
-def main_scrape_urls(df):
+def main_scrape_urls(df, keep_body=False):
     """
     Given a dataframe, adds any missing URLs found via email or web search and checks their status codes.
     If the status code is 200, updates the 'Website' column of the input dataframe with the valid URL.
     :param df: a pandas dataframe containing business information
+    :param keep_body: keep the pages of the live urls in the page cache, when they are scraped next
     :return: the modified pandas dataframe
     """
+    # Build the urls of the rows without one from their emails, all at once and without a printed line per bad email
+    missing = [not _url_exists(url) for url in df['url']]
+    email_urls, email_reasons = build_urls_from_emails(df['email'][missing])
+    rejected = emailRejectionHistogram(email_reasons)
+    if rejected:
+        print(f"✓ Emails rejected when building urls: {rejected}")
+    email_urls = iter(email_urls)
     for index, row in df.iterrows():
         # Check if the row already has a valid URL
         # If it does, skip to the next row
         
         if url_exists(row):
             continue
-        website = url_from_email(row)
+        website = next(email_urls)
         
         # If a valid URL is found, add the row to the email results dataframe
         if website:
@@ -30,7 +39,8 @@ def main_scrape_urls(df):
             # Otherwise, try to get a URL from the business name column using web search
         else:
             df.loc[index, 'url'] = url_from_business_name(row)
-    df = get_statuscode_forPandas(df) 
+    # Only probe the urls (HEAD first) unless the caller scrapes the pages next
+    df = get_statuscode_forPandas(df, keep_body=keep_body)
     # Check the status codes of the URLs
     # If the status code is 200, update the 'Website' column of the input dataframe with the valid URL
     df = df.loc[df['status_code'] == 200]
@@ -77,10 +87,10 @@ def url_from_business_name(row):
     Given a row, attempts to find a URL from the BusinessName column.
     Returns the URL if it is valid, otherwise returns None.
     """
-    rating_sites = ['mapquest', 'yelp', 'bbb', 'podium', 'porch', 'chamberofcommerce', 'angi', "yellowpages",
-                    'localsolution', 'northdakota', 'allbiz', 'pitchbook', '411', 'dnd', 'thebluebook', 'opencorporates'
-                                                                                                        'menupix',
-                    'buildzoom', 'buzzfile', 'manta', 'dandb', 'bloomberg', 'nextdoor', 'dnb', 'homeadvisor']
+    rating_sites = frozenset(['mapquest', 'yelp', 'bbb', 'podium', 'porch', 'chamberofcommerce', 'angi', "yellowpages",
+                              'localsolution', 'northdakota', 'allbiz', 'pitchbook', '411', 'dnd', 'thebluebook',
+                              'opencorporates', 'menupix', 'buildzoom', 'buzzfile', 'manta', 'dandb', 'bloomberg',
+                              'nextdoor', 'dnb', 'homeadvisor'])
     business_name = row['company_name']
     business_id = row['firm_id']
     #company_city_state = row['PostalCode']
@@ -0,0 +1,272 @@
+"""
+Shared page-fetch layer for the scrapers.
+A firm that is missing both an email and a phone number used to have its website downloaded
+and parsed once by extract_email_data and again by extract_phone_data. Every extractor now
+reads pages through this module instead:
+- get_page(url): returns the CachedPage for a url, fetching it only when it isn't cached yet
+- get_soup(url): returns the parsed BeautifulSoup tree of that page, parsed once per page (and
+  per parser backend, see parser_backend)
+Pages are kept in memory and on disk (CACHE_DIR, created on the first write), keyed by url. Entries
+older than CACHE_TTL seconds are refetched, and both caches evict the least recently used pages once
+they are full: the memory cache holds CACHE_MAX_ENTRIES pages, the disk cache DISK_MAX_BYTES bytes.
+Bodies are streamed and capped (see http_session.read_capped); non-html pages are cached empty.
+Hosts in the dead-host negative cache are not requested at all (DeadHostError is raised instead).
+"""
+import os
+import sys
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+import requests
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from http_session import get_session, read_capped
+from politeness import wait_for_slot
+from dead_hosts import DeadHostError, is_dead, record_failure, record_success
+from parser_backend import make_soup
+
+
+#Cache configuration
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.cache', 'pages'))
+CACHE_TTL = 7 * 24 * 60 * 60        # seconds a fetched page stays valid
+CACHE_MAX_ENTRIES = 2000            # pages held in memory
+DISK_MAX_BYTES = 1024 ** 3          # bytes of pages held on disk
+DISK_PRUNE_FRACTION = 20            # disk usage is checked after every DISK_MAX_BYTES / 20 bytes written
+SOUP_MAX_ENTRIES = 256              # parsed trees held in memory (these are much larger than the pages)
+FETCH_TIMEOUT = 10
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,/;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+
+class CachedPage:
+    """
+    The parts of an HTTP response the extractors need, in a form that can be pickled to disk.
+    truncated is True when the body was cut off at the size cap.
+    """
+    truncated = False
+
+    def __init__(self, url, status_code, headers, content, encoding=None, fetched_at=None, truncated=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = dict(headers)
+        self.content = content
+        self.encoding = encoding
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.truncated = truncated
+
+    @classmethod
+    def from_response(cls, url, response):
+        """
+        Builds a CachedPage from a streamed requests.Response, reading at most MAX_BODY_SIZE bytes
+        :param url: the url that was requested (the cache key)
+        :param response: the requests.Response for that url, opened with stream=True
+        :return: CachedPage
+        """
+        content, truncated = read_capped(response)
+        return cls(url, response.status_code, response.headers, content, response.encoding, truncated=truncated)
+
+    def is_expired(self, ttl):
+        return time.time() - self.fetched_at > ttl
+
+
+class PageCache:
+    """
+    Url -> CachedPage cache held in memory and on disk, with TTL and LRU eviction.
+    Safe to share between threads.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 disk_max_bytes=DISK_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        # Bytes written since the disk usage was last checked, None until the first write
+        self._unpruned_bytes = None
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.pkl')
+
+    def get(self, url):
+        """
+        Returns the cached page for the url, or None if it isn't cached or has expired
+        """
+        with self._lock:
+            page = self._pages.get(url)
+            if page is not None:
+                if not page.is_expired(self.ttl):
+                    self._pages.move_to_end(url)
+                    return page
+                del self._pages[url]
+        page = self._read_disk(url)
+        if page is not None:
+            self._remember(page)
+        return page
+
+    def put(self, page):
+        """
+        Stores a page in memory and on disk
+        """
+        self._remember(page)
+        self._write_disk(page)
+
+    def clear(self):
+        """
+        Empties the in-memory cache. Pages on disk are left alone.
+        """
+        with self._lock:
+            self._pages.clear()
+
+    def _remember(self, page):
+        with self._lock:
+            self._pages[page.url] = page
+            self._pages.move_to_end(page.url)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def _read_disk(self, url):
+        if not self.cache_dir:
+            return None
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                page = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        if page.url != url or page.is_expired(self.ttl):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        # Touch the file so disk eviction is least recently used, not least recently written
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return page
+
+    def _write_disk(self, page):
+        if not self.cache_dir:
+            return
+        path = self._path(page.url)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(page, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            # The first write also checks what earlier runs left on disk
+            first = self._unpruned_bytes is None
+            self._unpruned_bytes = (self._unpruned_bytes or 0) + size
+            prune = first or self._unpruned_bytes >= self.disk_max_bytes // DISK_PRUNE_FRACTION
+            if prune:
+                self._unpruned_bytes = 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """
+        Deletes the least recently used pages on disk once they take more than disk_max_bytes
+        """
+        try:
+            entries = [(e.stat(), e.path) for e in os.scandir(self.cache_dir) if e.name.endswith('.pkl')]
+        except OSError:
+            return
+        excess = sum(stat.st_size for stat, _ in entries) - self.disk_max_bytes
+        entries.sort(key=lambda entry: entry[0].st_mtime)
+        for stat, path in entries:
+            if excess <= 0:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            excess -= stat.st_size
+
+
+#Process-wide caches shared by every extractor
+PAGE_CACHE = PageCache()
+_soups = OrderedDict()
+_soups_lock = threading.Lock()
+
+
+def fetch_page(url, timeout=FETCH_TIMEOUT):
+    """
+    Downloads a page without looking at the page cache.
+    Host-level failures are recorded in the dead-host cache, and dead hosts are skipped.
+    :param url: url to download
+    :param timeout: request timeout in seconds
+    :return: CachedPage
+    """
+    if is_dead(url):
+        raise DeadHostError(f"host of {url} failed recently, not retrying yet")
+    wait_for_slot(url)
+    try:
+        with get_session().get(url, headers=HEADERS, timeout=timeout, stream=True) as response:
+            page = CachedPage.from_response(url, response)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        record_failure(url, type(e).__name__, timeout=isinstance(e, requests.exceptions.Timeout))
+        raise
+    record_success(url)
+    return page
+
+
+def get_page(url, timeout=FETCH_TIMEOUT):
+    """
+    Returns the page for the url, downloading it only if it isn't cached.
+    Request exceptions (timeouts, connection errors) are raised to the caller.
+    :param url: url of the page
+    :param timeout: request timeout in seconds
+    :return: CachedPage
+    """
+    page = PAGE_CACHE.get(url)
+    if page is None:
+        page = fetch_page(url, timeout=timeout)
+        PAGE_CACHE.put(page)
+    return page
+
+
+def get_soup(url, timeout=FETCH_TIMEOUT, parser=None):
+    """
+    Returns the parsed html of the page for the url, parsing each page only once
+    :param url: url of the page
+    :param timeout: request timeout in seconds, used if the page has to be downloaded
+    :param parser: parser backend to use, the configured parser_backend.PARSER_BACKEND if None
+    :return: BeautifulSoup object
+    """
+    key = (url, parser)
+    with _soups_lock:
+        soup = _soups.get(key)
+        if soup is not None:
+            _soups.move_to_end(key)
+            return soup
+    page = get_page(url, timeout=timeout)
+    soup = make_soup(page.content, headers=page.headers, parser=parser)
+    with _soups_lock:
+        _soups[key] = soup
+        while len(_soups) > SOUP_MAX_ENTRIES:
+            _soups.popitem(last=False)
+    return soup
+
+
+def clear_cache():
+    """
+    Empties the in-memory page and soup caches
+    """
+    PAGE_CACHE.clear()
+    with _soups_lock:
+        _soups.clear()
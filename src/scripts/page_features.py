@@ -0,0 +1,153 @@
+"""
+Single-pass page feature extractor for data_extraction.
+Each contains_* function used to walk the whole tree again: four of them called html.find_all('a'),
+contains_business_name called html.find_all(text=True) once per word of the name, and
+contains_zipCode built html.text and then searched the footer too. get_page_features walks the
+document once and keeps everything those functions need in a PageFeatures record:
+- links: href of every <a> tag, in document order, plus a lowercased copy
+- text_nodes: every string in the document, plus a lowercased copy
+- footer_text: text of the first <footer>
+- mailto_links: hrefs containing 'mailto:'
+- phone_texts: text nodes that look like they contain a phone number
+- zip_codes: the set of 5-digit words in the page text (or in the footer text if there are none)
+The record is stored on the soup, so every predicate on the same page reuses it.
+It also holds a token index of the page text, built the first time a name is looked up:
+- tokens / footer_tokens: the set of lowercase words in the text nodes / the footer
+- search_text: the lowercase text nodes joined with a separator that can't occur in a name, so a
+  substring lookup is one `in` on a single string instead of one per text node
+"""
+import re
+from bs4 import NavigableString, CData, Tag
+
+
+# Text that contains something shaped like a phone number (3 digits, 3 digits, 4 digits)
+PHONE_TEXT_REGEX = re.compile(r"(\d{3})\D*(\d{3})\D*(\d{4})")
+ZIP_REGEX = re.compile(r'\b\d{5}\b')
+WORD_REGEX = re.compile(r'\b\w+\b')
+TEXT_SEPARATOR = '\x00'
+
+
+class PageFeatures:
+    """
+    Everything the contains_* predicates need from one page, collected in one walk of the tree
+    """
+    def __init__(self):
+        self.links = []
+        self.text_nodes = []
+        self.footer_text = None
+        self.mailto_links = []
+        self.phone_texts = []
+        self.text = ''
+        self.zip_codes = set()
+        self.links_lower = []
+        self.text_nodes_lower = []
+        self._tokens = None
+        self._footer_tokens = None
+        self._search_text = None
+
+    @property
+    def last_link(self):
+        """
+        href of the last <a> tag on the page (None if there is none or it has no href)
+        """
+        return self.links[-1] if self.links else None
+
+    @property
+    def tokens(self):
+        """
+        Set of lowercase words in the text nodes of the page
+        """
+        if self._tokens is None:
+            self._tokens = set(WORD_REGEX.findall(self.search_text))
+        return self._tokens
+
+    @property
+    def footer_tokens(self):
+        """
+        Set of lowercase words in the footer (empty if the page has no footer)
+        """
+        if self._footer_tokens is None:
+            self._footer_tokens = set(WORD_REGEX.findall(self.footer_text.lower())) if self.footer_text else set()
+        return self._footer_tokens
+
+    @property
+    def search_text(self):
+        """
+        Lowercase text nodes joined by TEXT_SEPARATOR, for substring lookups
+        """
+        if self._search_text is None:
+            self._search_text = TEXT_SEPARATOR.join(self.text_nodes_lower)
+        return self._search_text
+
+    def contains_word(self, word):
+        """
+        Checks if a lowercase word appears in any single text node of the page, as a whole word or
+        as part of one
+        """
+        return word in self.tokens or (TEXT_SEPARATOR not in word and word in self.search_text)
+
+    def count_words(self, words):
+        """
+        Counts how many of the given lowercase words appear in the page text (see contains_word)
+        :param words: list of lowercase words, duplicates are counted each time
+        :return: number of words found
+        """
+        found = set(words) & self.tokens
+        # Words that aren't whole tokens may still be part of one
+        found.update(word for word in set(words) - found if self.contains_word(word))
+        return sum(1 for word in words if word in found)
+
+
+def extract_page_features(html):
+    """
+    Walks a parsed page once and builds its PageFeatures
+    :param html: BeautifulSoup object
+    :return: PageFeatures
+    """
+    features = PageFeatures()
+    footer = None
+    visible = []
+    for node in html.descendants:
+        if isinstance(node, Tag):
+            if node.name == 'a':
+                href = node.get('href')
+                features.links.append(href)
+                if href and 'mailto:' in href:
+                    features.mailto_links.append(href)
+            elif node.name == 'footer' and footer is None:
+                footer = node
+        elif isinstance(node, NavigableString):
+            features.text_nodes.append(node)
+            # Same strings as html.text: plain text and CDATA, not comments or doctypes
+            if type(node) in (NavigableString, CData):
+                visible.append(node)
+            if PHONE_TEXT_REGEX.search(node):
+                features.phone_texts.append(node)
+
+    features.text = ''.join(visible)
+    features.zip_codes = set(ZIP_REGEX.findall(features.text.lower()))
+    features.links_lower = [href.lower() if href else None for href in features.links]
+    features.text_nodes_lower = [text.lower() for text in features.text_nodes]
+    if footer is not None:
+        features.footer_text = footer.text
+        # The footer text can run into the text around it in html.text, so search it on its own
+        # when the page text has no zip codes (as contains_zipCode always did)
+        if not features.zip_codes:
+            features.zip_codes = set(ZIP_REGEX.findall(features.footer_text.lower()))
+    return features
+
+
+def get_page_features(html):
+    """
+    Returns the PageFeatures of a page, building them on first use and storing them on the soup
+    :param html: BeautifulSoup object, or a PageFeatures (returned as is)
+    :return: PageFeatures, or None if html is None
+    """
+    if html is None or isinstance(html, PageFeatures):
+        return html
+    # Read the instance dict directly: attribute access on a Tag falls back to a tree search
+    features = html.__dict__.get('_page_features')
+    if features is None:
+        features = extract_page_features(html)
+        html._page_features = features
+    return features
@@ -0,0 +1,66 @@
+"""
+Selectable HTML parser backend for data_extraction.
+Every page used to be parsed with BeautifulSoup(content, "html.parser"), the slowest tree builder,
+after letting BeautifulSoup sniff the charset of the raw bytes. make_soup instead:
+- uses PARSER_BACKEND, which is the C-backed lxml parser when it is installed
+- decodes the bytes directly when the response headers state the charset, skipping the sniffing
+- falls back to html.parser when the configured parser fails or returns an empty tree for a
+  malformed page
+The result is always a BeautifulSoup object, so the contains_* and extract_* functions work the
+same whichever backend is configured.
+"""
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+
+#Parser configuration
+FALLBACK_PARSER = 'html.parser'
+PARSER_BACKEND = 'lxml' if HAS_LXML else FALLBACK_PARSER
+
+
+def charset_from_headers(headers):
+    """
+    Returns the charset stated in a Content-Type header, or None if there isn't one
+    :param headers: dictionary of response headers
+    """
+    if not headers:
+        return None
+    content_type = headers.get('Content-Type') or headers.get('content-type') or ''
+    for param in content_type.split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"\'')
+    return None
+
+
+def make_soup(content, headers=None, parser=None):
+    """
+    Parses a page with the configured backend
+    :param content: the page body, bytes or str
+    :param headers: the response headers, used for the charset fast path
+    :param parser: the BeautifulSoup tree builder to use, PARSER_BACKEND if None
+    :return: BeautifulSoup object
+    """
+    parser = parser or PARSER_BACKEND
+    markup = content
+    charset = charset_from_headers(headers)
+    if charset and isinstance(content, bytes):
+        # Decode with the stated charset so BeautifulSoup doesn't have to guess it
+        try:
+            markup = content.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            markup = content
+
+    if parser != FALLBACK_PARSER:
+        try:
+            soup = BeautifulSoup(markup, parser)
+            if soup.find() is not None or not content:
+                return soup
+        except Exception:
+            pass
+    return BeautifulSoup(markup, FALLBACK_PARSER)
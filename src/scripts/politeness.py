@@ -0,0 +1,196 @@
+"""
+Per-domain politeness scheduler for every outbound fetch.
+With 70 url-check threads, many firms on the same shared host (wixsite.com, squarespace.com, an
+email-derived domain, ...) could be requested dozens of times at once, which gets us throttled (429s)
+and costs a full timeout per failed request. Every fetch now asks the scheduler for a slot first:
+- each registered domain (via domain_extraction) has a token bucket allowing `rate` requests per second,
+  with bursts of up to `burst` requests
+- HOST_RATES overrides the default rate for specific domains; set_host_rate changes it at runtime
+- requests to different domains never wait on each other, so global concurrency stays high
+- wait_stats reports how often and how long requests had to wait
+A run touches tens of thousands of firm domains, so the per-domain state is bounded: a bucket that
+has been idle long enough to refill is the same as a new one and is dropped, at most MAX_BUCKETS
+buckets are kept (least recently used first out), and only the MAX_WAIT_DOMAINS domains with the
+most total wait are kept for the stats.
+"""
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from domain_extraction import extract as extract_domain
+
+
+#Scheduler configuration
+DEFAULT_RATE = 2.0          # requests per second per registered domain
+DEFAULT_BURST = 4           # requests allowed at once before the rate applies
+MAX_BUCKETS = 10000         # token buckets kept at once
+MAX_WAIT_DOMAINS = 1000     # domains kept in the wait-time metrics
+HOST_RATES = {
+    # domain: (rate, burst). Large hosting platforms can take more traffic than a single small site.
+    'wixsite.com': (5.0, 10),
+    'squarespace.com': (5.0, 10),
+    'godaddysites.com': (5.0, 10),
+    'weebly.com': (5.0, 10),
+}
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations: reserve() takes a token and returns how long the
+    caller must wait before using it, so the same bucket works for threads and coroutines.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def is_idle(self, now):
+        """
+        True once the bucket has refilled, when it is no different from a new bucket
+        """
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class DomainScheduler:
+    """
+    One token bucket per registered domain, plus wait-time metrics
+    """
+    def __init__(self, default_rate=DEFAULT_RATE, default_burst=DEFAULT_BURST, host_rates=None,
+                 max_buckets=MAX_BUCKETS, max_wait_domains=MAX_WAIT_DOMAINS):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates)
+        self.max_buckets = max_buckets
+        self.max_wait_domains = max_wait_domains
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'waits': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+        self._domain_waits = {}
+
+    def domain_of(self, url):
+        """
+        Returns the registered domain of a url (e.g. 'acme.wixsite.com' -> 'wixsite.com')
+        """
+        extracted = extract_domain(url)
+        if extracted.domain and extracted.suffix:
+            return extracted.domain + '.' + extracted.suffix
+        return extracted.domain or url
+
+    def set_host_rate(self, domain, rate, burst=None):
+        """
+        Sets the rate (requests per second) and burst allowed for a registered domain
+        """
+        with self._lock:
+            self.host_rates[domain] = (rate, burst if burst is not None else max(1, int(rate)))
+            self._buckets.pop(domain, None)
+
+    def reserve(self, url):
+        """
+        Takes a slot for the url's domain and records the wait
+        :return: seconds the caller must wait before sending the request
+        """
+        domain = self.domain_of(url)
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                self._evict_buckets()
+                rate, burst = self.host_rates.get(domain, (self.default_rate, self.default_burst))
+                bucket = self._buckets[domain] = TokenBucket(rate, burst)
+            else:
+                self._buckets.move_to_end(domain)
+            delay = bucket.reserve()
+            self._stats['requests'] += 1
+            if delay > 0:
+                self._stats['waits'] += 1
+                self._stats['total_wait'] += delay
+                self._stats['max_wait'] = max(self._stats['max_wait'], delay)
+                self._domain_waits[domain] = self._domain_waits.get(domain, 0.0) + delay
+                if len(self._domain_waits) > self.max_wait_domains:
+                    self._evict_waits()
+        return delay
+
+    def _evict_buckets(self):
+        # Called with _lock held, before a new bucket is added. Buckets are in least recently used
+        # order, so the idle ones are at the front.
+        now = time.monotonic()
+        while self._buckets:
+            domain, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_buckets and not bucket.is_idle(now):
+                break
+            del self._buckets[domain]
+
+    def _evict_waits(self):
+        # Called with _lock held. Keeps the half of the domains with the most total wait.
+        busiest = sorted(self._domain_waits.items(), key=lambda item: item[1], reverse=True)
+        self._domain_waits = dict(busiest[:self.max_wait_domains // 2])
+
+    def wait(self, url):
+        """
+        Blocks the calling thread until a request to the url's domain is allowed
+        """
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, url):
+        """
+        Suspends the calling coroutine until a request to the url's domain is allowed
+        """
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self, top=5):
+        """
+        Returns the wait-time metrics: requests scheduled, how many had to wait, total and longest
+        wait in seconds, and the domains with the most total wait
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            busiest = sorted(self._domain_waits.items(), key=lambda item: item[1], reverse=True)[:top]
+        stats['busiest_domains'] = [(domain, round(wait, 2)) for domain, wait in busiest]
+        return stats
+
+
+#Process-wide scheduler shared by every fetch
+SCHEDULER = DomainScheduler()
+
+
+def wait_for_slot(url):
+    """
+    Blocks until the politeness scheduler allows a request to the url
+    """
+    if isinstance(url, str):
+        SCHEDULER.wait(url)
+
+
+async def wait_for_slot_async(url):
+    """
+    Async version of wait_for_slot
+    """
+    if isinstance(url, str):
+        await SCHEDULER.wait_async(url)
+
+
+def set_host_rate(domain, rate, burst=None):
+    """
+    Sets the rate (requests per second) and burst allowed for a registered domain
+    """
+    SCHEDULER.set_host_rate(domain, rate, burst)
+
+
+def wait_stats():
+    """
+    Returns the wait-time metrics of the shared scheduler
+    """
+    return SCHEDULER.stats()
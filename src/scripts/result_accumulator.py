@@ -0,0 +1,56 @@
+"""
+Collects the values scraped for a batch of firms (emails, phones, addresses).
+The scrapers used to check every value with `value not in df['email'].values` and append it with
+pd.concat, which copies the whole frame for every row and makes a batch quadratic. A
+ResultAccumulator keeps the values already seen in a set, so each insert is O(1), and builds the
+output DataFrame once at the end of the batch.
+"""
+import pandas as pd
+
+
+class ResultAccumulator:
+    """
+    Deduplicating collector of scraped rows for one batch.
+    existingDf: the rows already known for the batch (e.g. the firms' current emails). Their
+        values count as seen, and they come first in the output frame.
+    column: the column holding the scraped value, used for deduplication
+    per_firm: if True a value is only a duplicate for the same firm (e.g. firms sharing a building
+        can share an address), and seen holds (firm_id, value) pairs
+    """
+    def __init__(self, existingDf, column, per_firm=False):
+        self.existingDf = existingDf
+        self.column = column
+        self.per_firm = per_firm
+        if per_firm:
+            self.seen = set(zip(existingDf['firm_id'].tolist(), existingDf[column].tolist()))
+        else:
+            self.seen = set(existingDf[column].tolist())
+        self.rows = []
+
+    def add(self, firm_id, value, **fields):
+        """
+        Adds a scraped value unless it has already been seen
+        :param firm_id: the firm the value was scraped for
+        :param value: the scraped value
+        :param fields: any other columns to store with the value
+        :return: True if the value was added, False if it was a duplicate
+        """
+        key = (firm_id, value) if self.per_firm else value
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        row = {'firm_id': firm_id, self.column: value}
+        row.update(fields)
+        self.rows.append(row)
+        return True
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_frame(self):
+        """
+        Returns the existing rows followed by every value added, as one DataFrame
+        """
+        if not self.rows:
+            return self.existingDf
+        return pd.concat([self.existingDf, pd.DataFrame(self.rows)], ignore_index=True)
@@ -0,0 +1,178 @@
+"""
+schema.org structured data reader, the first tier of the extraction pipeline in data_extraction.
+Many small-business sites describe themselves with a LocalBusiness (or Organization, Restaurant, ...)
+block, either as JSON-LD in <script type="application/ld+json"> or as microdata itemprop attributes.
+When a page has one, its telephone, email and address are more reliable than anything scraped from
+the text, and reading them needs neither a DOM nor a scan of every text node:
+- pages without 'ld+json' or 'itemprop' in their bytes are rejected with two substring checks
+- JSON-LD blocks are cut out of the raw bytes with a regex and read with json.loads
+- microdata values come from the content/href attribute or the text right after the tag
+read_structured_data returns a StructuredData record with the telephones, emails and addresses found.
+"""
+import re
+import json
+import html
+
+
+JSON_LD_REGEX = re.compile(
+    rb'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>', re.I | re.S)
+ITEMPROP_REGEX = re.compile(
+    rb'<[a-z][a-z0-9]*\b(?P<attrs>[^>]*?\bitemprop\s*=\s*["\']?(?P<prop>[a-zA-Z]+)[^>]*)>(?P<text>[^<]*)', re.I)
+ATTR_REGEX = re.compile(r'\b(content|href)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+
+#schema.org PostalAddress properties and the keys they are stored under
+ADDRESS_PARTS = {
+    'streetaddress': 'street',
+    'addresslocality': 'city',
+    'addressregion': 'state',
+    'postalcode': 'zip',
+    'addresscountry': 'country',
+}
+
+
+class StructuredData:
+    """
+    Contact details a page declares about itself.
+    telephones: list of telephone strings, as written on the page
+    emails: list of email addresses (without 'mailto:')
+    addresses: list of dicts with the keys street, city, state, zip, country and address (the parts
+        joined into one line)
+    """
+    def __init__(self):
+        self.telephones = []
+        self.emails = []
+        self.addresses = []
+
+    def __bool__(self):
+        return bool(self.telephones or self.emails or self.addresses)
+
+
+def _text(value):
+    # schema.org values can be strings, numbers, lists or nested objects with a name
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if isinstance(value, dict):
+        value = value.get('name')
+    if isinstance(value, str):
+        value = ' '.join(value.split())
+        return value or None
+    return None
+
+
+def _add_unique(lst, value):
+    if value and value not in lst:
+        lst.append(value)
+
+
+def make_address(parts):
+    """
+    Builds an address dict from its parts, or None if it has neither a street nor a zip
+    :param parts: dict with any of the keys street, city, state, zip, country
+    """
+    address = {key: _text(parts.get(key)) for key in ('street', 'city', 'state', 'zip', 'country')}
+    if not address['street'] and not address['zip']:
+        return None
+    city_line = ' '.join(part for part in (address['state'], address['zip']) if part)
+    address['address'] = ', '.join(part for part in (address['street'], address['city'], city_line) if part)
+    return address
+
+
+def _read_json_ld_node(node, data):
+    if isinstance(node, list):
+        for item in node:
+            _read_json_ld_node(item, data)
+        return
+    if not isinstance(node, dict):
+        return
+    telephones = node.get('telephone')
+    for telephone in telephones if isinstance(telephones, list) else [telephones]:
+        _add_unique(data.telephones, _text(telephone))
+    emails = node.get('email')
+    for email in emails if isinstance(emails, list) else [emails]:
+        email = _text(email)
+        if email and email.lower().startswith('mailto:'):
+            email = email[7:]
+        _add_unique(data.emails, email)
+    addresses = node.get('address')
+    for address in addresses if isinstance(addresses, list) else [addresses]:
+        if isinstance(address, dict):
+            address = make_address({key: address.get(prop) for prop, key in
+                                    (('streetAddress', 'street'), ('addressLocality', 'city'),
+                                     ('addressRegion', 'state'), ('postalCode', 'zip'),
+                                     ('addressCountry', 'country'))})
+        elif isinstance(address, str):
+            # A one-line address; later tiers can split it into parts
+            address = make_address({'street': address})
+        else:
+            address = None
+        if address and address not in data.addresses:
+            data.addresses.append(address)
+    # Nested nodes: @graph, location, department, ...
+    for key, value in node.items():
+        if key != 'address' and isinstance(value, (dict, list)):
+            _read_json_ld_node(value, data)
+
+
+def _read_json_ld(content, data):
+    for match in JSON_LD_REGEX.finditer(content):
+        try:
+            node = json.loads(match.group(1).decode('utf-8', 'replace'))
+        except ValueError:
+            continue
+        _read_json_ld_node(node, data)
+
+
+def _attr_value(attrs):
+    for match in ATTR_REGEX.finditer(attrs):
+        value = next(group for group in match.groups()[1:] if group is not None)
+        return match.group(1).lower(), html.unescape(value)
+    return None, None
+
+
+def _read_microdata(content, data):
+    parts = {}
+    for match in ITEMPROP_REGEX.finditer(content):
+        prop = match.group('prop').decode('ascii').lower()
+        if prop not in ('telephone', 'email') and prop not in ADDRESS_PARTS:
+            continue
+        attrs = match.group('attrs').decode('utf-8', 'replace')
+        name, value = _attr_value(attrs)
+        if value is None or (name == 'href' and prop not in ('telephone', 'email')):
+            value = html.unescape(match.group('text').decode('utf-8', 'replace'))
+        value = _text(value)
+        if not value:
+            continue
+        if prop == 'telephone':
+            _add_unique(data.telephones, value[4:] if value.lower().startswith('tel:') else value)
+        elif prop == 'email':
+            _add_unique(data.emails, value[7:] if value.lower().startswith('mailto:') else value)
+        else:
+            key = ADDRESS_PARTS[prop]
+            # A part we already have starts the next address on the page
+            if key in parts:
+                address = make_address(parts)
+                if address and address not in data.addresses:
+                    data.addresses.append(address)
+                parts = {}
+            parts[key] = value
+    address = make_address(parts)
+    if address and address not in data.addresses:
+        data.addresses.append(address)
+
+
+def read_structured_data(content):
+    """
+    Reads the JSON-LD and microdata contact details of a page, without parsing the page
+    :param content: page body (bytes)
+    :return: StructuredData, empty (False) if the page declares none
+    """
+    data = StructuredData()
+    if isinstance(content, str):
+        content = content.encode('utf-8', 'replace')
+    if not content:
+        return data
+    if b'ld+json' in content:
+        _read_json_ld(content, data)
+    if b'itemprop' in content:
+        _read_microdata(content, data)
+    return data
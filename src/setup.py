@@ -6,6 +6,12 @@ Created on Fri Feb 21 10:25:37 2025
 """
 import sys 
 import os
+import io
+import json
+import time
+import pickle
+import hashlib
+import threading
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 import config.connect_iabbb as ci
 import pandas as pd
@@ -35,6 +41,24 @@ EMAIL_TABLE = 'tblfirms_firm_email'
 PHONE_TABLE = 'tblfirms_firm_phone'
 URL_TABLE = 'tblfirms_firm_url'
 BATCH_SIZE = 300
+PROGRESS_COLUMN = 'firms_processed'    # script activity column counting the firms processed, see sql/mnsu_script_activity_firms_processed.sql
+WRITE_CHUNKSIZE = 10000     # rows per COPY / executemany call in writeFrame
+SCHEMA_CACHE_FILE = os.environ.get('SCHEMA_CACHE_FILE')    # pickle of the reflected tables, None to reflect once per run
+PULL_TABLES = [BUSINESS_TABLE, ADDRESS_TABLE, NAME_TABLE, EMAIL_TABLE, PHONE_TABLE, URL_TABLE, PROCESSED_TABLE]
+
+# Columns each puller returns, by table: the ones its script reads. None returns every table and column.
+URL_BATCH_COLUMNS = {BUSINESS_TABLE: ['firm_id'],
+                     NAME_TABLE: ['firm_id', 'company_name'],
+                     EMAIL_TABLE: ['firm_id', 'email'],
+                     URL_TABLE: ['firm_id', 'url', 'main', 'url_type_id', 'url_status_id']}
+EMAIL_BATCH_COLUMNS = {BUSINESS_TABLE: ['firm_id'],
+                       EMAIL_TABLE: ['firm_id', 'email', 'email_type_id', 'email_status_id', 'address_id'],
+                       URL_TABLE: ['firm_id', 'url']}
+PHONE_BATCH_COLUMNS = {BUSINESS_TABLE: ['firm_id'],
+                       PHONE_TABLE: ['firm_id', 'phone', 'phone_status_id', 'phone_type_id'],
+                       URL_TABLE: ['firm_id', 'url']}
+ADDRESS_BATCH_COLUMNS = {BUSINESS_TABLE: ['firm_id'],
+                         URL_TABLE: ['firm_id', 'url']}
 
 
 
@@ -45,7 +69,110 @@ BATCH_SIZE = 300
 errorCode = None
 errorText = None
 
+# Reflected tables, one MetaData per database and schema, shared by all pullers and loggers
+_schemaRegistry = {}
+_schemaLock = threading.Lock()
+
+
+
+
+def _tableKey(schema, tableName):
+    return tableName if schema is None else schema + '.' + tableName
+
 
+def _schemaFingerprint(engine, schema, tableNames):
+    """
+    Returns a hash of the column definitions of the given tables, read with a single query, or None
+    if it can't be read (no schema given, or no information_schema in this database)
+    """
+    if schema is None or not tableNames:
+        return None
+    qry = sa.text("SELECT table_name, column_name, data_type, is_nullable FROM information_schema.columns "
+                  "WHERE table_schema = :schema AND table_name IN :names").bindparams(
+                      sa.bindparam('names', expanding=True))
+    try:
+        with engine.connect() as con:
+            rows = con.execute(qry, {'schema': schema, 'names': sorted(tableNames)}).all()
+    except sa.exc.DBAPIError:
+        return None
+    rows = sorted(tuple(str(value) for value in row) for row in rows)
+    return hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()
+
+
+def _readSchemaCache():
+    try:
+        with open(SCHEMA_CACHE_FILE, 'rb') as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return {}
+    # Tables pickled by another sqlalchemy version may not load correctly
+    if not isinstance(cache, dict) or cache.get('sqlalchemy') != sa.__version__:
+        return {}
+    return cache.get('schemas', {})
+
+
+def _loadSchemaCache(engine, schema, key):
+    """
+    Returns the MetaData saved in SCHEMA_CACHE_FILE for this database and schema, or None if there is
+    none or the tables have changed since it was saved
+    """
+    if not SCHEMA_CACHE_FILE:
+        return None
+    fingerprint, metadata = _readSchemaCache().get(key, (None, None))
+    if metadata is None or fingerprint is None:
+        return None
+    tableNames = [table.name for table in metadata.tables.values()]
+    if _schemaFingerprint(engine, schema, tableNames) != fingerprint:
+        print('Schema changed since the schema cache was saved, reflecting again')
+        return None
+    return metadata
+
+
+def _saveSchemaCache(engine, schema, key, metadata):
+    if not SCHEMA_CACHE_FILE:
+        return
+    tableNames = [table.name for table in metadata.tables.values()]
+    fingerprint = _schemaFingerprint(engine, schema, tableNames)
+    if fingerprint is None:
+        return
+    schemas = _readSchemaCache()
+    schemas[key] = (fingerprint, metadata)
+    # Write to a temp file first so an interrupted run can't leave a broken cache
+    tmpFile = SCHEMA_CACHE_FILE + '.tmp'
+    with open(tmpFile, 'wb') as f:
+        pickle.dump({'sqlalchemy': sa.__version__, 'schemas': schemas}, f)
+    os.replace(tmpFile, SCHEMA_CACHE_FILE)
+
+
+def getTables(engine,metadata,tableNames):
+    """
+    Returns the Table objects for the given table names. Each table is reflected from the database at
+    most once per process; all missing tables are reflected together. If SCHEMA_CACHE_FILE is set,
+    the reflected tables are also saved there and reused by later runs, as long as the columns of the
+    tables in the database haven't changed.
+    
+    engine: a sqlalchemy engine
+    metadata: a sqlalchemy Metadata object (only its schema is used)
+    tableNames: list of table names
+    """
+    schema = metadata.schema
+    key = (engine.url.render_as_string(hide_password=True), schema)
+    with _schemaLock:
+        if (registry := _schemaRegistry.get(key)) is None:
+            registry = _loadSchemaCache(engine, schema, key) or sa.schema.MetaData(schema=schema)
+            _schemaRegistry[key] = registry
+        missing = [name for name in tableNames if _tableKey(schema, name) not in registry.tables]
+        if missing:
+            registry.reflect(bind=engine, schema=schema, only=missing)
+            _saveSchemaCache(engine, schema, key, registry)
+    return [registry.tables[_tableKey(schema, name)] for name in tableNames]
+
+
+def getTable(engine,metadata,tableName):
+    """
+    Returns the Table object for one table, see getTables
+    """
+    return getTables(engine, metadata, [tableName])[0]
 
 
 def getExistingScriptId(engine,metadata,scriptTable=None):
@@ -61,7 +188,7 @@ def getExistingScriptId(engine,metadata,scriptTable=None):
     """
     
     if scriptTable==None:
-        scriptTable = sa.Table(SCRIPT_TABLE,metadata,autoload_with=engine)
+        scriptTable = getTable(engine,metadata,SCRIPT_TABLE)
     qry = sa.select(scriptTable).filter_by(mnsu_script_name=SCRIPT_NAME, 
                                         mnsu_script_version=SCRIPT_VERSION)
 
@@ -81,7 +208,7 @@ def getScriptId(engine,metadata):
     engine: a sqlalchemy engine
     metadata: a sqlalchemy Metadata object
     """
-    scriptTable = sa.Table(SCRIPT_TABLE,metadata,autoload_with=engine)
+    scriptTable = getTable(engine,metadata,SCRIPT_TABLE)
     if (script_id:=getExistingScriptId(engine,metadata,scriptTable=scriptTable)):
         return script_id
     
@@ -105,7 +232,7 @@ def initiateScriptActivity(engine,metadata,scriptId=None):
     scriptId: this script's pkey (optional, but intent is for this to be passed
         to reduce needless calls to the DB)
     """
-    activityTable = sa.Table(SCRIPT_ACTIVITY_TABLE,metadata,autoload_with=engine)
+    activityTable = getTable(engine,metadata,SCRIPT_ACTIVITY_TABLE)
     if scriptId==None: 
         scriptId = getScriptId(engine, metadata)
     with engine.connect() as con:
@@ -120,7 +247,7 @@ def terminateScriptActivity(engine,metadata,activityId,errorCode=None,errorText=
     """
     Updates the script activity row with a terminated_at timestamp
     """
-    activityTable = sa.Table(SCRIPT_ACTIVITY_TABLE,metadata,autoload_with=engine)
+    activityTable = getTable(engine,metadata,SCRIPT_ACTIVITY_TABLE)
     with engine.connect() as con:
         qry = sa.update(activityTable).where(
             activityTable.c.mnsu_script_activity_id==activityId).values(
@@ -132,69 +259,351 @@ def terminateScriptActivity(engine,metadata,activityId,errorCode=None,errorText=
 
 
 
-def getBusinessDataBatch(engine,metadata,scriptId,batchSize=BATCH_SIZE):
+def _candidateQuery(tables, scriptId, missingTable, requireUrl=True):
     """
-    Returns a dict of dataframes for the next BATCH_SIZE number of firm_ids to
-    be processed.  These dataframes will all share the same firm_ids
+    Returns a select of the firm_id and CreatedOn of the firms to be processed: active firms created
+    over a month ago that have no row in missingTable, have a URL (if requireUrl) and haven't been
+    processed by this script yet
     
-    engine: a sqlalchemy engine object
-    metadata: a sqlalchemy Metadata object
+    tables: dict of Table objects by name (see PULL_TABLES)
     scriptId: this script's pkey
-    batchSize: number of firm_ids to pull
+    missingTable: name of the table the firms have no rows in
+    requireUrl: only select firms that have a URL
     """
+    businessTable = tables[BUSINESS_TABLE]
+    missing = tables[missingTable]
+    urlTable = tables[URL_TABLE]
+    processedTable = tables[PROCESSED_TABLE]
     
-    # Create sqlalchemy table objects
-    tmpTableName = 'mnsu_firm_pull_{}'.format(date.today().strftime('%Y%m%d'))
-    tmpMeta = sa.schema.MetaData()
-    tmpTable = sa.Table(tmpTableName,tmpMeta,
-                     sa.Column('firm_id',sa.INTEGER,primary_key=True),
-                     prefixes=['TEMPORARY'])    
-    businessTable = sa.Table(BUSINESS_TABLE,metadata,autoload_with=engine)
-    addressTable = sa.Table(ADDRESS_TABLE,metadata,autoload_with=engine)
-    nameTable = sa.Table(NAME_TABLE,metadata,autoload_with=engine)
-    emailTable = sa.Table(EMAIL_TABLE,metadata,autoload_with=engine)
-    phoneTable = sa.Table(PHONE_TABLE,metadata,autoload_with=engine)
-    urlTable = sa.Table(URL_TABLE,metadata,autoload_with=engine)
-    processedTable = sa.Table(PROCESSED_TABLE,metadata,autoload_with=engine)
-            
     # Timestamp from 1 month ago, used in the pull query
     aMonthAgo = datetime.now() - relativedelta(month=1)
     
     # Query selecting firm_ids
-    subq1 = sa.select(1).where(
-        businessTable.c.firm_id==urlTable.c.firm_id)
-    subq2 = sa.select(1).where(
-        sa.and_(businessTable.c.firm_id==processedTable.c.firm_id,
-                processedTable.c.mnsu_script_id==scriptId))
-    qry = sa.select(businessTable.c.firm_id).filter(
+    subq1 = sa.select(1).where(businessTable.c.firm_id == missing.c.firm_id)  # Firms with a row in missingTable
+    subq2 = sa.select(1).where(sa.and_(businessTable.c.firm_id == processedTable.c.firm_id,
+                                       processedTable.c.mnsu_script_id==scriptId
+                                       ))  # Firms this script already processed
+    qry = sa.select(businessTable.c.firm_id, businessTable.c.CreatedOn).filter(
         ~subq1.exists()).filter(
             ~subq2.exists()).filter(
                 businessTable.c.active).filter(
                     businessTable.c.outofbusiness_status.is_(None)).filter(
-                        businessTable.c.CreatedOn < aMonthAgo).order_by(
-                            businessTable.c.CreatedOn.desc()).limit(
-                            batchSize)
+                        businessTable.c.CreatedOn < aMonthAgo)
+    if requireUrl and missingTable != URL_TABLE:
+        subq3 = sa.select(1).where(businessTable.c.firm_id == urlTable.c.firm_id)  # Firms with URLs
+        qry = qry.filter(subq3.exists())
+    return qry
+
+
+# JSON aggregate functions (array of rows, row as array) of the databases that can return a
+# whole batch in one query
+_JSON_AGGREGATES = {'postgresql': (sa.func.json_agg, sa.func.json_build_array),
+                    'sqlite': (sa.func.json_group_array, sa.func.json_array)}
+
+
+def _typedFrame(rows, cols):
+    """
+    Builds a dataframe from rows of values, with a compact dtype for each column based on its
+    database type: nullable Int16/Int32/Int64, boolean and Float64, or datetime64. Text stays as is.
+    
+    rows: list of rows (lists or tuples)
+    cols: list of sqlalchemy Column objects, in row order
+    """
+    df = pd.DataFrame(list(rows), columns=[col.name for col in cols])
+    for col in cols:
+        colType = col.type
+        if isinstance(colType, sa.Boolean):
+            dtype = 'boolean'
+        elif isinstance(colType, sa.SmallInteger):
+            dtype = 'Int16'
+        elif isinstance(colType, sa.BigInteger):
+            dtype = 'Int64'
+        elif isinstance(colType, sa.Integer):
+            dtype = 'Int32'
+        elif isinstance(colType, sa.Float):
+            dtype = 'Float64'
+        elif isinstance(colType, (sa.DateTime, sa.Date)):
+            # JSON leaves out zero microseconds, so one column can mix formats
+            df[col.name] = pd.to_datetime(df[col.name], format='ISO8601')
+            continue
+        else:
+            continue
+        df[col.name] = df[col.name].astype(dtype)
+    return df
+
+
+def _readBatchJson(con, tables, keys, columns, extra=()):
+    """
+    Reads the given columns of the data tables for the firm_ids in keys with a single query: each
+    table's rows come back as one JSON array of arrays. Only for databases in _JSON_AGGREGATES.
+    
+    con: a sqlalchemy connection
+    tables: dict of Table objects by name
+    keys: a Table, subquery or CTE with the firm_id column of the batch
+    columns: dict of column names by table name
+    extra: scalar subqueries to return along with the data
+    returns: (dict of dataframes by table name, list of the extra values)
+    """
+    aggregate, row = _JSON_AGGREGATES[con.dialect.name]
+    selected = []
+    for name, names in columns.items():
+        dt = tables[name]
+        dtJoin = sa.join(dt, keys, dt.c.firm_id == keys.c.firm_id)
+        selected.append(sa.select(aggregate(row(*[dt.c[col] for col in names]))).select_from(
+            dtJoin).scalar_subquery())
+    result = con.execute(sa.select(*selected, *extra)).one()
+    dataFrames = {}
+    for (name, names), rows in zip(columns.items(), result):
+        # psycopg2 decodes json itself, SQLite returns the text
+        if isinstance(rows, str):
+            rows = json.loads(rows)
+        dataFrames[name] = _typedFrame(rows or [], [tables[name].c[col] for col in names])
+    return dataFrames, list(result[len(columns):])
+
+
+def _readBatchData(con, tables, tmpTable, columns=None):
+    """
+    Returns a dict of dataframes with the rows of each data table for the firm_ids in tmpTable
+    
+    columns: dict of column names by table name to read only those (see _readBatchJson), or None
+        for every column of every data table
+    """
+    if columns is not None:
+        if con.dialect.name in _JSON_AGGREGATES:
+            return _readBatchJson(con, tables, tmpTable, columns)[0]
+        dataFrames = {}
+        for name, names in columns.items():
+            dt = tables[name]
+            cols = [dt.c[col] for col in names]
+            dtJoin = sa.join(dt, tmpTable, dt.c.firm_id == tmpTable.c.firm_id)
+            dataFrames[name] = _typedFrame(con.execute(sa.select(*cols).select_from(dtJoin)).all(), cols)
+        return dataFrames
+    
+    # Iterate through data tables
+    dataTables = [tables[name] for name in PULL_TABLES if name != PROCESSED_TABLE]
+    dataFrames = {}
+    for dt in dataTables:
+        
+        # Join each table to the temp table
+        dtJoin = sa.join(dt, tmpTable, dt.c.firm_id == tmpTable.c.firm_id)
+        slct = sa.select(dt).select_from(dtJoin)
+        
+        # Then write the result to a dataframe
+        dataFrames[dt.name] = pd.read_sql(slct, con)
+    return dataFrames
+
+
+def _pullBatch(engine, metadata, scriptId, batchSize, missingTable, requireUrl=True, columns=None):
+    """
+    Returns a dict of dataframes for the next batchSize firms of _candidateQuery, newest first
+    """
+    
+    # Create sqlalchemy table objects
+    tmpTableName = 'mnsu_firm_pull_{}'.format(date.today().strftime('%Y%m%d'))
+    tmpMeta = sa.schema.MetaData()
+    tmpTable = sa.Table(tmpTableName, tmpMeta,
+                         sa.Column('firm_id', sa.INTEGER, primary_key=True),
+                         prefixes=['TEMPORARY'])    
+    tables = dict(zip(PULL_TABLES, getTables(engine, metadata, PULL_TABLES)))
+    businessTable = tables[BUSINESS_TABLE]
+    candidates = _candidateQuery(tables, scriptId, missingTable, requireUrl).subquery()
+    qry = sa.select(candidates.c.firm_id).order_by(
+        candidates.c.CreatedOn.desc()).limit(batchSize)
 
     with engine.connect() as con:
         
-        # Insert previous query into a temp table
+        # One query: the batch firm_ids go in a CTE instead of the temp table
+        if columns is not None and con.dialect.name in _JSON_AGGREGATES:
+            return _readBatchJson(con, tables, qry.cte('mnsu_firm_batch'), columns)[0]
+        
+        # Insert previous query into a temp table (an earlier batch on this pooled session may have left one)
+        tmpTable.drop(con, checkfirst=True)
         tmpTable.create(con)
-        ins = sa.insert(tmpTable).from_select([businessTable.c.firm_id],qry)
+        ins = sa.insert(tmpTable).from_select([businessTable.c.firm_id], qry)
         con.execute(ins)
         
-        # Iterate through data tables
-        dataTables = [businessTable,addressTable,nameTable,emailTable,phoneTable,urlTable]
-        dataFrames = {}
-        for dt in dataTables:
-            
-            # Join each table to the temp table
-            dtJoin = sa.join(dt,tmpTable,dt.c.firm_id == tmpTable.c.firm_id)
-            slct = sa.select(dt).select_from(dtJoin)
-            
-            # Then write the result to a dataframe
-            dataFrames[dt.name] = pd.read_sql(slct,con)
+        return _readBatchData(con, tables, tmpTable, columns)
+
+
+class WorkCursor:
+    """
+    Pages through the firms a script has to process, for the getBus* pullers (cursor=...).
+    Without a cursor, every batch runs the whole candidate query again (anti-joins against the data
+    tables and the processed table, sorted by CreatedOn), so each batch costs more than the last as
+    the processed table grows. A cursor runs the candidate query once, when it is opened, into a
+    temporary snapshot table indexed on (CreatedOn, firm_id). Each batch then reads the next rows
+    after the last (CreatedOn, firm_id) returned, newest first, which costs the same at any point
+    of the run. The cursor keeps its own connection open, since the snapshot only exists on it.
+    Firms that become candidates after the cursor is opened are picked up by the next run.
     
-    return dataFrames
+    engine: a sqlalchemy engine object
+    metadata: a sqlalchemy Metadata object
+    scriptId: this script's pkey
+    missingTable: name of the table the firms have no rows in (e.g. EMAIL_TABLE)
+    requireUrl: only select firms that have a URL
+    """
+    def __init__(self, engine, metadata, scriptId, missingTable, requireUrl=True):
+        # The batches are saved with commitBatch, fail now rather than after scraping the first one
+        checkProgressColumn(engine, metadata)
+        self.tables = dict(zip(PULL_TABLES, getTables(engine, metadata, PULL_TABLES)))
+        createdOn = self.tables[BUSINESS_TABLE].c.CreatedOn
+        tmpMeta = sa.schema.MetaData()
+        self.snapshotTable = sa.Table('mnsu_firm_snapshot', tmpMeta,
+                                      sa.Column('firm_id', sa.INTEGER, primary_key=True),
+                                      sa.Column('CreatedOn', createdOn.type),
+                                      sa.Index('mnsu_firm_snapshot_key', 'CreatedOn', 'firm_id'),
+                                      prefixes=['TEMPORARY'])
+        self.batchTable = sa.Table('mnsu_firm_pull', tmpMeta,
+                                   sa.Column('firm_id', sa.INTEGER, primary_key=True),
+                                   prefixes=['TEMPORARY'])
+        self.tmpMeta = tmpMeta
+        self.lastKey = None
+        self.con = engine.connect()
+        try:
+            # Temp tables live as long as the database session, which the pool may reuse
+            tmpMeta.drop_all(self.con)
+            tmpMeta.create_all(self.con)
+            qry = _candidateQuery(self.tables, scriptId, missingTable, requireUrl)
+            self.con.execute(sa.insert(self.snapshotTable).from_select(['firm_id', 'CreatedOn'], qry))
+            self.total = self.con.execute(
+                sa.select(sa.func.count()).select_from(self.snapshotTable)).scalar()
+            self.con.commit()
+        except Exception:
+            self.con.close()
+            raise
+    
+    def nextBatch(self, batchSize=BATCH_SIZE, columns=None):
+        """
+        Returns a dict of dataframes for the next batchSize firms of the snapshot, in the same
+        form as the pullers. The dataframes are empty once the snapshot is used up.
+        
+        columns: dict of column names by table name to read only those, or None for every column
+        """
+        snapshot = self.snapshotTable
+        qry = sa.select(snapshot.c.firm_id, snapshot.c.CreatedOn).order_by(
+            snapshot.c.CreatedOn.desc(), snapshot.c.firm_id.desc()).limit(batchSize)
+        if self.lastKey is not None:
+            lastCreatedOn, lastFirmId = self.lastKey
+            # (CreatedOn, firm_id) < lastKey, spelled out for databases without row comparisons
+            qry = qry.where(sa.or_(snapshot.c.CreatedOn < lastCreatedOn,
+                                   sa.and_(snapshot.c.CreatedOn == lastCreatedOn,
+                                           snapshot.c.firm_id < lastFirmId)))
+        
+        # One query: the page goes in a CTE, and its last key comes back with the data
+        if columns is not None and self.con.dialect.name in _JSON_AGGREGATES:
+            page = qry.cte('mnsu_firm_page')
+            last = sa.select(page.c.CreatedOn, page.c.firm_id).order_by(
+                page.c.CreatedOn.asc(), page.c.firm_id.asc()).limit(1).subquery()
+            dataFrames, lastKey = _readBatchJson(self.con, self.tables, page, columns,
+                                                 extra=[sa.select(last.c.CreatedOn).scalar_subquery(),
+                                                        sa.select(last.c.firm_id).scalar_subquery()])
+            if lastKey[1] is not None:
+                self.lastKey = tuple(lastKey)
+            self.con.commit()
+            return dataFrames
+        
+        keys = self.con.execute(qry).all()
+        self.con.execute(sa.delete(self.batchTable))
+        if keys:
+            self.lastKey = (keys[-1].CreatedOn, keys[-1].firm_id)
+            self.con.execute(sa.insert(self.batchTable), [{'firm_id': key[0]} for key in keys])
+        dataFrames = _readBatchData(self.con, self.tables, self.batchTable, columns)
+        self.con.commit()
+        return dataFrames
+    
+    def close(self):
+        try:
+            # Roll back first, in case a failed statement left the transaction aborted
+            self.con.rollback()
+            self.tmpMeta.drop_all(self.con)
+            self.con.commit()
+        finally:
+            self.con.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def getBusinessDataBatch(engine,metadata,scriptId,batchSize=BATCH_SIZE,cursor=None,columns=URL_BATCH_COLUMNS):
+    """
+    Returns a dict of dataframes for the next BATCH_SIZE number of firm_ids to
+    be processed.  These dataframes will all share the same firm_ids
+    
+    engine: a sqlalchemy engine object
+    metadata: a sqlalchemy Metadata object
+    scriptId: this script's pkey
+    batchSize: number of firm_ids to pull
+    cursor: (optional) a WorkCursor(engine, metadata, scriptId, URL_TABLE, requireUrl=False)
+        to page through instead of querying the candidates again
+    columns: dict of column names by table name to return, by default the columns
+        its script reads; None returns every table and column
+    """
+    if cursor is not None:
+        return cursor.nextBatch(batchSize, columns)
+    return _pullBatch(engine, metadata, scriptId, batchSize, URL_TABLE, requireUrl=False, columns=columns)
+
+def _csvField(value):
+    # Every value is quoted, so only None (unquoted and empty) is read as NULL, not ''
+    if value is None:
+        return ''
+    # Integer columns with missing values arrive as floats; '1.0' would be rejected by an int column
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copyRows(table, conn, keys, data_iter):
+    """
+    pandas to_sql insert method for PostgreSQL: sends the rows as one CSV stream with
+    COPY ... FROM STDIN instead of one INSERT per row
+    """
+    preparer = conn.dialect.identifier_preparer
+    tableName = preparer.quote(table.name)
+    if table.schema:
+        tableName = preparer.quote_schema(table.schema) + '.' + tableName
+    columns = ', '.join(preparer.quote(key) for key in keys)
+    buf = io.StringIO()
+    rowCount = 0
+    for row in data_iter:
+        buf.write(','.join(_csvField(value) for value in row) + '\n')
+        rowCount += 1
+    buf.seek(0)
+    with conn.connection.cursor() as cur:
+        cur.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(tableName, columns), buf)
+    return rowCount
+
+
+def writeFrame(engine,df,tableName,schema=CONNECT_SCHEMA,chunksize=WRITE_CHUNKSIZE):
+    """
+    Appends the rows of a dataframe to a table with the database's bulk path, and prints the
+    rows/sec: COPY FROM STDIN on PostgreSQL through psycopg2 (MNSU, DATA_APPS, ...), executemany
+    otherwise, which is batched on SQL Server by the fast_executemany engines of connect_iabbb.connect
+    
+    engine: a sqlalchemy engine or connection
+    df: the dataframe, with the table's column names
+    tableName: name of the table
+    schema: schema of the table
+    chunksize: number of rows sent per COPY / executemany call
+    returns: number of rows written
+    """
+    # copy_expert is psycopg2's
+    method = _copyRows if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2' else None
+    start = time.perf_counter()
+    df.to_sql(name=tableName,
+              con=engine,
+              schema=schema,
+              if_exists='append',
+              index=False,
+              chunksize=chunksize,
+              method=method)
+    seconds = time.perf_counter() - start
+    rate = len(df) / seconds if seconds > 0 else 0
+    print(f"Wrote {len(df)} rows to {tableName} in {seconds:.3f}s ({rate:,.0f} rows/sec)")
+    return len(df)
+
 
 def logProcessedToDB(engine,processedRows,scriptId,activityId):
     """
@@ -211,14 +620,72 @@ def logProcessedToDB(engine,processedRows,scriptId,activityId):
     processedRows['mnsu_script_id'] = scriptId
     processedRows['mnsu_script_activity_id'] = activityId
     
-    processedRows.to_sql(name=PROCESSED_TABLE,
-                         con=engine,
-                         schema=CONNECT_SCHEMA,
-                         if_exists='append',
-                         index=False)
+    writeFrame(engine, processedRows, PROCESSED_TABLE)
     
 
-def getBusWoutEml(engine, metadata, scriptId, batchSize=BATCH_SIZE):
+def checkProgressColumn(engine,metadata):
+    """
+    Raises RuntimeError if the script activity table has no PROGRESS_COLUMN for commitBatch to
+    update. WorkCursor checks this when it is opened, so a missing migration stops a run before its
+    first batch is scraped.
+    
+    engine: a sqlalchemy engine
+    metadata: a sqlalchemy Metadata object
+    """
+    activityTable = getTable(engine, metadata, SCRIPT_ACTIVITY_TABLE)
+    if PROGRESS_COLUMN not in activityTable.c:
+        raise RuntimeError(f"{SCRIPT_ACTIVITY_TABLE} has no {PROGRESS_COLUMN} column, "
+                           "run sql/mnsu_script_activity_firms_processed.sql first")
+
+
+def commitBatch(engine,metadata,scriptId,activityId,processedRows,generatedTable=None,writeGenerated=None):
+    """
+    Saves one batch in a single transaction on one connection: the generated rows, the processed
+    firm markers (logProcessedToDB) and the number of firms this activity has processed so far
+    (PROGRESS_COLUMN of the script activity table, added by sql/mnsu_script_activity_firms_processed.sql). Either all of it is saved or none of it,
+    so a crash can't leave firms marked as processed without their results (or the reverse).
+    Rows an earlier attempt at the same batch saved are deleted first, so retrying a batch
+    doesn't save it twice.
+    
+    engine: a sqlalchemy engine
+    metadata: a sqlalchemy Metadata object
+    scriptId: the script's pkey
+    activityId: the script activity id
+    processedRows: a dataFrame containing firm_id, the firms of the batch
+    generatedTable: name of the table the generated rows go in
+    writeGenerated: function writing the generated rows on the connection it is given, e.g.
+        lambda con: logGeneratedEmailToDB(con, emailDf, activityId)
+    """
+    firmIds = [int(firmId) for firmId in processedRows['firm_id'].dropna().unique()]
+    processedTable, activityTable = getTables(engine, metadata, [PROCESSED_TABLE, SCRIPT_ACTIVITY_TABLE])
+    generated = getTable(engine, metadata, generatedTable) if generatedTable is not None else None
+    checkProgressColumn(engine, metadata)
+    
+    with engine.begin() as con:
+        
+        # Remove what an earlier attempt at this batch saved
+        if generated is not None:
+            con.execute(sa.delete(generated).where(
+                generated.c.mnsu_script_activity_id == activityId,
+                generated.c.firm_id.in_(firmIds)))
+        con.execute(sa.delete(processedTable).where(
+            processedTable.c.mnsu_script_id == scriptId,
+            processedTable.c.firm_id.in_(firmIds)))
+        
+        if writeGenerated is not None:
+            writeGenerated(con)
+        logProcessedToDB(con, processedRows, scriptId, activityId)
+        
+        # Progress is counted from the processed table, so it stays right on retries
+        processedCount = sa.select(sa.func.count()).select_from(processedTable).where(
+            processedTable.c.mnsu_script_activity_id == activityId).scalar_subquery()
+        con.execute(sa.update(activityTable).where(
+            activityTable.c.mnsu_script_activity_id == activityId).values(
+                {PROGRESS_COLUMN: processedCount}))
+
+
+def getBusWoutEml(engine, metadata, scriptId, batchSize=BATCH_SIZE, cursor=None,
+        columns=EMAIL_BATCH_COLUMNS):
     """
     Written by Spring 2025 MNSU project team
     Returns a dict of dataframes for the next BATCH_SIZE number of firm_ids to
@@ -230,63 +697,17 @@ def getBusWoutEml(engine, metadata, scriptId, batchSize=BATCH_SIZE):
     metadata: a sqlalchemy Metadata object
     scriptId: this script's pkey
     batchSize: number of firm_ids to pull
+    cursor: (optional) a WorkCursor(engine, metadata, scriptId, EMAIL_TABLE) to page
+        through instead of querying the candidates again
+    columns: dict of column names by table name to return, by default the columns
+        its script reads; None returns every table and column
     """
-    
-    # Create sqlalchemy table objects
-    tmpTableName = 'mnsu_firm_pull_{}'.format(date.today().strftime('%Y%m%d'))
-    tmpMeta = sa.schema.MetaData()
-    tmpTable = sa.Table(tmpTableName, tmpMeta,
-                         sa.Column('firm_id', sa.INTEGER, primary_key=True),
-                         prefixes=['TEMPORARY'])    
-    businessTable = sa.Table(BUSINESS_TABLE, metadata, autoload_with=engine)
-    addressTable = sa.Table(ADDRESS_TABLE, metadata, autoload_with=engine)
-    nameTable = sa.Table(NAME_TABLE, metadata, autoload_with=engine)
-    emailTable = sa.Table(EMAIL_TABLE, metadata, autoload_with=engine)
-    phoneTable = sa.Table(PHONE_TABLE, metadata, autoload_with=engine)
-    urlTable = sa.Table(URL_TABLE, metadata, autoload_with=engine)
-    processedTable = sa.Table(PROCESSED_TABLE, metadata, autoload_with=engine)
-            
-    # Timestamp from 1 month ago, used in the pull query
-    aMonthAgo = datetime.now() - relativedelta(month=1)
-    
-    # Query selecting firm_ids
-    subq1 = sa.select(1).where(businessTable.c.firm_id == emailTable.c.firm_id)  # Firms with emails
-    subq2 = sa.select(1).where(sa.and_(businessTable.c.firm_id == processedTable.c.firm_id,
-                                       processedTable.c.mnsu_script_id==scriptId
-                                       ))  # Firms with URLs
-    subq3 = sa.select(1).where(businessTable.c.firm_id == urlTable.c.firm_id)
-    # Adjust the query to select firms that do not have emails but have URLs
-    qry = sa.select(businessTable.c.firm_id).filter(
-        ~subq1.exists()).filter(  # Ensure the firm does not have an email
-            ~subq2.exists()).filter( # Ensure the firm has a URL
-                subq3.exists()).filter(    
-                businessTable.c.active).filter(
-                    businessTable.c.outofbusiness_status.is_(None)).filter(
-                        businessTable.c.CreatedOn < aMonthAgo).order_by(
-                            businessTable.c.CreatedOn.desc()).limit(batchSize)
+    if cursor is not None:
+        return cursor.nextBatch(batchSize, columns)
+    return _pullBatch(engine, metadata, scriptId, batchSize, EMAIL_TABLE, columns=columns)
 
-    with engine.connect() as con:
-        
-        # Insert previous query into a temp table
-        tmpTable.create(con)
-        ins = sa.insert(tmpTable).from_select([businessTable.c.firm_id], qry)
-        con.execute(ins)
-
-        # Iterate through data tables
-        dataTables = [businessTable, addressTable, nameTable, emailTable, phoneTable, urlTable]
-        dataFrames = {}
-        for dt in dataTables:
-            
-            # Join each table to the temp table
-            dtJoin = sa.join(dt, tmpTable, dt.c.firm_id == tmpTable.c.firm_id)
-            slct = sa.select(dt).select_from(dtJoin)
-            
-            # Then write the result to a dataframe
-            dataFrames[dt.name] = pd.read_sql(slct, con)
-    
-    return dataFrames
-
-def getBusWoutPhone(engine, metadata, scriptId, batchSize=BATCH_SIZE):
+def getBusWoutPhone(engine, metadata, scriptId, batchSize=BATCH_SIZE, cursor=None,
+        columns=PHONE_BATCH_COLUMNS):
     """
     Written by Spring 2025 MNSU project team
     Returns a dict of dataframes for the next BATCH_SIZE number of firm_ids to
@@ -298,65 +719,18 @@ def getBusWoutPhone(engine, metadata, scriptId, batchSize=BATCH_SIZE):
     metadata: a sqlalchemy Metadata object
     scriptId: this script's pkey
     batchSize: number of firm_ids to pull
+    cursor: (optional) a WorkCursor(engine, metadata, scriptId, PHONE_TABLE) to page
+        through instead of querying the candidates again
+    columns: dict of column names by table name to return, by default the columns
+        its script reads; None returns every table and column
     """
-    
-    # Create sqlalchemy table objects
-    tmpTableName = 'mnsu_firm_pull_{}'.format(date.today().strftime('%Y%m%d'))
-    tmpMeta = sa.schema.MetaData()
-    tmpTable = sa.Table(tmpTableName, tmpMeta,
-                         sa.Column('firm_id', sa.INTEGER, primary_key=True),
-                         prefixes=['TEMPORARY'])    
-    businessTable = sa.Table(BUSINESS_TABLE, metadata, autoload_with=engine)
-    addressTable = sa.Table(ADDRESS_TABLE, metadata, autoload_with=engine)
-    nameTable = sa.Table(NAME_TABLE, metadata, autoload_with=engine)
-    emailTable = sa.Table(EMAIL_TABLE, metadata, autoload_with=engine)
-    phoneTable = sa.Table(PHONE_TABLE, metadata, autoload_with=engine)
-    urlTable = sa.Table(URL_TABLE, metadata, autoload_with=engine)
-    processedTable = sa.Table(PROCESSED_TABLE, metadata, autoload_with=engine)
-            
-    # Timestamp from 1 month ago, used in the pull query
-    aMonthAgo = datetime.now() - relativedelta(month=1)
-    
-    # Query selecting firm_ids
-    subq1 = sa.select(1).where(businessTable.c.firm_id == phoneTable.c.firm_id)
-    subq2 = sa.select(1).where(sa.and_(businessTable.c.firm_id == processedTable.c.firm_id,
-                                       processedTable.c.mnsu_script_id==scriptId
-                                       ))  # Firms with phone numbers
-    subq3 = sa.select(1).where(businessTable.c.firm_id == urlTable.c.firm_id)  # Firms with URLs
-    
-    # Adjust the query to select firms that do not have phone numbers but have URLs
-    qry = sa.select(businessTable.c.firm_id).filter(
-        ~subq1.exists()).filter(  # Ensure the firm does not have an phone number
-            ~subq2.exists()).filter(
-                subq3.exists()).filter(  # Ensure the firm has a URL
-        businessTable.c.active).filter(
-        businessTable.c.outofbusiness_status.is_(None)).filter(
-        businessTable.c.CreatedOn < aMonthAgo).order_by(
-        businessTable.c.CreatedOn.desc()).limit(batchSize)
-
-    with engine.connect() as con:
-        
-        # Insert previous query into a temp table
-        tmpTable.create(con)
-        ins = sa.insert(tmpTable).from_select([businessTable.c.firm_id], qry)
-        con.execute(ins)
+    if cursor is not None:
+        return cursor.nextBatch(batchSize, columns)
+    return _pullBatch(engine, metadata, scriptId, batchSize, PHONE_TABLE, columns=columns)
 
-        # Iterate through data tables
-        dataTables = [businessTable, addressTable, nameTable, emailTable, phoneTable, urlTable]
-        dataFrames = {}
-        for dt in dataTables:
-            
-            # Join each table to the temp table
-            dtJoin = sa.join(dt, tmpTable, dt.c.firm_id == tmpTable.c.firm_id)
-            slct = sa.select(dt).select_from(dtJoin)
-            
-            # Then write the result to a dataframe
-            dataFrames[dt.name] = pd.read_sql(slct, con)
-    
-    return dataFrames
 
-
-def getBusWoutAddress(engine, metadata, scriptId, batchSize=BATCH_SIZE):
+def getBusWoutAddress(engine, metadata, scriptId, batchSize=BATCH_SIZE, cursor=None,
+        columns=ADDRESS_BATCH_COLUMNS):
     """
     Written by Spring 2025 MNSU project team
     Returns a dict of dataframes for the next BATCH_SIZE number of firm_ids to
@@ -368,55 +742,11 @@ def getBusWoutAddress(engine, metadata, scriptId, batchSize=BATCH_SIZE):
     metadata: a sqlalchemy Metadata object
     scriptId: this script's pkey
     batchSize: number of firm_ids to pull
+    cursor: (optional) a WorkCursor(engine, metadata, scriptId, ADDRESS_TABLE) to page
+        through instead of querying the candidates again
+    columns: dict of column names by table name to return, by default the columns
+        its script reads; None returns every table and column
     """
-    
-    # Create sqlalchemy table objects
-    tmpTableName = 'mnsu_firm_pull_{}'.format(date.today().strftime('%Y%m%d'))
-    tmpMeta = sa.schema.MetaData()
-    tmpTable = sa.Table(tmpTableName, tmpMeta,
-                         sa.Column('firm_id', sa.INTEGER, primary_key=True),
-                         prefixes=['TEMPORARY'])    
-    businessTable = sa.Table(BUSINESS_TABLE, metadata, autoload_with=engine)
-    addressTable = sa.Table(ADDRESS_TABLE, metadata, autoload_with=engine)
-    nameTable = sa.Table(NAME_TABLE, metadata, autoload_with=engine)
-    emailTable = sa.Table(EMAIL_TABLE, metadata, autoload_with=engine)
-    phoneTable = sa.Table(PHONE_TABLE, metadata, autoload_with=engine)
-    urlTable = sa.Table(URL_TABLE, metadata, autoload_with=engine)
-    processedTable = sa.Table(PROCESSED_TABLE, metadata, autoload_with=engine)
-            
-    # Timestamp from 1 month ago, used in the pull query
-    aMonthAgo = datetime.now() - relativedelta(month=1)
-    
-    # Query selecting firm_ids
-    subq1 = sa.select(1).where(businessTable.c.firm_id == addressTable.c.firm_id).exists()  # Firms with phone numbers
-    subq2 = sa.select(1).where(businessTable.c.firm_id == urlTable.c.firm_id).exists()  # Firms with URLs
-    
-    # Adjust the query to select firms that do not have phone numbers but have URLs
-    qry = sa.select(businessTable.c.firm_id).filter(
-        ~subq1).filter(  # Ensure the firm does not have an phone number
-        subq2).filter(  # Ensure the firm has a URL
-        businessTable.c.active).filter(
-        businessTable.c.outofbusiness_status.is_(None)).filter(
-        businessTable.c.CreatedOn < aMonthAgo).order_by(
-        businessTable.c.CreatedOn.desc()).limit(batchSize)
-
-    with engine.connect() as con:
-        
-        # Insert previous query into a temp table
-        tmpTable.create(con)
-        ins = sa.insert(tmpTable).from_select([businessTable.c.firm_id], qry)
-        con.execute(ins)
-
-        # Iterate through data tables
-        dataTables = [businessTable, addressTable, nameTable, emailTable, phoneTable, urlTable]
-        dataFrames = {}
-        for dt in dataTables:
-            
-            # Join each table to the temp table
-            dtJoin = sa.join(dt, tmpTable, dt.c.firm_id == tmpTable.c.firm_id)
-            slct = sa.select(dt).select_from(dtJoin)
-            
-            # Then write the result to a dataframe
-            dataFrames[dt.name] = pd.read_sql(slct, con)
-    
-    return dataFrames
+    if cursor is not None:
+        return cursor.nextBatch(batchSize, columns)
+    return _pullBatch(engine, metadata, scriptId, batchSize, ADDRESS_TABLE, columns=columns)
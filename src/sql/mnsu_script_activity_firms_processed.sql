@@ -0,0 +1,6 @@
+-- Adds the progress counter commitBatch() (src/setup.py) updates with every batch:
+-- the number of firms the script activity has logged in mnsu_firm_processed so far.
+-- Run once per schema before running the scripts.
+
+ALTER TABLE spring2025.mnsu_script_activity
+    ADD COLUMN IF NOT EXISTS firms_processed integer NOT NULL DEFAULT 0;
@@ -0,0 +1,184 @@
+"""
+Shared pytest fixtures
+The db fixture builds a small copy of the spring2025 tables, filled with random firms, in a SQLite
+file (schema attached as a second database). If TEST_POSTGRES_URL is set (e.g.
+postgresql+psycopg2://postgres@/postgres?host=/tmp/pgdata), the tests using it also run against that
+PostgreSQL database, in a spring2025 schema that is dropped and created again for each test.
+"""
+import os, sys
+import random
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+import pytest
+import sqlalchemy as sa
+import setup as st
+import dead_hosts
+import page_cache
+
+# test_connection.py connects to the sandbox database when imported, run it by hand
+collect_ignore = ['test_connection.py']
+
+TEST_SCHEMA = 'spring2025'
+FIRM_COUNT = 60
+SCRIPT_ID = 7
+ACTIVITY_ID = 1
+
+
+def _defineTables(metadata):
+    sa.Table(st.BUSINESS_TABLE, metadata,
+             sa.Column('firm_id', sa.Integer, primary_key=True, autoincrement=False),
+             sa.Column('active', sa.Boolean),
+             sa.Column('outofbusiness_status', sa.Text),
+             sa.Column('CreatedOn', sa.DateTime))
+    sa.Table(st.ADDRESS_TABLE, metadata,
+             sa.Column('firm_address_id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('address', sa.Text), sa.Column('city', sa.Text),
+             sa.Column('state', sa.Text), sa.Column('zip', sa.Text))
+    sa.Table(st.NAME_TABLE, metadata,
+             sa.Column('firm_companyname_id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('company_name', sa.Text))
+    sa.Table(st.EMAIL_TABLE, metadata,
+             sa.Column('firm_email_id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('email', sa.Text),
+             sa.Column('email_type_id', sa.Integer),
+             sa.Column('email_status_id', sa.SmallInteger),
+             sa.Column('address_id', sa.BigInteger))
+    sa.Table(st.PHONE_TABLE, metadata,
+             sa.Column('firm_phone_id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('phone', sa.Text),
+             sa.Column('phone_status_id', sa.Integer),
+             sa.Column('phone_type_id', sa.Integer))
+    sa.Table(st.URL_TABLE, metadata,
+             sa.Column('firm_url_id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('url', sa.Text),
+             sa.Column('main', sa.Boolean),
+             sa.Column('url_type_id', sa.Integer),
+             sa.Column('url_status_id', sa.Integer))
+    sa.Table(st.PROCESSED_TABLE, metadata,
+             sa.Column('mnsu_firm_processed_id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('mnsu_script_id', sa.Integer),
+             sa.Column('mnsu_script_activity_id', sa.Integer))
+    sa.Table(st.SCRIPT_ACTIVITY_TABLE, metadata,
+             sa.Column('mnsu_script_activity_id', sa.Integer, primary_key=True, autoincrement=False),
+             sa.Column('mnsu_script_id', sa.Integer),
+             sa.Column('initiated_at', sa.DateTime),
+             sa.Column('terminated_at', sa.DateTime),
+             sa.Column('error_code', sa.Integer),
+             sa.Column('error_text', sa.Text),
+             sa.Column(st.PROGRESS_COLUMN, sa.Integer, nullable=False, server_default='0'))
+    sa.Table('mnsu_generated_firm_email', metadata,
+             sa.Column('id', sa.Integer, primary_key=True),
+             sa.Column('firm_id', sa.Integer),
+             sa.Column('email', sa.Text),
+             sa.Column('mnsu_script_activity_id', sa.Integer),
+             sa.Column('note', sa.Text),
+             sa.Column('confidence_level', sa.Integer))
+
+
+def _fill(con, metadata, seed=0):
+    """
+    Random firms: most active, created on distinct hours in 2024, about half of them with each kind
+    of data row, and a few firms already processed by SCRIPT_ID
+    """
+    tables = {table.name: table for table in metadata.tables.values()}
+    rnd = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    hours = rnd.sample(range(5000), FIRM_COUNT)
+    rows = {name: [] for name in tables}
+    for firmId in range(1, FIRM_COUNT + 1):
+        rows[st.BUSINESS_TABLE].append({'firm_id': firmId, 'active': rnd.random() < 0.9,
+                                        'outofbusiness_status': None if rnd.random() < 0.9 else 'closed',
+                                        'CreatedOn': base + timedelta(hours=hours[firmId - 1], microseconds=firmId % 2)})
+        rows[st.NAME_TABLE].append({'firm_id': firmId, 'company_name': f'Firm {firmId}, "Inc"'})
+        if rnd.random() < 0.6:
+            rows[st.URL_TABLE].append({'firm_id': firmId, 'url': f'http://f{firmId}.com', 'main': True,
+                                       'url_type_id': 1, 'url_status_id': rnd.choice([1, 3, None])})
+        if rnd.random() < 0.3:
+            rows[st.URL_TABLE].append({'firm_id': firmId, 'url': f'http://www.f{firmId}.net', 'main': False,
+                                       'url_type_id': None, 'url_status_id': 1})
+        if rnd.random() < 0.5:
+            rows[st.EMAIL_TABLE].append({'firm_id': firmId, 'email': f'a@f{firmId}.com',
+                                         'email_type_id': rnd.choice([1, 2, None]), 'email_status_id': 1,
+                                         'address_id': None if rnd.random() < 0.5 else firmId * 10 ** 10})
+        if rnd.random() < 0.5:
+            rows[st.PHONE_TABLE].append({'firm_id': firmId, 'phone': f'507555{firmId:04d}',
+                                         'phone_status_id': rnd.choice([1, None]), 'phone_type_id': 2})
+        if rnd.random() < 0.5:
+            rows[st.ADDRESS_TABLE].append({'firm_id': firmId, 'address': f'{firmId} Main St', 'city': 'Mankato',
+                                           'state': 'MN', 'zip': '56001'})
+        if rnd.random() < 0.1:
+            rows[st.PROCESSED_TABLE].append({'firm_id': firmId, 'mnsu_script_id': SCRIPT_ID,
+                                             'mnsu_script_activity_id': ACTIVITY_ID})
+    rows[st.SCRIPT_ACTIVITY_TABLE].append({'mnsu_script_activity_id': ACTIVITY_ID, 'mnsu_script_id': SCRIPT_ID,
+                                           'initiated_at': base})
+    for name, tableRows in rows.items():
+        if tableRows:
+            con.execute(sa.insert(tables[name]), tableRows)
+
+
+def _sqliteEngine(tmpPath):
+    engine = sa.create_engine('sqlite:///' + str(tmpPath / 'main.db'), poolclass=sa.pool.NullPool)
+
+    @sa.event.listens_for(engine, 'connect')
+    def attachSchema(dbapiCon, record):
+        dbapiCon.execute("ATTACH DATABASE '{}' AS {}".format(tmpPath / 'schema.db', TEST_SCHEMA))
+    return engine
+
+
+def _postgresEngine(url):
+    engine = sa.create_engine(url)
+    with engine.begin() as con:
+        con.execute(sa.text(f'DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE'))
+        con.execute(sa.text(f'CREATE SCHEMA {TEST_SCHEMA}'))
+    return engine
+
+
+DIALECTS = ['sqlite'] + (['postgresql'] if os.environ.get('TEST_POSTGRES_URL') else [])
+
+
+@pytest.fixture(params=DIALECTS)
+def db(request, tmp_path):
+    """
+    Returns (engine, metadata) for a freshly filled copy of the tables
+    """
+    if request.param == 'postgresql':
+        engine = _postgresEngine(os.environ['TEST_POSTGRES_URL'])
+    else:
+        engine = _sqliteEngine(tmp_path)
+    metadata = sa.schema.MetaData(schema=TEST_SCHEMA)
+    _defineTables(metadata)
+    with engine.begin() as con:
+        metadata.create_all(con)
+        _fill(con, metadata)
+    # Tables reflected by an earlier test may have different columns
+    st._schemaRegistry.clear()
+    yield engine, sa.schema.MetaData(schema=TEST_SCHEMA)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def emptyDeadHosts(monkeypatch, tmp_path):
+    """
+    Every test starts with an empty dead-host cache, saved under tmp_path instead of src/.cache
+    """
+    monkeypatch.setattr(dead_hosts, '_hosts', {})
+    monkeypatch.setattr(dead_hosts, '_state', {'dirty': False, 'saved_at': 0.0})
+    monkeypatch.setattr(dead_hosts, 'DEAD_HOSTS_FILE', str(tmp_path / 'dead_hosts.json'))
+
+
+@pytest.fixture(autouse=True)
+def emptyPageCache(monkeypatch, tmp_path):
+    """
+    Every test starts with an empty page cache, kept on disk under tmp_path instead of src/.cache
+    """
+    monkeypatch.setattr(page_cache.PAGE_CACHE, 'cache_dir', str(tmp_path / 'pages'))
+    page_cache.clear_cache()
+    yield
+    page_cache.clear_cache()
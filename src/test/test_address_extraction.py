@@ -0,0 +1,67 @@
+"""
+Tests of the street-address search in address_extraction
+"""
+import pytest
+import address_extraction as ae
+
+
+def _address(street, city, state, zipcode, country='USA'):
+    return {'street': street, 'city': city, 'state': state, 'zip': zipcode, 'country': country,
+            'address': f'{street}, {city}, {state} {zipcode}'}
+
+
+MANKATO = _address('123 Main St', 'Mankato', 'MN', '56001')
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Visit us at 123 Main St, Mankato, MN 56001 today', [MANKATO]),
+    # Zip+4 is cut to the zip, the state name becomes its abbreviation
+    ('Acme, 4500 W. 78th Street Suite 200, Bloomington, Minnesota 55435-1234.',
+     [_address('4500 W. 78th Street Suite 200', 'Bloomington', 'MN', '55435')]),
+    ('221 Pine Rd, Fargo, north dakota 58102', [_address('221 Pine Rd', 'Fargo', 'ND', '58102')]),
+    ('100 Queen St W, Toronto, ON M5H 2N2', [_address('100 Queen St W', 'Toronto', 'ON', 'M5H 2N2', 'CAN')]),
+    # Without commas
+    ('123 Main St Mankato MN 56001', [MANKATO]),
+    # Zip that doesn't belong to the state
+    ('12 Elm Ave, Austin, TX 56001', []),
+    # Lowercase abbreviations are ordinary words
+    ('55 Oak Ln, Springfield, in 46201', []),
+    # No street in front of the state and zip
+    ('we are in 5 cities or 10 states, MN 56001', []),
+    ('', []),
+])
+def test_find_addresses(text, expected):
+    assert ae.find_addresses(text) == expected
+
+
+def test_find_addresses_in_order_without_duplicates():
+    text = ('Stores: 123 Main St, Mankato, MN 56001. 221 Pine Rd, Fargo, ND 58102. '
+            'Head office: 123 Main St, Mankato, MN 56001.')
+    assert ae.find_addresses(text) == [MANKATO, _address('221 Pine Rd', 'Fargo', 'ND', '58102')]
+
+
+def test_iter_page_addresses_skips_invisible_text():
+    page = (b'<html><head><style>.a{}</style><script>var x = "9 Fake St, Nowhere, MN 55401";</script></head>'
+            b'<body><p>123 Main St,</p><p>Mankato, MN&nbsp;56001</p>'
+            b'<!-- 8 Old Rd, Duluth, MN 55802 --></body></html>')
+    assert list(ae.iter_page_addresses(page)) == [MANKATO]
+    assert list(ae.iter_page_addresses(b'<p>no address here</p>')) == []
+    assert list(ae.iter_page_addresses(None)) == []
+
+
+def test_normalize_addresses():
+    addresses = [{'street': '123 Main St', 'city': 'Mankato', 'state': 'Minnesota', 'zip': '56001-1234'},
+                 # One-line address, searched with find_addresses
+                 {'street': '221 Pine Rd, Fargo, ND 58102'},
+                 # Zip doesn't belong to the state
+                 {'street': '1 Elm St', 'city': 'Mankato', 'state': 'MN', 'zip': '99999'},
+                 {'street': '1 Elm St', 'city': 'Mankato', 'state': 'Nowhere', 'zip': '56001'}]
+    assert list(ae.normalize_addresses(addresses)) == [MANKATO, _address('221 Pine Rd', 'Fargo', 'ND', '58102')]
+
+
+@pytest.mark.parametrize('state, abbreviation', [
+    ('MN', 'MN'), ('mn', 'MN'), ('Minnesota', 'MN'), ('new  york', 'NY'), ('N.Y.', 'NY'),
+    ('Quebec', 'QC'), ('XX', ''), ('Nowhere', ''), (None, ''),
+])
+def test_normalize_state(state, abbreviation):
+    assert ae.normalize_state(state) == abbreviation
@@ -0,0 +1,114 @@
+"""
+Tests of fetch_many against a local HTTP server: pages go into the page cache, requests to one host
+are limited, and the deadline and failures give None
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import async_fetcher as af
+import dead_hosts
+import page_cache
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.maxActive = max(server.maxActive, server.active)
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(2)
+            elif self.path.startswith('/busy'):
+                time.sleep(0.1)
+            contentType = 'application/pdf' if self.path == '/file.pdf' else 'text/html; charset=utf-8'
+            body = f'<p>{self.path}</p>'.encode('utf-8')
+            self.send_response(404 if self.path == '/missing' else 200)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    async def noWait(url):
+        pass
+    monkeypatch.setattr(af, 'wait_for_slot_async', noWait)
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    httpd.block_on_close = False
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.active = httpd.maxActive = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_pages_fetched_once_and_cached(server):
+    httpd, base = server
+    urls = [base + '/a', base + '/b', base + '/a', None, '', base + '/missing', base + '/file.pdf']
+    pages = af.fetch_many(urls)
+    assert set(pages) == {base + '/a', base + '/b', base + '/missing', base + '/file.pdf'}
+    assert pages[base + '/a'].content == b'<p>/a</p>'
+    assert pages[base + '/missing'].status_code == 404
+    # Non-html bodies aren't read
+    assert pages[base + '/file.pdf'].content == b''
+    assert sorted(httpd.requests) == ['/a', '/b', '/file.pdf', '/missing']
+    assert page_cache.PAGE_CACHE.get(base + '/b').content == b'<p>/b</p>'
+
+    # Cached pages aren't downloaded again
+    assert af.fetch_many([base + '/a', base + '/b'])[base + '/b'].content == b'<p>/b</p>'
+    assert len(httpd.requests) == 4
+
+
+def test_requests_per_host_limited(server):
+    httpd, base = server
+    pages = af.fetch_many([f'{base}/busy{n}' for n in range(8)], max_per_host=2)
+    assert all(page.status_code == 200 for page in pages.values())
+    assert len(httpd.requests) == 8
+    assert httpd.maxActive == 2
+
+
+def test_deadline(server, capsys):
+    httpd, base = server
+    start = time.monotonic()
+    pages = af.fetch_many([base + '/slow', base + '/fast'], deadline=0.5)
+    assert time.monotonic() - start < 1.5
+    assert pages[base + '/slow'] is None
+    assert pages[base + '/fast'].content == b'<p>/fast</p>'
+    assert '[Deadline] Skipping 1 urls still downloading' in capsys.readouterr().out
+    # Nothing is cached for the url that ran out of time
+    assert page_cache.PAGE_CACHE.get(base + '/slow') is None
+
+
+def test_connection_errors(server, capsys):
+    httpd, base = server
+    # A port nothing listens on
+    closed = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    deadUrl = f'http://localhost:{closed.server_address[1]}/'
+    closed.server_close()
+    pages = af.fetch_many([deadUrl, base + '/a'])
+    assert pages[deadUrl] is None
+    assert pages[base + '/a'] is not None
+    assert '[Error] Skipping ' + deadUrl in capsys.readouterr().out
+    assert dead_hosts._hosts['localhost']['failures'] == 1
+
+    # Dead hosts aren't requested
+    for _ in range(dead_hosts.DEAD_AFTER_ERRORS):
+        dead_hosts.record_failure(base, 'ConnectionError')
+    assert af.fetch_many([base + '/c']) == {base + '/c': None}
+    assert '/c' not in httpd.requests
@@ -0,0 +1,161 @@
+"""
+Tests of the batch pullers in setup.py: the single-query JSON path against the
+one-query-per-table path, WorkCursor paging and the dtypes of the returned dataframes
+"""
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+import setup as st
+from conftest import SCRIPT_ID
+
+PULLERS = [(st.getBusinessDataBatch, st.URL_TABLE, False, st.URL_BATCH_COLUMNS),
+           (st.getBusWoutEml, st.EMAIL_TABLE, True, st.EMAIL_BATCH_COLUMNS),
+           (st.getBusWoutPhone, st.PHONE_TABLE, True, st.PHONE_BATCH_COLUMNS),
+           (st.getBusWoutAddress, st.ADDRESS_TABLE, True, st.ADDRESS_BATCH_COLUMNS)]
+
+
+def _sorted(df):
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def _expectedFirms(engine, metadata, missingTable, requireUrl):
+    """
+    The candidate firm_ids, newest first, as WorkCursor should return them
+    """
+    tables = dict(zip(st.PULL_TABLES, st.getTables(engine, metadata, st.PULL_TABLES)))
+    candidates = st._candidateQuery(tables, SCRIPT_ID, missingTable, requireUrl).subquery()
+    qry = sa.select(candidates.c.firm_id).order_by(candidates.c.CreatedOn.desc(), candidates.c.firm_id.desc())
+    with engine.connect() as con:
+        return list(con.execute(qry).scalars())
+
+
+def _withoutJson(monkeypatch):
+    monkeypatch.setattr(st, '_JSON_AGGREGATES', {})
+
+
+@pytest.mark.parametrize('puller, missingTable, requireUrl, columns', PULLERS)
+def test_json_path_matches_fallback(db, monkeypatch, puller, missingTable, requireUrl, columns):
+    engine, metadata = db
+    assert engine.dialect.name in st._JSON_AGGREGATES
+    jsonFrames = puller(engine, metadata, SCRIPT_ID, 10)
+    _withoutJson(monkeypatch)
+    plainFrames = puller(engine, metadata, SCRIPT_ID, 10)
+
+    assert list(jsonFrames) == list(columns)
+    assert len(jsonFrames[st.BUSINESS_TABLE]) == min(10, len(_expectedFirms(engine, metadata, missingTable, requireUrl)))
+    for name in columns:
+        assert list(jsonFrames[name].columns) == columns[name]
+        pd.testing.assert_frame_equal(_sorted(jsonFrames[name]), _sorted(plainFrames[name]))
+
+
+@pytest.mark.parametrize('useJson', [True, False])
+@pytest.mark.parametrize('puller, missingTable, requireUrl, columns', PULLERS)
+def test_cursor_visits_every_candidate_once(db, monkeypatch, useJson, puller, missingTable, requireUrl, columns):
+    engine, metadata = db
+    if not useJson:
+        _withoutJson(monkeypatch)
+    expected = _expectedFirms(engine, metadata, missingTable, requireUrl)
+    assert expected
+
+    seen = []
+    with st.WorkCursor(engine, metadata, SCRIPT_ID, missingTable, requireUrl=requireUrl) as cursor:
+        assert cursor.total == len(expected)
+        while True:
+            frames = puller(engine, metadata, SCRIPT_ID, 7, cursor=cursor)
+            firmIds = list(frames[st.BUSINESS_TABLE]['firm_id'])
+            if not firmIds:
+                break
+            assert len(firmIds) <= 7
+            # Data rows only for the firms of the batch
+            for name in columns:
+                assert set(frames[name]['firm_id']) <= set(firmIds)
+            seen += sorted(firmIds, key=expected.index)
+        # Used up: further batches stay empty
+        assert puller(engine, metadata, SCRIPT_ID, 7, cursor=cursor)[st.BUSINESS_TABLE].empty
+    assert seen == expected
+
+
+def test_cursor_pages_match_between_paths(db, monkeypatch):
+    engine, metadata = db
+
+    def pages():
+        result = []
+        with st.WorkCursor(engine, metadata, SCRIPT_ID, st.EMAIL_TABLE) as cursor:
+            while not (frames := st.getBusWoutEml(engine, metadata, SCRIPT_ID, 5, cursor=cursor))[st.BUSINESS_TABLE].empty:
+                result.append({name: _sorted(df) for name, df in frames.items()})
+        return result
+
+    jsonPages = pages()
+    _withoutJson(monkeypatch)
+    plainPages = pages()
+    assert len(jsonPages) == len(plainPages) > 1
+    for jsonPage, plainPage in zip(jsonPages, plainPages):
+        for name in st.EMAIL_BATCH_COLUMNS:
+            pd.testing.assert_frame_equal(jsonPage[name], plainPage[name])
+
+
+@pytest.mark.parametrize('useJson', [True, False])
+def test_batch_dtypes(db, monkeypatch, useJson):
+    engine, metadata = db
+    if not useJson:
+        _withoutJson(monkeypatch)
+    # Firms missing phones, so their emails and urls can be read too
+    frames = st.getBusWoutPhone(engine, metadata, SCRIPT_ID, 50,
+                                columns={st.BUSINESS_TABLE: ['firm_id'],
+                                         st.EMAIL_TABLE: st.EMAIL_BATCH_COLUMNS[st.EMAIL_TABLE],
+                                         st.URL_TABLE: st.URL_BATCH_COLUMNS[st.URL_TABLE]})
+    emails = frames[st.EMAIL_TABLE]
+    urls = frames[st.URL_TABLE]
+    assert str(frames[st.BUSINESS_TABLE]['firm_id'].dtype) == 'Int32'
+    assert {col: str(dtype) for col, dtype in emails.dtypes.items() if col != 'email'} == {
+        'firm_id': 'Int32', 'email_type_id': 'Int32', 'email_status_id': 'Int16', 'address_id': 'Int64'}
+    assert emails['address_id'].max() >= 10 ** 10
+    assert pd.api.types.is_string_dtype(emails['email'])
+    assert str(urls['main'].dtype) == 'boolean'
+    assert set(urls['main']) == {True, False}
+    assert str(urls['url_status_id'].dtype) == 'Int32'
+    # Missing values are pd.NA, and ints stay ints (no float upcast)
+    assert urls['url_status_id'].isna().any()
+    assert urls['url_status_id'].dropna().isin([1, 3]).all()
+
+
+@pytest.mark.parametrize('useJson', [True, False])
+def test_batch_datetimes(db, monkeypatch, useJson):
+    engine, metadata = db
+    if not useJson:
+        _withoutJson(monkeypatch)
+    firms = st.getBusWoutEml(engine, metadata, SCRIPT_ID, 50,
+                             columns={st.BUSINESS_TABLE: ['firm_id', 'CreatedOn']})[st.BUSINESS_TABLE]
+    assert pd.api.types.is_datetime64_any_dtype(firms['CreatedOn'])
+    # Whole seconds and fractions in the same batch
+    assert set(firms['CreatedOn'].dt.microsecond) == {0, 1}
+    assert (firms['CreatedOn'].dt.year == 2024).all()
+
+
+def test_typed_frame_dtypes():
+    table = sa.Table('typed', sa.MetaData(),
+                     sa.Column('flag', sa.Boolean), sa.Column('small', sa.SmallInteger),
+                     sa.Column('regular', sa.Integer), sa.Column('big', sa.BigInteger),
+                     sa.Column('ratio', sa.Float), sa.Column('stamp', sa.DateTime),
+                     sa.Column('day', sa.Date), sa.Column('text', sa.Text))
+    rows = [[True, 1, 2, 3 * 10 ** 12, 0.5, '2024-01-02T03:04:05.000006', '2024-01-02', 'a'],
+            [None, None, None, None, None, None, None, None],
+            [False, -1, -2, -3, 1.0, '2024-01-03T00:00:00', '2024-01-03', '']]
+    df = st._typedFrame(rows, list(table.c))
+
+    assert [str(dtype) for dtype in df.dtypes[:5]] == ['boolean', 'Int16', 'Int32', 'Int64', 'Float64']
+    assert pd.api.types.is_datetime64_any_dtype(df['stamp'])
+    assert pd.api.types.is_datetime64_any_dtype(df['day'])
+    assert pd.api.types.is_string_dtype(df['text'])
+    assert df.loc[0, 'big'] == 3 * 10 ** 12
+    assert df.loc[0, 'stamp'] == pd.Timestamp('2024-01-02 03:04:05.000006')
+    assert df.iloc[1].isna().all()
+    assert df.loc[2, 'stamp'] == pd.Timestamp('2024-01-03')
+
+
+def test_typed_frame_empty():
+    table = sa.Table('typed', sa.MetaData(), sa.Column('firm_id', sa.Integer), sa.Column('url', sa.Text))
+    df = st._typedFrame([], list(table.c))
+    assert df.empty
+    assert list(df.columns) == ['firm_id', 'url']
+    assert str(df['firm_id'].dtype) == 'Int32'
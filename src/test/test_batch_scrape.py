@@ -0,0 +1,116 @@
+"""
+Tests of scrape_batch and the batch scrapers built on it, with the pages already in the page cache
+"""
+import time
+import pandas as pd
+import pytest
+import dead_hosts
+import page_cache
+from batch_scrape import scrape_batch
+from scraping.BussWithNoEml import emlScrape, EMAILS_PER_FIRM
+
+EMAIL_COLUMNS = ['firm_id', 'email', 'email_type_id', 'email_status_id', 'address_id']
+
+
+def _cachePages(pages):
+    for url, body in pages.items():
+        page_cache.PAGE_CACHE.put(page_cache.CachedPage(url, 200, {'Content-Type': 'text/html'}, body.encode('utf-8')))
+
+
+def _urlDf(count):
+    urls = [f'http://firm{n}.com/' for n in range(count)]
+    _cachePages({url: '<p>firm</p>' for url in urls})
+    return pd.DataFrame({'firm_id': list(range(100, 100 + count)), 'url': urls})
+
+
+def _mailto(*emails):
+    return '<html><body>' + ''.join(f'<a href="mailto:{email}">{email}</a>' for email in emails) + '</body></html>'
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_email_limit_is_per_firm_before_dedup(workers):
+    """
+    Both firms list the shared address first. The second firm stops at EMAILS_PER_FIRM new emails,
+    one of which the first firm already has, so it keeps fewer than EMAILS_PER_FIRM
+    """
+    assert EMAILS_PER_FIRM == 2
+    _cachePages({'http://a.com': _mailto('shared@group.com', 'a1@a.com', 'a2@a.com'),
+                 'http://b.com': _mailto('shared@group.com', 'b1@b.com', 'b2@b.com'),
+                 'http://c.com': _mailto('known@c.com', 'c1@c.com', 'c2@c.com', 'c3@c.com')})
+    urlDf = pd.DataFrame({'firm_id': [1, 2, 3], 'url': ['http://a.com', 'http://b.com', 'http://c.com']})
+    emlDf = pd.DataFrame([[3, 'known@c.com', 1, 1, None]], columns=EMAIL_COLUMNS)
+
+    result = emlScrape(urlDf, emlDf, workers=workers)
+    assert list(zip(result['firm_id'], result['email'])) == [
+        (3, 'known@c.com'),
+        (1, 'shared@group.com'), (1, 'a1@a.com'),
+        (2, 'b1@b.com'),
+        # Emails known before the batch don't count towards the limit
+        (3, 'c1@c.com'), (3, 'c2@c.com')]
+
+
+def _slowExtractor(firm_id, url):
+    # Later firms finish first when run in parallel
+    time.sleep(0.002 * (120 - firm_id))
+    if firm_id % 7 == 3:
+        raise ValueError('broken page')
+    if firm_id % 5 == 0:
+        return None
+    return [f'{firm_id}@{url[7:-1]}']
+
+
+def test_serial_and_parallel_match(capsys):
+    urlDf = _urlDf(20)
+    serial = scrape_batch(urlDf, _slowExtractor, workers=1)
+    serialOutput = capsys.readouterr().out
+    parallel = scrape_batch(urlDf, _slowExtractor, workers=6)
+    parallelOutput = capsys.readouterr().out
+
+    assert serial == parallel
+    assert [firm_id for firm_id, _ in serial] == list(urlDf['firm_id'])
+    assert serial[2] == (102, ['102@firm2.com'])
+    # Failed firms are skipped with a message, in both modes
+    assert serial[1] == (101, None) and serial[10] == (110, None)
+    assert serialOutput.count('[Error] Skipping') == parallelOutput.count('[Error] Skipping') == 3
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_unfetched_pages_not_scraped(workers):
+    urlDf = _urlDf(3)
+    for _ in range(dead_hosts.DEAD_AFTER_ERRORS):
+        dead_hosts.record_failure('http://dead.com/', 'ConnectionError')
+    urlDf.loc[1, 'url'] = 'http://dead.com/'
+    calls = []
+
+    def extractor(firm_id, url):
+        calls.append(firm_id)
+        return [url]
+    assert scrape_batch(urlDf, extractor, workers=workers) == [
+        (100, ['http://firm0.com/']), (101, None), (102, ['http://firm2.com/'])]
+    assert sorted(calls) == [100, 102]
+
+
+def test_deadline_serial(capsys):
+    urlDf = _urlDf(6)
+
+    def extractor(firm_id, url):
+        time.sleep(0.3)
+        return [firm_id]
+    # Firms start at 0, 0.3 and 0.6 seconds, the fourth would start after the deadline
+    results = scrape_batch(urlDf, extractor, workers=1, deadline=0.75)
+    assert results == [(100, [100]), (101, [101]), (102, [102]), (103, None), (104, None), (105, None)]
+    assert '[Deadline] Skipping 3 remaining firms' in capsys.readouterr().out
+
+
+def test_deadline_parallel(capsys):
+    urlDf = _urlDf(6)
+
+    def extractor(firm_id, url):
+        time.sleep(1.5 if firm_id in (101, 104) else 0.01)
+        return [firm_id]
+    start = time.monotonic()
+    results = scrape_batch(urlDf, extractor, workers=6, deadline=0.5)
+    # The batch doesn't wait for the slow firms
+    assert time.monotonic() - start < 1.2
+    assert results == [(100, [100]), (101, None), (102, [102]), (103, [103]), (104, None), (105, [105])]
+    assert '[Deadline] Skipping 2 firms still running' in capsys.readouterr().out
@@ -0,0 +1,93 @@
+"""
+Tests of the page body limits shared by the synchronous and async fetchers: only html content types
+are read, and reading stops at the size cap
+"""
+import asyncio
+import pytest
+import async_fetcher as af
+import http_session as hs
+
+
+class FakeResponse:
+    """
+    Stands in for a streamed requests.Response and an aiohttp response: records how many bytes of
+    the body were read
+    """
+    def __init__(self, body, contentType='text/html; charset=utf-8', chunkSize=1000):
+        self.headers = {'Content-Type': contentType} if contentType is not None else {}
+        self.body = body
+        self.chunkSize = chunkSize
+        self.read = 0
+        self.content = self
+
+    def _chunks(self):
+        for start in range(0, len(self.body), self.chunkSize):
+            chunk = self.body[start:start + self.chunkSize]
+            self.read += len(chunk)
+            yield chunk
+
+    def iter_content(self, chunk_size=None):
+        return self._chunks()
+
+    async def _iter_chunked(self):
+        for chunk in self._chunks():
+            yield chunk
+
+    def iter_chunked(self, size):
+        return self._iter_chunked()
+
+
+def _readSync(response, maxBytes):
+    return hs.read_capped(response, max_bytes=maxBytes)
+
+
+def _readAsync(response, maxBytes):
+    return asyncio.run(af._read_capped(response, max_bytes=maxBytes))
+
+
+@pytest.mark.parametrize('contentType, allowed', [
+    ('text/html', True),
+    ('text/html; charset=utf-8', True),
+    ('TEXT/HTML ;charset=utf-8', True),
+    ('application/xhtml+xml', True),
+    (None, True),
+    ('', True),
+    ('application/pdf', False),
+    ('image/png', False),
+    ('application/json', False),
+    ('text/plain', False),
+    ('text/htmlx', False),
+])
+def test_is_allowed_content_type(contentType, allowed):
+    assert hs.is_allowed_content_type(contentType) is allowed
+
+
+@pytest.mark.parametrize('read', [_readSync, _readAsync])
+def test_body_under_cap_read_whole(read):
+    response = FakeResponse(b'<p>' + b'x' * 4000 + b'</p>')
+    assert read(response, 10000) == (response.body, False)
+
+
+@pytest.mark.parametrize('read', [_readSync, _readAsync])
+@pytest.mark.parametrize('size', [2500, 3000, 3001])
+def test_body_cut_at_cap(read, size):
+    response = FakeResponse(b'x' * size)
+    body, truncated = read(response, 2500)
+    assert body == b'x' * 2500
+    # A body that fills the cap exactly can't be told apart from a longer one
+    assert truncated
+    # Reading stops at the chunk that reaches the cap
+    assert response.read == min(size, 3000)
+
+
+@pytest.mark.parametrize('read', [_readSync, _readAsync])
+def test_binary_body_not_read(read):
+    response = FakeResponse(b'%PDF' * 10000, contentType='application/pdf')
+    assert read(response, 10000) == (b'', False)
+    assert response.read == 0
+
+
+@pytest.mark.parametrize('read', [_readSync, _readAsync])
+def test_body_without_content_type_read(read):
+    response = FakeResponse(b'<p>a</p>', contentType=None)
+    assert read(response, 10000) == (b'<p>a</p>', False)
@@ -0,0 +1,89 @@
+"""
+Tests of commitBatch: a batch's generated rows, processed firms and progress counter are saved
+together or not at all, and saving the same batch again doesn't duplicate it
+"""
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+import setup as st
+from conftest import SCRIPT_ID, TEST_SCHEMA
+
+ACTIVITY_ID = 2
+GENERATED_TABLE = 'mnsu_generated_firm_email'
+
+
+def _startActivity(engine, metadata):
+    activities = st.getTable(engine, metadata, st.SCRIPT_ACTIVITY_TABLE)
+    with engine.begin() as con:
+        con.execute(sa.insert(activities).values(mnsu_script_activity_id=ACTIVITY_ID, mnsu_script_id=SCRIPT_ID))
+
+
+def _writeEmails(emails):
+    generated = pd.DataFrame({'firm_id': list(emails), 'email': list(emails.values()),
+                              'mnsu_script_activity_id': ACTIVITY_ID, 'confidence_level': 1})
+    return lambda con: st.writeFrame(con, generated, GENERATED_TABLE, schema=TEST_SCHEMA)
+
+
+def _saved(engine, metadata):
+    """
+    Returns the generated (firm_id, email) rows, the processed firm_ids and the progress counter
+    of the activity
+    """
+    generated, processed, activities = st.getTables(engine, metadata, [GENERATED_TABLE, st.PROCESSED_TABLE,
+                                                                       st.SCRIPT_ACTIVITY_TABLE])
+    with engine.connect() as con:
+        emails = con.execute(sa.select(generated.c.firm_id, generated.c.email).where(
+            generated.c.mnsu_script_activity_id == ACTIVITY_ID).order_by(generated.c.firm_id)).all()
+        firmIds = con.execute(sa.select(processed.c.firm_id).where(
+            processed.c.mnsu_script_activity_id == ACTIVITY_ID).order_by(processed.c.firm_id)).scalars().all()
+        count = con.execute(sa.select(activities.c[st.PROGRESS_COLUMN]).where(
+            activities.c.mnsu_script_activity_id == ACTIVITY_ID)).scalar()
+    return [tuple(row) for row in emails], firmIds, count
+
+
+def test_same_batch_saved_once(db):
+    engine, metadata = db
+    _startActivity(engine, metadata)
+    firms = pd.DataFrame({'firm_id': [3, 4, 5]})
+    st.commitBatch(engine, metadata, SCRIPT_ID, ACTIVITY_ID, firms, GENERATED_TABLE,
+                   _writeEmails({3: 'a@f3.com', 5: 'a@f5.com'}))
+    expected = ([(3, 'a@f3.com'), (5, 'a@f5.com')], [3, 4, 5], 3)
+    assert _saved(engine, metadata) == expected
+
+    # A retry of the batch replaces what the first attempt saved
+    st.commitBatch(engine, metadata, SCRIPT_ID, ACTIVITY_ID, firms, GENERATED_TABLE,
+                   _writeEmails({3: 'a@f3.com', 5: 'a@f5.com'}))
+    assert _saved(engine, metadata) == expected
+
+    # The next batch adds to the counter
+    st.commitBatch(engine, metadata, SCRIPT_ID, ACTIVITY_ID, pd.DataFrame({'firm_id': [6]}), GENERATED_TABLE,
+                   _writeEmails({6: 'a@f6.com'}))
+    assert _saved(engine, metadata) == ([(3, 'a@f3.com'), (5, 'a@f5.com'), (6, 'a@f6.com')], [3, 4, 5, 6], 4)
+
+
+def test_failed_batch_leaves_database_unchanged(db):
+    engine, metadata = db
+    _startActivity(engine, metadata)
+    st.commitBatch(engine, metadata, SCRIPT_ID, ACTIVITY_ID, pd.DataFrame({'firm_id': [3]}), GENERATED_TABLE,
+                   _writeEmails({3: 'a@f3.com'}))
+    before = _saved(engine, metadata)
+
+    def failingWrite(con):
+        _writeEmails({3: 'b@f3.com', 7: 'a@f7.com'})(con)
+        raise RuntimeError('write failed')
+    # Same firm as the saved batch, so its rows were deleted before the failure
+    with pytest.raises(RuntimeError, match='write failed'):
+        st.commitBatch(engine, metadata, SCRIPT_ID, ACTIVITY_ID, pd.DataFrame({'firm_id': [3, 7]}),
+                       GENERATED_TABLE, failingWrite)
+    assert _saved(engine, metadata) == before == ([(3, 'a@f3.com')], [3], 1)
+
+
+def test_missing_progress_column_fails_at_startup(db):
+    engine, metadata = db
+    with engine.begin() as con:
+        con.execute(sa.text(f'ALTER TABLE {TEST_SCHEMA}.{st.SCRIPT_ACTIVITY_TABLE} DROP COLUMN {st.PROGRESS_COLUMN}'))
+    st._schemaRegistry.clear()
+    with pytest.raises(RuntimeError, match=st.PROGRESS_COLUMN):
+        st.WorkCursor(engine, metadata, SCRIPT_ID, st.EMAIL_TABLE)
+    with pytest.raises(RuntimeError, match=st.PROGRESS_COLUMN):
+        st.commitBatch(engine, metadata, SCRIPT_ID, ACTIVITY_ID, pd.DataFrame({'firm_id': [3]}))
@@ -0,0 +1,78 @@
+"""
+Tests of the dead-host negative cache: hosts are only skipped after several failures in a row,
+timeouts count less than connection errors, and a success forgets the host
+"""
+import json
+import time
+import pytest
+import dead_hosts as dh
+
+URL = 'http://www.acme.com/contact'
+
+
+@pytest.mark.parametrize('failures, timeouts, backoff', [
+    (0, 0, 0),
+    (1, 0, 0),
+    (dh.DEAD_AFTER_ERRORS - 1, dh.DEAD_AFTER_TIMEOUTS - 1, 0),
+    (dh.DEAD_AFTER_ERRORS, 0, dh.BASE_BACKOFF),
+    (dh.DEAD_AFTER_ERRORS + 1, 0, 2 * dh.BASE_BACKOFF),
+    (dh.DEAD_AFTER_ERRORS + 3, 0, 8 * dh.BASE_BACKOFF),
+    (0, dh.DEAD_AFTER_TIMEOUTS, dh.BASE_BACKOFF),
+    (dh.DEAD_AFTER_ERRORS - 1, dh.DEAD_AFTER_TIMEOUTS + 1, 2 * dh.BASE_BACKOFF),
+    (dh.DEAD_AFTER_ERRORS + 40, 0, dh.MAX_BACKOFF),
+])
+def test_backoff_schedule(failures, timeouts, backoff):
+    assert dh.backoff_for(failures, timeouts) == backoff
+
+
+def test_host_skipped_after_errors_in_a_row():
+    for _ in range(dh.DEAD_AFTER_ERRORS - 1):
+        dh.record_failure(URL, 'ConnectionError')
+        assert not dh.is_dead(URL)
+    dh.record_failure(URL, 'ConnectionError')
+    assert dh.is_dead(URL)
+    # Same host, any path or scheme; other hosts are unaffected
+    assert dh.is_dead('https://www.acme.com/')
+    assert not dh.is_dead('http://acme.com/')
+    entry = dh._hosts['www.acme.com']
+    assert entry['next_retry'] == pytest.approx(time.time() + dh.BASE_BACKOFF, abs=5)
+
+
+def test_timeouts_count_less_than_errors():
+    for _ in range(dh.DEAD_AFTER_TIMEOUTS - 1):
+        dh.record_failure(URL, 'ReadTimeout', timeout=True)
+    assert not dh.is_dead(URL)
+    dh.record_failure(URL, 'ReadTimeout', timeout=True)
+    assert dh.is_dead(URL)
+    assert dh.dead_host_stats() == {'hosts': 1, 'skipped': 1}
+
+
+def test_record_success_clears_the_host():
+    for _ in range(dh.DEAD_AFTER_ERRORS):
+        dh.record_failure(URL, 'ConnectionError')
+    assert dh.is_dead(URL)
+    dh.record_success(URL)
+    assert not dh.is_dead(URL)
+    assert 'www.acme.com' not in dh._hosts
+    # The count starts again from zero
+    dh.record_failure(URL, 'ConnectionError')
+    assert not dh.is_dead(URL)
+    assert dh._hosts['www.acme.com']['failures'] == 1
+
+
+def test_saved_across_runs(monkeypatch):
+    for _ in range(dh.DEAD_AFTER_ERRORS):
+        dh.record_failure(URL, 'ConnectionError')
+    dh.save_dead_hosts()
+    with open(dh.DEAD_HOSTS_FILE) as f:
+        assert json.load(f)['www.acme.com']['failures'] == dh.DEAD_AFTER_ERRORS
+    # A new run loads the file on first use
+    monkeypatch.setattr(dh, '_hosts', None)
+    assert dh.is_dead(URL)
+
+
+def test_urls_without_host_are_ignored():
+    dh.record_failure(None, 'ConnectionError')
+    dh.record_failure('not a url', 'ConnectionError')
+    assert not dh.is_dead(None)
+    assert dh._hosts == {}
@@ -0,0 +1,138 @@
+"""
+Tests of the column-wise cleaners in elis_functions: each *_series function must give the same
+values as its scalar version called on every element, and keep the index of its input
+"""
+import io
+import random
+import string
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+import pytest
+import elis_functions as ef
+
+SAMPLES = 3000
+
+
+def _randomText(rnd, alphabet, maxLength):
+    return ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, maxLength)))
+
+
+def _zipcodes(rnd):
+    values = ['56001', '56001-1234', '5601', '560011234', '0560011234567', 'K1A 0B1', 'k1a0b1', 'M5V-3L9',
+              ' 99501 ', '1234-123', '', None, np.nan, 56001, 2134.0, 'N/A']
+    values += [_randomText(rnd, string.digits + '- ' + 'ABCKLMx', 12) for _ in range(SAMPLES)]
+    return values
+
+
+def _states(rnd, count):
+    states = list(ef.zipValidation) + ['mn', 'Tx', 'XX', '', None, 5]
+    return [rnd.choice(states) for _ in range(count)]
+
+
+def _urls(rnd):
+    hosts = ['acme.com', 'www.acme.com', 'shop.acme.co.uk', 'facebook.com', 'acme.om', 'acme.xyz',
+             'acme.zz', 'localhost', '192.168.0.1', 'acme', 'blog.wordpress.com', 'acme.com.']
+    values = ['', 'http://', 'www.', 'ACME.COM', 'http://acme.com:8080/a', 'acme;com', 'acme,com',
+              'mailto:a@acme.com', 'http://www.acme.com/http']
+    for _ in range(SAMPLES):
+        url = rnd.choice(['', 'http://', 'https://', 'HTTP://']) + rnd.choice(hosts)
+        url += rnd.choice(['', '/', '/contact', '/a;b', '?q=1,2', ':80'])
+        values.append(url.upper() if rnd.random() < 0.1 else url)
+    return values
+
+
+def _names(rnd):
+    values = ['', 'A&B', 'Acme  Plumbing, Inc.', "Bob's  &  Sons", '  lead and trail  ', '123 Main', 'Café Olé']
+    values += [_randomText(rnd, string.ascii_letters + string.digits + " &.,'-é", 30) for _ in range(SAMPLES)]
+    return values
+
+
+def _emails(rnd):
+    values = ['', None, 5, 'a@b.com', ' A@Acme.COM ', 'no-at', '@acme.com', 'a@', 'a..b@acme.com',
+              '"quoted"@acme.com', '(comment)a@acme.com', 'a(comment)@acme.com', 'a@acmecom', 'a@acme.om',
+              'a@acme.zz', 'a@[1.2.3.4]', 'x' * 65 + '@acme.com', 'a@b.c', 'ü@acme.com', 'a@b@acme.com']
+    local = string.ascii_lowercase + string.digits + '._+-"()\\ '
+    domain = string.ascii_lowercase + '.-;'
+    for _ in range(SAMPLES):
+        values.append(_randomText(rnd, local, 10) + rnd.choice(['@', '@', '']) + _randomText(rnd, domain, 8)
+                      + rnd.choice(['.com', '.org', 'com', '.zz', '.om', '']))
+    return values
+
+
+def _series(values, rnd):
+    # Shuffled, duplicate index labels, to check the index is kept as is
+    index = [rnd.randint(0, len(values) // 2) for _ in values]
+    return pd.Series(values, index=index, dtype=object)
+
+
+@pytest.mark.parametrize('country', ['USA', 'CAN', 'MEX'])
+def test_clean_zip_series(country):
+    rnd = random.Random(1)
+    zipcodes = _series(_zipcodes(rnd), rnd)
+    result = ef.cleanZip_series(zipcodes, country)
+    assert list(result.index) == list(zipcodes.index)
+    assert list(result) == [ef.cleanZip(zipcode, country) for zipcode in zipcodes]
+
+
+def test_cheap_validate_us_zip_series():
+    rnd = random.Random(2)
+    zipcodes = [ef.cleanZip(zipcode) for zipcode in _zipcodes(rnd)] + [None, 56001]
+    zipcodes = _series(zipcodes, rnd)
+    states = _states(rnd, len(zipcodes))
+    result = ef.cheapValidateUSZip_series(zipcodes, states)
+    assert list(result.index) == list(zipcodes.index)
+    assert result.dtype == bool
+    assert list(result) == [bool(ef.cheapValidateUSZip(zipcode, state)) for zipcode, state in zip(zipcodes, states)]
+    # One state for the whole column
+    assert list(ef.cheapValidateUSZip_series(zipcodes, 'mn')) == \
+        [bool(ef.cheapValidateUSZip(zipcode, 'mn')) for zipcode in zipcodes]
+
+
+def test_get_domain_series():
+    rnd = random.Random(3)
+    urls = _series(_urls(rnd), rnd)
+    result = ef.getDomain_series(urls)
+    assert list(result.index) == list(urls.index)
+    assert list(result) == [ef.getDomain(url) for url in urls]
+    # getDomain() can't take values that aren't strings, the column-wise version gives them ''
+    assert list(ef.getDomain_series([None, np.nan, 5, 'acme.com'])) == ['', '', '', 'acme.com']
+
+
+def test_standardize_name_series():
+    rnd = random.Random(4)
+    names = _series(_names(rnd), rnd)
+    result = ef.standardizeName_series(names)
+    assert list(result.index) == list(names.index)
+    assert list(result) == [ef.standardizeName(name) for name in names]
+
+
+def test_clean_email_series():
+    rnd = random.Random(5)
+    emails = _series(_emails(rnd), rnd)
+    with redirect_stdout(io.StringIO()):
+        expected = [ef.cleanEmail(email) for email in emails]
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = ef.cleanEmail_series(emails)
+    assert output.getvalue() == ''
+    assert list(result.index) == list(emails.index)
+    assert list(result) == expected
+
+
+def test_validate_emails_reasons():
+    rnd = random.Random(6)
+    emails = _emails(rnd)
+    cleaned, reasons = ef.validateEmails(emails)
+    assert [ef._cleanEmailWithReason(email) for email in emails] == list(zip(cleaned, reasons))
+    histogram = ef.emailRejectionHistogram(reasons)
+    assert sum(histogram.values()) == int((reasons != ef.EMAIL_OK).sum())
+    assert histogram[ef.emailReasons[ef.EMAIL_NOT_STRING]] == 2
+
+
+def test_series_accept_arrays():
+    values = np.array(['56001-1234', '5601'], dtype=object)
+    result = ef.cleanZip_series(values)
+    assert isinstance(result, pd.Series)
+    assert list(result.index) == [0, 1]
+    assert list(result) == ['56001', '05601']
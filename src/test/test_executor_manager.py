@@ -0,0 +1,85 @@
+"""
+Tests of the shared thread pool in executor_manager: map_bounded keeps the order of its arguments,
+and submitting blocks once max_workers + max_queue tasks are waiting or running
+"""
+import threading
+import time
+import pytest
+import executor_manager as em
+
+
+@pytest.fixture
+def smallPool():
+    em.shutdown_executor()
+    em.start_executor(max_workers=2, max_queue=1)
+    yield
+    em.shutdown_executor()
+
+
+def _waitFor(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.01)
+
+
+def test_map_bounded_keeps_order(smallPool):
+    def slowSquare(n):
+        time.sleep(0.01 * (5 - n))
+        return n * n
+    assert em.map_bounded(slowSquare, range(5)) == [0, 1, 4, 9, 16]
+    assert em.map_bounded(pow, [2, 3], [3, 2]) == [8, 9]
+
+
+def test_map_bounded_backpressure(smallPool):
+    release = threading.Event()
+    results = []
+    submitted = []
+    completed = em.executor_stats()['completed']
+
+    def task(n):
+        release.wait(5)
+        return n
+
+    def arguments():
+        for n in range(6):
+            submitted.append(n)
+            yield n
+    mapper = threading.Thread(target=lambda: results.extend(em.map_bounded(task, arguments())))
+    mapper.start()
+    _waitFor(lambda: (em.executor_stats()['active'], em.executor_stats()['queued']) == (2, 1))
+    time.sleep(0.1)
+    # Two tasks running, one waiting, and the fourth submit is blocked
+    stats = em.executor_stats()
+    assert (stats['active'], stats['queued']) == (2, 1)
+    assert len(submitted) == 4
+
+    release.set()
+    mapper.join(5)
+    assert results == list(range(6))
+    stats = em.executor_stats()
+    assert (stats['active'], stats['queued'], stats['completed'] - completed) == (0, 0, 6)
+
+
+def test_failed_task_frees_its_slot(smallPool):
+    def failOnOdd(n):
+        if n % 2:
+            raise ValueError(n)
+        return n
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            em.map_bounded(failOnOdd, range(4))
+    # Every slot was given back
+    assert em.map_bounded(failOnOdd, [0, 2, 4, 6]) == [0, 2, 4, 6]
+    assert em.executor_stats()['active'] == 0
+
+
+def test_start_and_shutdown(smallPool):
+    executor = em.get_executor()
+    assert em.start_executor(max_workers=5) is executor
+    assert em.executor_stats()['max_workers'] == 2
+    em.shutdown_executor()
+    assert not em.executor_stats()['running']
+    # The next submit starts a new pool
+    assert em.submit(abs, -3).result() == 3
+    assert em.get_executor() is not executor
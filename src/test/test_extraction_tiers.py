@@ -0,0 +1,51 @@
+"""
+Tests of the extraction tiers in data_extraction: structured data first, then the page bytes, and a
+tier that yields nothing usable falls through to the next one
+"""
+import json
+import data_extraction as de
+import page_cache
+
+URL = 'http://www.acme.com/'
+
+
+def _cachePage(body):
+    page_cache.PAGE_CACHE.put(page_cache.CachedPage(URL, 200, {'Content-Type': 'text/html'}, body.encode('utf-8')))
+
+
+def _page(structured, text):
+    return ('<html><head><script type="application/ld+json">{}</script></head>'
+            '<body>{}</body></html>').format(json.dumps(dict(structured, **{'@type': 'LocalBusiness'})), text)
+
+
+def test_structured_data_used_first():
+    _cachePage(_page({'email': 'sales@acme.com', 'telephone': '(507) 555-0100'},
+                     '<a href="mailto:info@acme.com">Mail</a> Call 507-555-0199'))
+    assert de.extract_email_data(1, URL) == ['sales@acme.com']
+    assert de.extract_phone_data(1, URL) == ['5075550100']
+
+
+def test_invalid_structured_email_falls_through():
+    _cachePage(_page({'email': 'info [at] acme'}, '<a href="mailto:info@acme.com">Mail</a>'))
+    assert de.extract_email_data(1, URL) == ['info@acme.com']
+
+
+def test_placeholder_structured_phone_falls_through():
+    _cachePage(_page({'telephone': ['call us', '555-0100']}, '<p>Call 507-555-0199</p>'))
+    assert de.extract_phone_data(1, URL) == ['5075550199']
+
+
+def test_known_structured_values_fall_through():
+    _cachePage(_page({'email': 'sales@acme.com', 'telephone': '507-555-0100'},
+                     '<a href="mailto:info@acme.com">Mail</a> <p>Call 507-555-0199</p>'))
+    assert de.extract_email_data(1, URL, known={'sales@acme.com'}) == ['info@acme.com']
+    assert de.extract_phone_data(1, URL, known={'5075550100'}) == ['5075550199']
+    # Nothing new anywhere
+    assert de.extract_email_data(1, URL, known={'sales@acme.com', 'info@acme.com'}) is None
+
+
+def test_limit_stops_early():
+    _cachePage('<a href="mailto:a@acme.com">a</a><a href="mailto:b@acme.com">b</a>'
+               '<a href="mailto:a@acme.com">a</a><a href="mailto:c@acme.com?subject=hi">c</a>')
+    assert de.extract_email_data(1, URL) == ['a@acme.com', 'b@acme.com', 'c@acme.com']
+    assert de.extract_email_data(1, URL, limit=2) == ['a@acme.com', 'b@acme.com']
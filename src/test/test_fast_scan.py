@@ -0,0 +1,74 @@
+"""
+Tests of the DOM-free scanners in fast_scan against the extraction they replaced: BeautifulSoup with
+html.parser, mailto: hrefs of every <a> tag and every text node matching the phone regex
+"""
+import re
+import pytest
+from bs4 import BeautifulSoup
+import data_extraction as de
+import fast_scan as fs
+
+PAGES = [
+    '<html><body><a href="mailto:info@acme.com">Mail</a><p>Call (507) 555-0100</p></body></html>',
+    # Attribute quoting, other attributes first, entities and query strings
+    '<a class="mail" href=\'mailto:sales@acme.com?subject=Hi\'>x</a><a href=mailto:a.b@acme.co.uk>y</a>'
+    '<A HREF="mailto:info&#64;acme.com">z</A><a title="t" href = "mailto:help@acme.com" >h</a>',
+    # Links that aren't mailto:, broken addresses and duplicates
+    '<a href="/contact">c</a><a href="mailto:">e</a><a href="mailto:nobody">n</a>'
+    '<a href="mailto:info@acme.com">1</a><a href="mailto:info@acme.com">2</a><a name="top">t</a>',
+    # Phone numbers in many shapes, with entities and nested tags
+    '<div><span>+1 507.555.0101</span><b>Fax:</b> 507-555-0102<br>Toll free 1 (800) 555 0103</div>'
+    '<p>Office&nbsp;507 555 0104</p><td>5075550105</td><p>Order #12345678901234</p>',
+    # Numbers that are too short or too long, and text that only looks like one
+    '<p>Call 555-0100 or 12-507-555-0100</p><p>Dial 507-555-01000</p><p>2024-05-06</p>',
+    '<html><head><title>Acme 507-555-0106</title></head><body><ul><li>a</li><li>507-555-0107</li></ul></body></html>',
+    '',
+]
+
+
+def _oldEmails(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    emails = []
+    for tag in soup.find_all('a'):
+        email = tag.get('href')
+        if email and 'mailto:' in email:
+            match = de.EMAIL_REGEX.search(email[7:].split('?')[0])
+            if match and match.group(0) not in emails:
+                emails.append(match.group(0))
+    return emails
+
+
+def _oldPhones(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    phones = []
+    for tag in soup.find_all(string=de.PHONE_REGEX):
+        number = re.sub(r'[^\d]', '', tag.string)
+        if (len(number) == 10 or (len(number) == 11 and number.startswith('1'))) and number not in phones:
+            phones.append(number)
+    return phones
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_mailto_links_match_dom_extraction(page):
+    content = page.encode('utf-8')
+    assert list(de._iter_emails(link[7:] for link in fs.iter_mailto_links(content))) == _oldEmails(content)
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_phone_texts_match_dom_extraction(page):
+    content = page.encode('utf-8')
+    assert list(de._iter_phone_numbers(fs.iter_phone_texts(content))) == _oldPhones(content)
+
+
+def test_script_style_and_comments_skipped():
+    page = (b'<script>var phone = "507-555-0199"; var a = \'<a href="mailto:js@acme.com">\';</script>'
+            b'<style>.x:after{content:"507-555-0198"}</style><!-- <a href="mailto:old@acme.com">507-555-0197</a> -->'
+            b'<p>507-555-0100</p><a href="mailto:info@acme.com">m</a>')
+    assert list(fs.iter_mailto_links(page)) == ['mailto:info@acme.com']
+    assert list(fs.iter_phone_texts(page)) == ['507-555-0100']
+
+
+def test_str_and_empty_content():
+    assert list(fs.iter_mailto_links('<a href="mailto:é@acme.com">m</a>')) == ['mailto:é@acme.com']
+    assert list(fs.iter_mailto_links(None)) == []
+    assert list(fs.iter_phone_texts(b'')) == []
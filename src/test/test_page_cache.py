@@ -0,0 +1,37 @@
+"""
+Tests of the page cache: the disk tier is only created when a page is written, and is kept under
+its byte limit by evicting the least recently used pages
+"""
+import os
+import page_cache as pc
+
+
+def _page(url, size):
+    return pc.CachedPage(url, 200, {'Content-Type': 'text/html'}, b'x' * size)
+
+
+def test_cache_dir_created_on_first_put(tmp_path):
+    cacheDir = tmp_path / 'pages'
+    cache = pc.PageCache(cache_dir=str(cacheDir))
+    assert cache.get('http://a.com') is None
+    assert not cacheDir.exists()
+
+    cache.put(_page('http://a.com', 10))
+    assert cacheDir.is_dir()
+    cache.clear()
+    assert cache.get('http://a.com').content == b'x' * 10
+
+
+def test_disk_tier_capped_by_bytes(tmp_path):
+    cache = pc.PageCache(cache_dir=str(tmp_path), disk_max_bytes=50 * 1000)
+    for n in range(40):
+        cache.put(_page(f'http://a.com/{n}', 5000))
+        # Page 0 is read back on every write, so it stays the most recently used
+        cache.clear()
+        assert cache.get('http://a.com/0') is not None
+
+    sizes = [entry.stat().st_size for entry in os.scandir(tmp_path)]
+    assert sum(sizes) <= 50 * 1000 + 50 * 1000 // pc.DISK_PRUNE_FRACTION + max(sizes)
+    cache.clear()
+    assert cache.get('http://a.com/1') is None
+    assert cache.get('http://a.com/39') is not None
@@ -0,0 +1,67 @@
+"""
+Tests of the single-pass page feature extractor and the contains_* predicates that share it
+"""
+from bs4 import BeautifulSoup
+import page_features as pf
+import data_extraction as de
+
+PAGE = ('<html><body><a href="/Contact-Us">Contact</a><a>no href</a>'
+        '<a href="https://facebook.com/acme">fb</a><p>Acme Plumbing &amp; Heating</p>'
+        '<p>Call (507) 555-1234 today</p><!-- 55401 -->'
+        '<footer>&copy; Acme Plumbing, Mankato MN 56001</footer>'
+        '<a href="mailto:info@acme.com">Mail us</a></body></html>')
+
+
+def test_extract_page_features():
+    features = pf.extract_page_features(BeautifulSoup(PAGE, 'html.parser'))
+    assert features.links == ['/Contact-Us', None, 'https://facebook.com/acme', 'mailto:info@acme.com']
+    assert features.links_lower[0] == '/contact-us'
+    assert features.last_link == 'mailto:info@acme.com'
+    assert features.mailto_links == ['mailto:info@acme.com']
+    assert features.phone_texts == ['Call (507) 555-1234 today']
+    assert features.footer_text == '© Acme Plumbing, Mankato MN 56001'
+    # Comments are text nodes but not part of the page text
+    assert features.zip_codes == {'56001'}
+    assert '55401' not in features.text
+    assert {'acme', 'plumbing', 'heating', 'mankato'} <= features.tokens
+    assert features.footer_tokens == {'acme', 'plumbing', 'mankato', 'mn', '56001'}
+
+
+def test_zip_codes_fall_back_to_footer():
+    # The footer text runs into the word before it in the page text, but not when read on its own
+    soup = BeautifulSoup('<p>Zip:</p><footer>56001</footer><p>x</p>', 'html.parser')
+    assert soup.text == 'Zip:56001x'
+    assert pf.get_page_features(soup).zip_codes == {'56001'}
+
+
+def test_features_built_once_per_page(monkeypatch):
+    calls = []
+    original = pf.extract_page_features
+
+    def countCalls(html):
+        calls.append(html)
+        return original(html)
+    monkeypatch.setattr(pf, 'extract_page_features', countCalls)
+    soup = BeautifulSoup(PAGE, 'html.parser')
+
+    assert de.contains_contacts_page(soup)
+    assert de.contains_social_media_links(soup)
+    assert not de.contains_reviews_page(soup)
+    assert de.contains_business_name(soup, 'Acme Plumbing Inc')
+    assert de.contains_business_name_in_copyright(soup, 'Acme Plumbing')
+    assert de.contains_zipCode(soup, '56001.0')
+    assert de.contains_phone_number(soup, '5075551234.0') is False     # text node longer than 15 characters
+    assert de.contains_email(soup, 'info@acme.com')
+    assert len(calls) == 1
+    # A PageFeatures is returned as is
+    features = pf.get_page_features(soup)
+    assert pf.get_page_features(features) is features
+    assert pf.get_page_features(None) is None
+
+
+def test_contains_word_matches_part_of_a_word():
+    features = pf.get_page_features(BeautifulSoup('<p>Plumbing</p><p>Heating</p>', 'html.parser'))
+    assert features.contains_word('plumb')
+    # Words can't span two text nodes
+    assert not features.contains_word('plumbingheating')
+    assert features.count_words(['plumb', 'heating', 'heating', 'acme']) == 3
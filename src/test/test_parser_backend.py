@@ -0,0 +1,74 @@
+"""
+Tests of make_soup: the configured parser backend, the fallback to html.parser and the charset
+fast path
+"""
+import pytest
+import parser_backend as pb
+
+
+def _builder(soup):
+    return soup.builder.NAME
+
+
+def test_lxml_is_the_default_when_installed():
+    pytest.importorskip('lxml')
+    assert pb.PARSER_BACKEND == 'lxml'
+    soup = pb.make_soup(b'<p>a</p>')
+    assert _builder(soup) == 'lxml'
+    assert soup.p.get_text() == 'a'
+
+
+def test_falls_back_when_parser_fails():
+    soup = pb.make_soup(b'<p>a</p>', parser='no-such-parser')
+    assert _builder(soup) == pb.FALLBACK_PARSER
+    assert soup.p.get_text() == 'a'
+
+
+def test_falls_back_when_parser_returns_empty_tree(monkeypatch):
+    calls = []
+    original = pb.BeautifulSoup
+
+    def emptyForLxml(markup, parser):
+        calls.append(parser)
+        return original('' if parser == 'lxml' else markup, parser)
+    monkeypatch.setattr(pb, 'BeautifulSoup', emptyForLxml)
+    soup = pb.make_soup(b'<p>a</p>', parser='lxml')
+    assert calls == ['lxml', pb.FALLBACK_PARSER]
+    assert soup.p.get_text() == 'a'
+
+
+def test_empty_page_not_parsed_twice():
+    pytest.importorskip('lxml')
+    assert _builder(pb.make_soup(b'', parser='lxml')) == 'lxml'
+
+
+def test_fallback_parser_used_directly(monkeypatch):
+    calls = []
+    original = pb.BeautifulSoup
+    monkeypatch.setattr(pb, 'BeautifulSoup', lambda markup, parser: calls.append(parser) or original(markup, parser))
+    pb.make_soup(b'<p>a</p>', parser=pb.FALLBACK_PARSER)
+    assert calls == [pb.FALLBACK_PARSER]
+
+
+@pytest.mark.parametrize('contentType, charset', [
+    ('text/html; charset=ISO-8859-1', 'ISO-8859-1'),
+    ('text/html;charset="utf-8"', 'utf-8'),
+    ('text/html; boundary=x; Charset=windows-1252', 'windows-1252'),
+    ('text/html', None),
+    ('', None),
+])
+def test_charset_from_headers(contentType, charset):
+    assert pb.charset_from_headers({'Content-Type': contentType}) == charset
+    assert pb.charset_from_headers({'content-type': contentType}) == charset
+    assert pb.charset_from_headers(None) is None
+
+
+@pytest.mark.parametrize('parser', ['lxml', 'html.parser'])
+def test_stated_charset_used(parser):
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    page = '<p>Café Olé</p>'.encode('latin-1')
+    assert pb.make_soup(page, {'Content-Type': 'text/html; charset=latin-1'}, parser=parser).p.get_text() == 'Café Olé'
+    # A wrong or unknown charset doesn't stop the page from being parsed
+    assert pb.make_soup(page, {'Content-Type': 'text/html; charset=utf-8'}, parser=parser).p is not None
+    assert pb.make_soup(page, {'Content-Type': 'text/html; charset=nope'}, parser=parser).p is not None
@@ -0,0 +1,90 @@
+"""
+Tests of the per-domain politeness scheduler, on a fake clock
+"""
+import pytest
+import politeness as pl
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(pl, 'time', fake)
+    return fake
+
+
+def test_token_bucket(clock):
+    bucket = pl.TokenBucket(rate=2.0, burst=3)
+    assert [bucket.reserve() for _ in range(5)] == [0.0, 0.0, 0.0, 0.5, 1.0]
+    # Five tokens short of full at two tokens a second
+    assert not bucket.is_idle(clock.now + 2.4)
+    assert bucket.is_idle(clock.now + 2.5)
+
+
+def test_domains_wait_separately(clock):
+    scheduler = pl.DomainScheduler(default_rate=1.0, default_burst=1, host_rates={})
+    assert scheduler.reserve('http://a.acme.com/') == 0
+    # Same registered domain, different host
+    assert scheduler.reserve('http://b.acme.com/') == 1.0
+    assert scheduler.reserve('http://other.com/') == 0
+    stats = scheduler.stats()
+    assert (stats['requests'], stats['waits']) == (3, 1)
+    assert stats['busiest_domains'] == [('acme.com', 1.0)]
+
+
+def test_idle_buckets_evicted(clock):
+    scheduler = pl.DomainScheduler(default_rate=1.0, default_burst=2, host_rates={})
+    for n in range(50):
+        scheduler.reserve(f'http://firm{n}.com/')
+        clock.now += 0.1
+    # Only the buckets used in the last two seconds (burst / rate) are still refilling
+    assert len(scheduler._buckets) <= 21
+    assert 'firm49.com' in scheduler._buckets
+    assert 'firm0.com' not in scheduler._buckets
+    # An evicted bucket was full, so starting a new one changes nothing
+    assert scheduler.reserve('http://firm0.com/') == 0
+
+
+def test_buckets_capped(clock):
+    scheduler = pl.DomainScheduler(default_rate=1.0, default_burst=1, host_rates={}, max_buckets=10)
+    for n in range(100):
+        scheduler.reserve(f'http://firm{n}.com/')
+        scheduler.reserve(f'http://firm{n}.com/')
+    assert len(scheduler._buckets) == 10
+    assert list(scheduler._buckets) == [f'firm{n}.com' for n in range(90, 100)]
+
+
+def test_recently_used_bucket_kept(clock):
+    scheduler = pl.DomainScheduler(default_rate=1.0, default_burst=1, host_rates={}, max_buckets=3)
+    for name in ['a', 'b', 'c', 'a', 'd']:
+        scheduler.reserve(f'http://{name}.com/')
+    assert list(scheduler._buckets) == ['c.com', 'a.com', 'd.com']
+
+
+def test_wait_stats_bounded(clock):
+    scheduler = pl.DomainScheduler(default_rate=1.0, default_burst=1, host_rates={}, max_wait_domains=20)
+    for n in range(200):
+        for _ in range(1 + n % 5):
+            scheduler.reserve(f'http://firm{n}.com/')
+    assert len(scheduler._domain_waits) <= 20
+    # The domains that waited longest are kept
+    busiest = scheduler.stats(top=3)['busiest_domains']
+    assert [wait for _, wait in busiest] == [10.0, 10.0, 10.0]
+    assert scheduler.stats()['waits'] == sum(n % 5 for n in range(200))
+
+
+def test_wait_sleeps(clock):
+    scheduler = pl.DomainScheduler(default_rate=4.0, default_burst=1, host_rates={})
+    scheduler.wait('http://acme.com/')
+    scheduler.wait('http://acme.com/')
+    assert clock.now == 1000.25
@@ -0,0 +1,166 @@
+"""
+Tests of the url checks in get_status_codes, against a fake pooled Session: probe_url sends HEAD
+first, and a GET only when the server rejects HEAD or resets the connection. check_url keeps the
+page in the page cache, where the extractors find it
+"""
+import pandas as pd
+import pytest
+import requests
+import async_fetcher
+import data_extraction
+import dead_hosts
+import get_status_codes as gs
+import page_cache
+
+URL = 'http://www.acme.com/'
+HEADERS = {'User-Agent': 'test'}
+
+
+class FakeResponse:
+    def __init__(self, url, status_code, headers=None, body=b''):
+        self.url = url
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {'Content-Type': 'text/html'})
+        self.encoding = 'utf-8'
+        self.body = body
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """
+    Answers each method with the next status code (or exception) of its list
+    """
+    def __init__(self, head=(), get=(), body=b''):
+        self.answers = {'HEAD': list(head), 'GET': list(get)}
+        self.body = body
+        self.requests = []
+
+    def _answer(self, method, url):
+        self.requests.append((method, url))
+        answer = self.answers[method].pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(url, answer, body=self.body)
+
+    def head(self, url, **kwargs):
+        return self._answer('HEAD', url)
+
+    def get(self, url, **kwargs):
+        return self._answer('GET', url)
+
+
+def _useSession(monkeypatch, session):
+    slots = []
+    monkeypatch.setattr(gs, 'get_session', lambda: session)
+    monkeypatch.setattr(gs, 'wait_for_slot', slots.append)
+    return slots
+
+
+@pytest.mark.parametrize('status', [200, 301, 404, 410, 500, 503])
+def test_head_answer_is_the_status(monkeypatch, status):
+    session = FakeSession(head=[status])
+    slots = _useSession(monkeypatch, session)
+    result = gs.probe_url(URL, HEADERS, 3)
+    assert result.status_code == status
+    assert result.final_url == URL
+    # One request and one politeness slot, even for dead urls
+    assert session.requests == [('HEAD', URL)]
+    assert slots == [URL]
+
+
+@pytest.mark.parametrize('status', sorted(gs.HEAD_REJECTED))
+def test_get_when_head_rejected(monkeypatch, status):
+    session = FakeSession(head=[status], get=[200])
+    slots = _useSession(monkeypatch, session)
+    assert gs.probe_url(URL, HEADERS, 3).status_code == 200
+    assert session.requests == [('HEAD', URL), ('GET', URL)]
+    assert slots == [URL, URL]
+
+
+def test_get_when_head_connection_reset(monkeypatch):
+    session = FakeSession(head=[requests.exceptions.ConnectionError('reset')], get=[200])
+    _useSession(monkeypatch, session)
+    assert gs.probe_url(URL, HEADERS, 3).status_code == 200
+    assert session.requests == [('HEAD', URL), ('GET', URL)]
+    assert not dead_hosts._hosts
+
+
+def test_failure_recorded_once_get_fails_too(monkeypatch):
+    session = FakeSession(head=[requests.exceptions.ConnectionError('reset')],
+                          get=[requests.exceptions.ConnectionError('refused')])
+    _useSession(monkeypatch, session)
+    result = gs.probe_url(URL, HEADERS, 3)
+    assert (result.status_code, result.final_url) == (-1, None)
+    assert dead_hosts._hosts['www.acme.com']['failures'] == 1
+
+
+def test_head_timeout_not_retried(monkeypatch):
+    session = FakeSession(head=[requests.exceptions.ReadTimeout('slow')])
+    _useSession(monkeypatch, session)
+    assert gs.probe_url(URL, HEADERS, 3).status_code == -1
+    assert session.requests == [('HEAD', URL)]
+    assert dead_hosts._hosts['www.acme.com']['timeouts'] == 1
+
+
+def test_dead_host_not_requested(monkeypatch):
+    for _ in range(dead_hosts.DEAD_AFTER_ERRORS):
+        dead_hosts.record_failure(URL, 'ConnectionError')
+    session = FakeSession()
+    _useSession(monkeypatch, session)
+    assert gs.probe_url(URL, HEADERS, 3).status_code == -1
+    assert session.requests == []
+
+
+def test_checked_page_served_from_cache(monkeypatch):
+    session = FakeSession(get=[200], body=b'<html><a href="mailto:info@acme.com">Mail</a></html>')
+    slots = _useSession(monkeypatch, session)
+    result = gs.check_url(URL, HEADERS, 3)
+    assert (result.status_code, result.final_url) == (200, URL)
+    assert session.requests == [('GET', URL)]
+
+    # Neither the page fetchers nor the extractors send another request for it
+    monkeypatch.setattr(page_cache, 'get_session', lambda: pytest.fail('page downloaded again'))
+    monkeypatch.setattr(async_fetcher.aiohttp, 'ClientSession', lambda *a, **k: pytest.fail('page downloaded again'))
+    assert page_cache.get_page(URL).content == session.body
+    assert async_fetcher.fetch_many([URL])[URL].content == session.body
+    assert data_extraction.extract_email_data(1, URL) == ['info@acme.com']
+    assert slots == [URL]
+
+
+def test_checked_page_body_capped(monkeypatch):
+    session = FakeSession(get=[200], body=b'<html>' + b'x' * 100)
+    _useSession(monkeypatch, session)
+    gs.check_url(URL, HEADERS, 3, max_body=10)
+    page = page_cache.get_page(URL)
+    assert (page.content, page.truncated) == (b'<html>xxxx', True)
+
+
+@pytest.mark.parametrize('status', [404, 500])
+def test_failed_check_not_cached(monkeypatch, status):
+    session = FakeSession(get=[status])
+    _useSession(monkeypatch, session)
+    assert gs.check_url(URL, HEADERS, 3).status_code == status
+    assert page_cache.PAGE_CACHE.get(URL) is None
+
+
+def test_keep_body_only_when_asked(monkeypatch):
+    session = FakeSession(head=[200], get=[200], body=b'<html></html>')
+    _useSession(monkeypatch, session)
+    df = gs.get_statuscode_forPandas(pd.DataFrame({'url': [URL]}))
+    assert list(df['status_code']) == [200]
+    assert session.requests == [('HEAD', URL)]
+    assert page_cache.PAGE_CACHE.get(URL) is None
+
+    df = gs.get_statuscode_forPandas(pd.DataFrame({'url': [URL]}), keep_body=True)
+    assert list(df['final_url']) == [URL]
+    assert session.requests[1:] == [('GET', URL)]
+    assert page_cache.PAGE_CACHE.get(URL) is not None
@@ -0,0 +1,87 @@
+"""
+Tests of the schema.org reader in structured_data: JSON-LD blocks (nested, @graph, list values) and
+microdata attributes
+"""
+import json
+import pytest
+import structured_data as sd
+
+
+def _jsonLd(*nodes, scriptType='application/ld+json'):
+    return ''.join(f'<script type="{scriptType}">{json.dumps(node)}</script>' for node in nodes).encode('utf-8')
+
+
+def _read(content):
+    data = sd.read_structured_data(content)
+    return data.telephones, data.emails, [address['address'] for address in data.addresses]
+
+
+def test_json_ld_local_business():
+    page = _jsonLd({'@context': 'https://schema.org', '@type': 'LocalBusiness', 'name': 'Acme',
+                    'telephone': '+1 (507) 555-0100', 'email': 'mailto:info@acme.com',
+                    'address': {'@type': 'PostalAddress', 'streetAddress': '123  Main St',
+                                'addressLocality': 'Mankato', 'addressRegion': 'MN', 'postalCode': 56001}})
+    assert _read(page) == (['+1 (507) 555-0100'], ['info@acme.com'], ['123 Main St, Mankato, MN 56001'])
+    address = sd.read_structured_data(page).addresses[0]
+    assert (address['street'], address['zip'], address['country']) == ('123 Main St', '56001', None)
+
+
+def test_json_ld_graph_and_lists():
+    page = _jsonLd({'@context': 'https://schema.org', '@graph': [
+        {'@type': 'WebSite', 'url': 'https://acme.com'},
+        {'@type': 'Organization', 'telephone': ['507-555-0100', '507-555-0101', '507-555-0100'],
+         'email': ['a@acme.com', {'name': 'b@acme.com'}],
+         'department': [{'@type': 'Store', 'telephone': '507-555-0102',
+                         'address': [{'streetAddress': '1 Elm St', 'postalCode': '56001'},
+                                     '221 Pine Rd, Fargo, ND 58102']}]},
+    ]})
+    assert _read(page) == (['507-555-0100', '507-555-0101', '507-555-0102'], ['a@acme.com', 'b@acme.com'],
+                           ['1 Elm St, 56001', '221 Pine Rd, Fargo, ND 58102'])
+
+
+def test_json_ld_top_level_list_and_several_blocks():
+    page = _jsonLd([{'telephone': '507-555-0100'}, {'telephone': 5075550101}],
+                   {'email': 'info@acme.com', 'telephone': '507-555-0100'}, scriptType='application/ld+json; charset=utf-8')
+    assert _read(page) == (['507-555-0100', '5075550101'], ['info@acme.com'], [])
+
+
+@pytest.mark.parametrize('block', [
+    b'{"telephone": "507-555-0100",}',
+    b'not json at all',
+    b'',
+    b'"just a string"',
+    b'{"telephone": null, "email": true, "address": 5}',
+])
+def test_bad_json_ld_ignored(block):
+    page = b'<script type="application/ld+json">' + block + b'</script>' + _jsonLd({'email': 'ok@acme.com'})
+    assert _read(page) == ([], ['ok@acme.com'], [])
+
+
+def test_address_without_street_or_zip_dropped():
+    page = _jsonLd({'address': {'addressLocality': 'Mankato', 'addressRegion': 'MN'}})
+    assert _read(page) == ([], [], [])
+
+
+def test_microdata():
+    page = (b'<div itemscope itemtype="https://schema.org/LocalBusiness">'
+            b'<span itemprop="telephone">(507) 555-0100</span>'
+            b'<a itemprop="telephone" href="tel:+15075550101">Call</a>'
+            b'<a itemprop="email" href="mailto:info@acme.com">Mail</a>'
+            b'<meta itemprop="email" content="sales&#64;acme.com">'
+            b'<div itemprop="address" itemscope><span itemprop="streetAddress">123 Main St</span>'
+            b'<span itemprop="addressLocality">Mankato</span>, <span itemprop=addressRegion>MN</span>'
+            b'<span itemprop="postalCode">56001</span></div>'
+            b'<div itemprop="address" itemscope><span itemprop="streetAddress">1 Elm St</span>'
+            b'<a itemprop="postalCode" href="/zip">56002</a></div>'
+            b'<span itemprop="name">Acme</span></div>')
+    assert _read(page) == (['(507) 555-0100', '+15075550101'], ['info@acme.com', 'sales@acme.com'],
+                           ['123 Main St, Mankato, MN 56001', '1 Elm St, 56002'])
+
+
+def test_pages_without_structured_data():
+    for content in [b'<p>Call 507-555-0100</p>', b'', None, '<p>text</p>']:
+        data = sd.read_structured_data(content)
+        assert not data
+        assert (data.telephones, data.emails, data.addresses) == ([], [], [])
+    # str bodies are read too
+    assert sd.read_structured_data('<meta itemprop="telephone" content="507-555-0100">').telephones == ['507-555-0100']
@@ -0,0 +1,106 @@
+"""
+Tests of writeFrame and the CSV fields its PostgreSQL COPY path sends
+"""
+from datetime import datetime, date
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+import setup as st
+from conftest import TEST_SCHEMA
+
+
+@pytest.mark.parametrize('value, field', [
+    ('plain', '"plain"'),
+    ('a,b', '"a,b"'),
+    ('say "hi"', '"say ""hi"""'),
+    ('two\nlines', '"two\nlines"'),
+    ('\\N', '"\\N"'),
+    # NULL is the only unquoted empty field; '' stays an empty string
+    (None, ''),
+    ('', '""'),
+    (1, '"1"'),
+    (1.0, '"1"'),
+    (-3.0, '"-3"'),
+    (1.5, '"1.5"'),
+    (True, '"True"'),
+    (False, '"False"'),
+    (datetime(2024, 1, 2, 3, 4, 5, 6), '"2024-01-02 03:04:05.000006"'),
+    (pd.Timestamp('2024-01-02 03:04:05'), '"2024-01-02 03:04:05"'),
+    (date(2024, 1, 2), '"2024-01-02"'),
+])
+def test_csv_field(value, field):
+    assert st._csvField(value) == field
+
+
+def _readBack(engine, tableName, orderBy):
+    table = st.getTable(engine, sa.schema.MetaData(schema=TEST_SCHEMA), tableName)
+    cols = [col for col in table.c if col.name != orderBy]
+    with engine.connect() as con:
+        return [tuple(row) for row in con.execute(sa.select(*cols).order_by(table.c[orderBy]))]
+
+
+def test_write_frame_round_trip(db, capsys):
+    """
+    Text, NULL and '', integer columns with missing values (float64 in pandas), booleans and
+    datetimes come back as written, through COPY on PostgreSQL and executemany on SQLite
+    """
+    engine, _ = db
+    urls = pd.DataFrame({'firm_id': [101, 102, 103],
+                         'url': ['http://a.com/?q=1,2', 'say "hi"\nthere', ''],
+                         'main': [True, False, None],
+                         'url_type_id': [1, np.nan, 3],
+                         'url_status_id': [None, None, None]})
+    assert urls['url_type_id'].dtype == np.float64
+    assert st.writeFrame(engine, urls, st.URL_TABLE, schema=TEST_SCHEMA) == 3
+    assert 'Wrote 3 rows to ' + st.URL_TABLE in capsys.readouterr().out
+
+    written = [row for row in _readBack(engine, st.URL_TABLE, 'firm_url_id') if row[0] > 100]
+    assert written == [(101, 'http://a.com/?q=1,2', True, 1, None),
+                       (102, 'say "hi"\nthere', False, None, None),
+                       (103, '', None, 3, None)]
+
+    activities = pd.DataFrame({'mnsu_script_activity_id': [2, 3],
+                               'mnsu_script_id': [7, 7],
+                               'initiated_at': pd.to_datetime([datetime(2024, 5, 6, 7, 8, 9, 123456), datetime(2024, 5, 7)]),
+                               'terminated_at': pd.to_datetime([datetime(2024, 5, 6, 8), None]),
+                               'error_code': [np.nan, 500.0],
+                               'error_text': [None, 'boom, "bad"'],
+                               st.PROGRESS_COLUMN: [0, 12]})
+    st.writeFrame(engine, activities, st.SCRIPT_ACTIVITY_TABLE, schema=TEST_SCHEMA)
+    written = _readBack(engine, st.SCRIPT_ACTIVITY_TABLE, 'mnsu_script_activity_id')[1:]
+    assert written == [(7, datetime(2024, 5, 6, 7, 8, 9, 123456), datetime(2024, 5, 6, 8), None, None, 0),
+                       (7, datetime(2024, 5, 7), None, 500, 'boom, "bad"', 12)]
+
+
+def test_write_frame_in_transaction(db):
+    """
+    On a connection, writeFrame's rows belong to the caller's transaction
+    """
+    engine, _ = db
+    processed = pd.DataFrame({'firm_id': [201, 202], 'mnsu_script_id': [7, 7], 'mnsu_script_activity_id': [1, 1]})
+    with pytest.raises(RuntimeError):
+        with engine.begin() as con:
+            st.writeFrame(con, processed, st.PROCESSED_TABLE, schema=TEST_SCHEMA)
+            raise RuntimeError('roll back')
+    assert not [row for row in _readBack(engine, st.PROCESSED_TABLE, 'mnsu_firm_processed_id') if row[0] > 200]
+
+    with engine.begin() as con:
+        st.writeFrame(con, processed, st.PROCESSED_TABLE, schema=TEST_SCHEMA)
+    assert [row for row in _readBack(engine, st.PROCESSED_TABLE, 'mnsu_firm_processed_id') if row[0] > 200] == \
+        [(201, 7, 1), (202, 7, 1)]
+
+
+def test_copy_path_only_for_psycopg2(db, monkeypatch):
+    engine, _ = db
+    methods = []
+    original = pd.DataFrame.to_sql
+
+    def recordMethod(self, *args, **kwargs):
+        methods.append(kwargs.get('method'))
+        return original(self, *args, **kwargs)
+    monkeypatch.setattr(pd.DataFrame, 'to_sql', recordMethod)
+    st.writeFrame(engine, pd.DataFrame({'firm_id': [301], 'mnsu_script_id': [7], 'mnsu_script_activity_id': [1]}),
+                  st.PROCESSED_TABLE, schema=TEST_SCHEMA)
+    usesCopy = engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2'
+    assert methods == [st._copyRows if usesCopy else None]